@@ -0,0 +1,297 @@
+import os
+import hmac
+import asyncio
+import hashlib
+import datetime
+import configparser
+import xml.etree.ElementTree as ET
+from urllib.parse import quote
+
+try:
+    import aiohttp
+    import yarl
+except ImportError:
+    aiohttp = None
+
+from keypath import KeyPath
+
+S3_NS = '{http://s3.amazonaws.com/doc/2006-03-01/}'
+
+
+class AsyncS3Storage(object):
+    """
+    asyncio version of S3Storage, for code running in an event loop.
+
+    The operations are the same, as coroutines:
+
+        storage = AsyncS3Storage("partsim_eddev_projects")
+        data = await storage.getFileData('model-v1.0/uid-1/pid-21', 'model.xml.gz')
+        ...
+        await storage.close()
+
+    Requests go over one aiohttp session, which keeps up to poolSize
+    keep-alive connections to S3. At most maxConcurrency requests are in
+    flight at once, the others wait their turn. Cancelling a task that
+    is waiting on a request cancels the request, and frees its slot.
+
+    Requests are signed with AWS Signature Version 4. The keys are taken
+    from the arguments, from AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY,
+    or from ~/.boto like S3Storage. Pass endpoint to use a local S3
+    compatible server, e.g. endpoint='http://localhost:5000'.
+
+    Needs Python 3 and aiohttp.
+    """
+
+    def __init__(self, bucket, endpoint='https://s3.amazonaws.com', region='us-east-1',
+                 accessKey=None, secretKey=None, maxConcurrency=64, poolSize=32, timeout=60):
+        if aiohttp is None:
+            raise Exception("AsyncS3Storage needs aiohttp.")
+
+        self._bucketName = bucket
+        self._re_bucket = bucket
+        self._paths = KeyPath(bucket)
+        self.endpoint = endpoint.rstrip('/')
+        self.region = region
+        self.poolSize = poolSize
+        self.timeout = timeout
+        self.maxConcurrency = maxConcurrency
+
+        if not accessKey:
+            accessKey, secretKey = _credentials()
+        self.accessKey = accessKey
+        self.secretKey = secretKey
+
+        self._limit = None
+        self._session = None
+
+    def limit(self):
+        """
+        The semaphore of the concurrency slots. Made on first use, inside
+        the event loop, as before Python 3.10 it is tied to the loop that
+        is current when it is made.
+        """
+        if self._limit is None:
+            self._limit = asyncio.Semaphore(self.maxConcurrency)
+        return self._limit
+
+    def session(self):
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.poolSize, keepalive_timeout=30)
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def getBucket(self):
+        return self._bucketName
+
+    def setSearchBucket(self, bucket):
+        """
+        The bucket name to remove from the front of paths, see
+        S3Storage.setSearchBucket.
+        """
+        b = self._re_bucket
+        self._re_bucket = bucket or self._bucketName
+        self._paths.setBucket(self._re_bucket)
+        return b
+
+    def buildPath(self, path, file):
+        """
+        The bucket is stored in the paths, so we need to remove it..
+        """
+        return self._paths.build(path, file)
+
+    async def exists(self, path, file):
+        """
+        Check if a file exists on the S3 server.
+        """
+        async with self._request('HEAD', self.buildPath(path, file)) as resp:
+            if resp.status == 404:
+                return False
+            _check(resp)
+            return True
+
+    async def getFileData(self, path, file):
+        """
+        Get file data as bytes, or None if the file does not exist.
+        """
+        async with self._request('GET', self.buildPath(path, file)) as resp:
+            if resp.status == 404:
+                return None
+            _check(resp)
+            return await resp.read()
+
+    async def getFile(self, path, file, localfile, chunkSize=65536):
+        """
+        Read the contents of path+file into the open file localfile, a
+        chunk at a time. Returns False if the file does not exist.
+        """
+        async with self._request('GET', self.buildPath(path, file)) as resp:
+            if resp.status == 404:
+                return False
+            _check(resp)
+            async for chunk in resp.content.iter_chunked(chunkSize):
+                localfile.write(chunk)
+            return True
+
+    async def storeFileData(self, path, file, data):
+        """
+        Write data to the path+file.
+        """
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        async with self._request('PUT', self.buildPath(path, file), data=data) as resp:
+            _check(resp)
+
+    async def getBucketList(self, prefix=''):
+        """
+        The names of the keys in the bucket, starting with prefix.
+        """
+        names = []
+        token = None
+        while True:
+            query = {'list-type': '2', 'prefix': prefix}
+            if token:
+                query['continuation-token'] = token
+            async with self._request('GET', '', query=query) as resp:
+                _check(resp)
+                root = ET.fromstring(await resp.read())
+
+            names.extend(e.text for e in root.iter(S3_NS + 'Key'))
+            token = root.findtext(S3_NS + 'NextContinuationToken')
+            if root.findtext(S3_NS + 'IsTruncated') != 'true' or not token:
+                return names
+
+    def _request(self, method, key, query=None, data=b''):
+        return _Request(self, method, key, query or {}, data)
+
+    def _signedRequest(self, method, key, query, data):
+        """
+        The url and headers of a signed request for key in the bucket.
+        """
+        path = '/' + quote(self._bucketName, safe='')
+        if key:
+            path += '/' + quote(key, safe='/~')
+        url = self.endpoint + path
+        headers = sign(method, url, query, data, self.accessKey, self.secretKey, self.region)
+
+        # Sent exactly as signed
+        if query:
+            url += '?' + _canonicalQuery(query)
+        return yarl.URL(url, encoded=True), headers
+
+
+class _Request(object):
+    """
+    One request, holding a concurrency slot until its response is closed.
+    """
+
+    def __init__(self, storage, method, key, query, data):
+        self.storage = storage
+        self.method = method
+        self.key = key
+        self.query = query
+        self.data = data
+        self.resp = None
+
+    async def __aenter__(self):
+        storage = self.storage
+        limit = storage.limit()
+        await limit.acquire()
+        try:
+            url, headers = storage._signedRequest(self.method, self.key, self.query, self.data)
+            self.resp = await storage.session().request(
+                self.method, url, headers=headers, data=self.data or None)
+        except BaseException:
+            # Including cancellation
+            limit.release()
+            raise
+        return self.resp
+
+    async def __aexit__(self, *exc):
+        try:
+            self.resp.release()
+        finally:
+            self.storage.limit().release()
+
+
+def _check(resp):
+    if resp.status >= 300:
+        raise Exception("S3 {} {} failed ({} {}).".format(
+            resp.method, resp.url, resp.status, resp.reason))
+
+
+def _credentials():
+    """
+    The access and secret key, from the environment or ~/.boto.
+    """
+    accessKey = os.environ.get('AWS_ACCESS_KEY_ID')
+    secretKey = os.environ.get('AWS_SECRET_ACCESS_KEY')
+    if accessKey and secretKey:
+        return accessKey, secretKey
+
+    config = configparser.ConfigParser()
+    config.read(os.path.expanduser('~/.boto'))
+    if config.has_section('Credentials'):
+        return (config.get('Credentials', 'aws_access_key_id'),
+                config.get('Credentials', 'aws_secret_access_key'))
+
+    raise Exception("No AWS credentials found.")
+
+
+def sign(method, url, query, data, accessKey, secretKey, region, now=None, headers=None):
+    """
+    The headers for an AWS Signature Version 4 signed S3 request,
+    including any headers passed in.
+    """
+    now = now or datetime.datetime.utcnow()
+    amzDate = now.strftime('%Y%m%dT%H%M%SZ')
+    day = amzDate[:8]
+
+    scheme, rest = url.split('://', 1)
+    host, _, path = rest.partition('/')
+    path = '/' + path
+
+    headers = dict(headers or {})
+    headers['Host'] = host
+    headers['x-amz-date'] = amzDate
+    headers['x-amz-content-sha256'] = hashlib.sha256(data or b'').hexdigest()
+
+    canonical = sorted((k.lower(), ' '.join(str(v).split())) for k, v in headers.items())
+    signedHeaders = ';'.join(k for k, v in canonical)
+    request = '\n'.join([
+        method,
+        path,
+        _canonicalQuery(query),
+        ''.join('%s:%s\n' % kv for kv in canonical),
+        signedHeaders,
+        headers['x-amz-content-sha256'],
+    ])
+
+    scope = '%s/%s/s3/aws4_request' % (day, region)
+    toSign = '\n'.join(['AWS4-HMAC-SHA256', amzDate, scope,
+                        hashlib.sha256(request.encode('utf-8')).hexdigest()])
+
+    key = ('AWS4' + secretKey).encode('utf-8')
+    for part in (day, region, 's3', 'aws4_request'):
+        key = hmac.new(key, part.encode('utf-8'), hashlib.sha256).digest()
+    signature = hmac.new(key, toSign.encode('utf-8'), hashlib.sha256).hexdigest()
+
+    headers['Authorization'] = 'AWS4-HMAC-SHA256 Credential=%s/%s, SignedHeaders=%s, Signature=%s' % (
+        accessKey, scope, signedHeaders, signature)
+    return headers
+
+
+def _canonicalQuery(query):
+    return '&'.join('%s=%s' % (quote(k, safe='~'), quote(str(v), safe='~'))
+                    for k, v in sorted(query.items()))
@@ -0,0 +1,124 @@
+import posixpath
+from multiprocessing.pool import ThreadPool
+
+from boto.s3.prefix import Prefix
+
+# The most keys the multi-object delete API takes in one request
+MAX_DELETE = 1000
+
+
+def existsMany(bucket, names, workers=8, listMin=3, pageSize=1000):
+    """
+    Check which of the key names exist. Returns a list of True or False,
+    in the order of names.
+
+    bucket is a function returning a context manager that gives a
+    Bucket, see S3Storage.bucket.
+
+    The names are grouped by directory. A directory with fewer than
+    listMin of the names gets one HEAD per name. For the others one
+    listing of the directory, starting just before the first name, can
+    answer for up to pageSize names at once. A listing is given up, and
+    the names left are checked with HEADs, once it has taken as many
+    pages as there are names left, so it never costs more requests than
+    the HEADs would. The groups are checked workers at a time.
+    """
+    groups = {}
+    for name in set(names):
+        groups.setdefault(posixpath.dirname(name), []).append(name)
+
+    jobs = []
+    for group in groups.values():
+        if len(group) < listMin:
+            jobs.extend([name] for name in group)
+        else:
+            jobs.append(sorted(group))
+
+    def check(group):
+        if len(group) == 1:
+            return _head(bucket, group[0])
+        return _list(bucket, group, pageSize)
+
+    found = {}
+    for result in _map(check, jobs, workers):
+        found.update(result)
+    return [found[name] for name in names]
+
+
+def deleteMany(bucket, names, workers=8):
+    """
+    Delete the keys, with the multi-object delete API, up to 1000 keys
+    a request, workers requests at a time.
+
+    Returns a list in the order of names, with None for each key that
+    was deleted, or that was not there, and the error for each key that
+    could not be deleted, as 'Code: Message'.
+    """
+    batches = [names[i:i + MAX_DELETE] for i in range(0, len(names), MAX_DELETE)]
+
+    def delete(batch):
+        with bucket() as bconn:
+            # Quiet, so the response only lists the failures
+            result = bconn.delete_keys(batch, quiet=True)
+        return dict((e.key, '%s: %s' % (e.code, e.message)) for e in result.errors)
+
+    errors = {}
+    for result in _map(delete, batches, workers):
+        errors.update(result)
+    return [errors.get(name) for name in names]
+
+
+def _head(bucket, name):
+    with bucket() as bconn:
+        k = bconn.new_key(name)
+        return {name: k.exists()}
+
+
+def _list(bucket, names, pageSize):
+    """
+    Check the sorted names, all in one directory, by listing it from
+    just before the first one.
+    """
+    prefix = posixpath.commonprefix(names)
+    marker = names[0][:-1]
+    last = names[-1]
+    left = set(names)
+    found = {}
+    pages = 0
+
+    while left and pages < len(left):
+        with bucket() as bconn:
+            page = bconn.get_all_keys(prefix=prefix, delimiter='/', marker=marker,
+                                      max_keys=pageSize)
+        pages += 1
+
+        done = not page.is_truncated or not len(page)
+        for k in page:
+            if isinstance(k, Prefix):
+                continue
+            if k.name in left:
+                left.discard(k.name)
+                found[k.name] = True
+            if k.name > last:
+                done = True
+        if done:
+            for name in left:
+                found[name] = False
+            return found
+        marker = page.next_marker or page[-1].name
+
+    # The listing was costing more than checking the rest one by one
+    for name in left:
+        found.update(_head(bucket, name))
+    return found
+
+
+def _map(func, items, workers):
+    if len(items) <= 1:
+        return [func(i) for i in items]
+
+    pool = ThreadPool(min(workers, len(items)))
+    try:
+        return pool.map(func, items)
+    finally:
+        pool.terminate()
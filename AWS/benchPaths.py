@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+Benchmark the cost of turning (path, file) into a key name, which is
+done for every S3Storage operation:
+
+    regex    - re.match('^%s/(.*)$' % bucket, path), as buildPath did
+    prefix   - KeyPath.build, without the memo
+    memo     - KeyPath.build, for names asked for before
+    bulk     - KeyPath.buildAll, per name
+
+The names are for projects files, of --projects different projects.
+No connection to S3 is made.
+
+    python benchPaths.py -n 200000 -p 1000
+"""
+
+import argparse
+import os.path
+import re
+import timeit
+
+from keypath import KeyPath
+
+BUCKET = 'partsim_eddev_projects'
+
+
+def regexBuild(path, file, bucket=BUCKET):
+    path = os.path.join(path, file)
+    m = re.match('^%s/(.*)$' % bucket, path)
+    if m:
+        path = m.group(1)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--names", type=int, default=100000,
+                        help="Number of names to build in each run.")
+    parser.add_argument("-p", "--projects", type=int, default=1000,
+                        help="Number of different projects named.")
+    parser.add_argument("-r", "--repeat", type=int, default=3,
+                        help="Runs of each, the best is shown.")
+    args = parser.parse_args()
+
+    files = ['model.xml.gz', 'probes.json.gz', 'simdata.json.gz', 'simparams.json.gz']
+    pairs = [('%s/model-v1.0/uid-%d/pid-%d' % (BUCKET, i % 50, i // 4 % args.projects), files[i % 4])
+             for i in range(args.names)]
+
+    paths = KeyPath(BUCKET)
+    fresh = KeyPath(BUCKET, memoSize=0)
+    paths.buildAll(pairs)
+
+    def regex():
+        for path, file in pairs:
+            regexBuild(path, file)
+
+    def prefix():
+        for path, file in pairs:
+            fresh.build(path, file)
+
+    def memo():
+        for path, file in pairs:
+            paths.build(path, file)
+
+    def bulk():
+        paths.buildAll(pairs)
+
+    print("%8s %12s" % ("", "ns/name"))
+    for name, func in [('regex', regex), ('prefix', prefix), ('memo', memo), ('bulk', bulk)]:
+        best = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        print("%8s %12.0f" % (name, best * 1e9 / args.names))
+
+
+if __name__ == '__main__':
+    main()
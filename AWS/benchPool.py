@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""
+Benchmark S3Storage request throughput as the number of threads grows.
+
+Each thread reads the same small object over and over, with getFileData:
+
+    pooled - all threads share one S3Storage and its connection pool
+    fresh  - every request makes a new S3Storage, the only safe way to
+             use it from several threads before the pool
+
+Runs against S3 with the keys in ~/.boto, or against a local S3
+compatible server with --host and --port:
+
+    python benchPool.py -b mybucket -n 2000 -t 1,2,4,8,16
+    python benchPool.py -b bench --host localhost --port 5000 --create
+"""
+
+import argparse
+import threading
+import time
+
+from boto.s3.connection import OrdinaryCallingFormat
+
+from s3 import S3Storage
+
+
+def run(threads, requests, makeStorage, shared):
+    """
+    Make requests getFileData calls spread over threads, and return the
+    time taken.
+    """
+    storage = makeStorage() if shared else None
+    perThread = requests // threads
+
+    def work():
+        for i in range(perThread):
+            s = storage or makeStorage()
+            s.getFileData('bench', 'object.txt')
+
+    workers = [threading.Thread(target=work) for i in range(threads)]
+    start = time.time()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return time.time() - start, perThread * threads
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-b", "--bucket", required=True,
+                        help="Bucket to read from.")
+    parser.add_argument("-n", "--requests", type=int, default=1000,
+                        help="Number of requests for each run.")
+    parser.add_argument("-t", "--threads", default="1,2,4,8,16",
+                        help="Comma separated thread counts.")
+    parser.add_argument("-p", "--pool-size", type=int, default=16,
+                        help="Connections in the pool.")
+    parser.add_argument("--host", help="S3 compatible server to use.")
+    parser.add_argument("--port", type=int, help="Port of the server.")
+    parser.add_argument("--create", action="store_true",
+                        help="Create the bucket first.")
+    args = parser.parse_args()
+
+    connectArgs = {}
+    if args.host:
+        connectArgs = dict(host=args.host, port=args.port, is_secure=False,
+                           calling_format=OrdinaryCallingFormat(),
+                           aws_access_key_id='bench', aws_secret_access_key='bench')
+
+    makeStorage = lambda: S3Storage(args.bucket, poolSize=args.pool_size, **connectArgs)
+    if args.create:
+        makeStorage().get_connection().create_bucket(args.bucket)
+    makeStorage().storeFileData('bench', 'object.txt', 'x' * 1024)
+
+    print("%8s %12s %12s" % ("threads", "pooled/s", "fresh/s"))
+    for threads in [int(t) for t in args.threads.split(',')]:
+        pooledTime, n = run(threads, args.requests, makeStorage, True)
+        freshTime, m = run(threads, args.requests, makeStorage, False)
+        print("%8d %12.0f %12.0f" % (threads, n / pooledTime, m / freshTime))
+
+
+if __name__ == '__main__':
+    main()
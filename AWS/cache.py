@@ -0,0 +1,295 @@
+import os
+import json
+import mmap
+import time
+import errno
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+from transfer import MB
+
+
+class S3Cache(object):
+    """
+    Read-through disk cache of S3 objects, see S3Storage(cache=...).
+
+    Each object is kept in two files under the directory:
+
+        ab/<sha1 of key>.meta          - JSON: the ETag, and when it was
+                                         last checked with S3
+        cd/<sha1 of key and ETag>.dat  - the object itself
+
+    A data file is never changed once written, a new version of an
+    object gets a new file. Both are written to a temporary name and
+    renamed into place, so several processes can share the directory:
+    a reader sees either the old version or the new one, never half of
+    one.
+
+    An object checked less than ttl seconds ago is used as it is. After
+    that it is revalidated with a GET with If-None-Match, which costs a
+    round trip but no data when the object has not changed. With ttl=0
+    every read is revalidated.
+
+    When the data files add up to more than maxBytes, the least recently
+    used ones are removed. The cache keeps an index of the data files in
+    LRU order, with their total size, so this takes no scan of the
+    directory. The index is read from the directory when the cache is
+    made, or by rescan(): every hit touches the data file, so the
+    modification times give the LRU order for all the processes. Files
+    added by other processes since are only seen after a rescan().
+
+    Safe to use from several threads.
+    """
+
+    def __init__(self, directory, maxBytes=1024 * MB, ttl=60):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.ttl = ttl
+
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # Data file name -> size, least recently used first
+        self._lru = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.rescan()
+
+    def get(self, key, fetch):
+        """
+        The data of key, or None if it does not exist.
+
+        fetch(etag) is called when the cache can't answer by itself. It
+        must GET the object, with If-None-Match: etag if etag is not
+        None, and return (status, etag, data), status being 200, 304 or
+        404.
+        """
+        entry = self._entry(key, fetch)
+        if entry is None:
+            return None
+        if 'data' in entry:
+            return entry['data']
+
+        try:
+            with open(entry['file'], 'rb') as fp:
+                return fp.read()
+        except IOError:
+            # Evicted by another process since, fetch it again
+            return self.get(key, fetch)
+
+    def getMap(self, key, fetch):
+        """
+        Like get, but returns a read-only mmap of the cached file, so the
+        data is not copied into the process. An empty object gives ''.
+        """
+        entry = self._entry(key, fetch)
+        if entry is None:
+            return None
+
+        try:
+            with open(entry['file'], 'rb') as fp:
+                if os.fstat(fp.fileno()).st_size == 0:
+                    return b''
+                return mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        except IOError:
+            if 'data' in entry:
+                return entry['data']  # Too big to keep
+            return self.getMap(key, fetch)
+
+    def put(self, key, etag, data):
+        """
+        Store a new version of key, e.g. after it was written to S3.
+        """
+        name = self._dataName(key, etag)
+        if not os.path.exists(name):
+            self._write(name, data)
+        self._used(name, len(data))
+
+        self._writeMeta(key, etag)
+        if self._bytes > self.maxBytes:
+            self.evict()
+
+    def invalidate(self, key):
+        """
+        Forget key, the next read fetches it from S3.
+        """
+        try:
+            os.remove(self._metaName(key))
+        except OSError:
+            pass
+
+    def evict(self):
+        """
+        Remove the least recently used data files until they fit in
+        maxBytes again.
+        """
+        victims = []
+        with self._lock:
+            while self._bytes > self.maxBytes and self._lru:
+                name, size = self._lru.popitem(last=False)
+                self._bytes -= size
+                victims.append(name)
+
+        for name in victims:
+            try:
+                os.remove(name)
+            except OSError:
+                continue  # Removed by another process
+            with self._lock:
+                self.evictions += 1
+
+    def rescan(self):
+        """
+        Read the index of the data files from the directory again, e.g.
+        to see the files of other processes sharing it.
+        """
+        files, total = self._scan()
+        files.sort()
+        with self._lock:
+            self._lru = OrderedDict((name, size) for mtime, size, name in files)
+            self._bytes = total
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.revalidated + self.misses
+            return {
+                'hits': self.hits,
+                'revalidated': self.revalidated,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'bytes': self._bytes,
+                'hitRate': float(self.hits + self.revalidated) / lookups if lookups else 0.0,
+            }
+
+    def _entry(self, key, fetch):
+        """
+        Find or fetch key. Returns {'file': ...}, with the 'data' as well
+        when it was just fetched, or None when key does not exist.
+        """
+        meta = self._readMeta(key)
+        name = None
+        if meta is not None:
+            name = self._dataName(key, meta['etag'])
+            if not os.path.exists(name):
+                meta = None
+
+        if meta is not None and time.time() - meta['checked'] < self.ttl:
+            self._count('hits')
+            _touch(name)
+            self._used(name)
+            return {'file': name}
+
+        status, etag, data = fetch(meta['etag'] if meta else None)
+        if status == 304:
+            self._count('revalidated')
+            _touch(name)
+            self._used(name)
+            self._writeMeta(key, meta['etag'])
+            return {'file': name}
+
+        self._count('misses')
+        if status == 404:
+            self.invalidate(key)
+            return None
+
+        self.put(key, etag, data)
+        return {'file': self._dataName(key, etag), 'data': data}
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _used(self, name, size=None):
+        """
+        Move a data file to the most recently used end of the index,
+        adding it if it is new to this process.
+        """
+        with self._lock:
+            known = self._lru.pop(name, None)
+            if known is not None:
+                self._lru[name] = known
+                return
+        if size is None:
+            try:
+                size = os.path.getsize(name)
+            except OSError:
+                return  # Evicted by another process
+        with self._lock:
+            if name not in self._lru:
+                self._bytes += size
+            self._lru[name] = size
+
+    def _hash(self, text):
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def _metaName(self, key):
+        digest = self._hash(key)
+        return os.path.join(self.directory, digest[:2], digest + '.meta')
+
+    def _dataName(self, key, etag):
+        digest = self._hash(key + '\0' + etag)
+        return os.path.join(self.directory, digest[:2], digest + '.dat')
+
+    def _readMeta(self, key):
+        try:
+            with open(self._metaName(key)) as fp:
+                return json.load(fp)
+        except (IOError, ValueError):
+            return None
+
+    def _writeMeta(self, key, etag):
+        data = json.dumps({'key': key, 'etag': etag, 'checked': time.time()})
+        self._write(self._metaName(key), data.encode('utf-8'))
+
+    def _write(self, name, data):
+        folder = os.path.dirname(name)
+        if not os.path.isdir(folder):
+            try:
+                os.makedirs(folder)
+            except OSError:
+                # Made by another process in the meantime
+                pass
+
+        fd, tmp = tempfile.mkstemp(dir=folder, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fp:
+                fp.write(data)
+            os.rename(tmp, name)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def _scan(self):
+        """
+        All the data files as (mtime, size, name), and their total size.
+        """
+        files = []
+        total = 0
+        for folder, dirs, names in os.walk(self.directory):
+            for n in names:
+                if not n.endswith('.dat'):
+                    continue
+                name = os.path.join(folder, n)
+                try:
+                    st = os.stat(name)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, name))
+                total += st.st_size
+        return files, total
+
+
+def _touch(name):
+    try:
+        os.utime(name, None)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
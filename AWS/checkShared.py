@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+"""
+Check that the modules shared with the 2014-04-08 meeting's awslib are
+the same in both places.
+
+The meeting directories are kept self-contained, so they can be run on
+their own, as they were shown. awslib has copies of the modules below,
+which are written here, in AWS/, and copied over:
+
+    python checkShared.py           # list the copies that differ
+    python checkShared.py --update  # copy the AWS/ modules over them
+
+Exits with status 1 if any copy differs.
+"""
+
+import argparse
+import filecmp
+import os.path
+import shutil
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+AWSLIB = os.path.join(HERE, '..', 'Meetings', '2014-04-08', 'boto', 'awslib')
+
+SHARED = ['batch.py', 'codec.py', 'keypath.py', 'retry.py', 'sync.py', 'tracing.py']
+
+
+def differing():
+    """
+    The shared modules whose awslib copy is not the same as AWS/'s.
+    """
+    return [name for name in SHARED
+            if not os.path.exists(os.path.join(AWSLIB, name)) or
+            not filecmp.cmp(os.path.join(HERE, name), os.path.join(AWSLIB, name), shallow=False)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--update", action="store_true",
+                        help="Copy the AWS/ modules over the awslib copies.")
+    args = parser.parse_args()
+
+    names = differing()
+    for name in names:
+        if args.update:
+            shutil.copyfile(os.path.join(HERE, name), os.path.join(AWSLIB, name))
+            print("Updated %s" % name)
+        else:
+            print("Differs: %s" % name)
+    if names and not args.update:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+import json
+import random
+import hashlib
+
+import boto.exception
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from transfer import MB, MIN_PART_SIZE
+
+# The chunk lists of files stored as chunks, see writeIndex
+INDEX_PREFIX = '.chunks/'
+
+# Metadata holding the SHA-256 of the content, before any compression
+SHA256 = 'sha256'
+
+# Table of the gear rolling hash, the same on every run
+_random = random.Random(1)
+_GEAR = [int(_random.getrandbits(32)) for i in range(256)]
+
+
+def contentDigest(fp, blockSize=MB):
+    """
+    The (sha256, md5) hex digests of the rest of the open file, read a
+    block at a time.
+    """
+    sha = hashlib.sha256()
+    md5 = hashlib.md5()
+    while True:
+        block = fp.read(blockSize)
+        if not block:
+            break
+        sha.update(block)
+        md5.update(block)
+    return sha.hexdigest(), md5.hexdigest()
+
+
+def contentChunks(fp, minSize=MIN_PART_SIZE, maskBits=21, maxSize=16 * MB):
+    """
+    Cut the rest of the open file into content-defined chunks. Returns
+    the chunks as a list of (start, end, sha256), and the sha256 of the
+    whole file.
+
+    A chunk ends where a rolling hash of the last 32 bytes has maskBits
+    zero bits, but never before minSize bytes or after maxSize. As the
+    cut points depend on the content around them and not on offsets,
+    an edit only changes the chunks it touches, even if it inserts or
+    removes bytes. The chunks are 2 ** maskBits bytes longer than
+    minSize on average.
+
+    minSize is the smallest part S3 takes in a multipart upload, so each
+    chunk can be a part.
+    """
+    mask = ((1 << maskBits) - 1) << (32 - maskBits)
+    whole = hashlib.sha256()
+    chunks = []
+    pos = 0
+    buf = bytearray()
+    eof = False
+
+    while True:
+        while not eof and len(buf) < maxSize:
+            block = fp.read(maxSize - len(buf))
+            if not block:
+                eof = True
+            buf.extend(block)
+        if not buf:
+            break
+
+        cut = _findCut(buf, minSize, min(len(buf), maxSize), mask)
+        if cut is None:
+            cut = len(buf) if eof else maxSize
+
+        chunk = bytes(buf[:cut])
+        whole.update(chunk)
+        chunks.append((pos, pos + cut, hashlib.sha256(chunk).hexdigest()))
+        del buf[:cut]
+        pos += cut
+
+    return chunks, whole.hexdigest()
+
+
+def _findCut(buf, start, end, mask):
+    """
+    The first cut point in buf[start:end], or None.
+    """
+    if numpy is not None:
+        return _findCutNumpy(buf, start, end, mask)
+
+    h = 0
+    gear = _GEAR
+    # The hash only depends on the last 32 bytes, start it that far back
+    first = max(0, start - 32)
+    for i, b in enumerate(buf[first:end], first):
+        h = ((h << 1) + gear[b]) & 0xffffffff
+        if i >= start and not h & mask:
+            return i + 1
+    return None
+
+
+def _findCutNumpy(buf, start, end, mask, step=MB):
+    """
+    _findCut, a step at a time, with the hash at every position worked
+    out at once as the sum of the last 32 bytes' table entries, each
+    shifted by its distance.
+    """
+    gear = numpy.array(_GEAR, dtype=numpy.uint32)
+    data = numpy.frombuffer(buf, dtype=numpy.uint8, count=end)
+    for s in range(start, end, step):
+        first = max(0, s - 31)
+        g = gear[data[first:min(s + step, end)]]
+        h = g.copy()
+        for j in range(1, 32):
+            h[j:] += g[:-j] << numpy.uint32(j)
+        hits = numpy.flatnonzero((h[s - first:] & numpy.uint32(mask)) == 0)
+        if len(hits):
+            return s + int(hits[0]) + 1
+    return None
+
+
+def planParts(chunks, index, size):
+    """
+    The parts of a multipart upload of the chunks, as (start, end, copy).
+    copy is the range of a chunk with the same content in the stored
+    object, as described by its index, or None if the chunk has to be
+    sent.
+    """
+    stored = dict((sha, (start, end)) for start, end, sha in index)
+    parts = []
+    for start, end, sha in chunks:
+        copy = stored.get(sha)
+        # Every part but the last must be at least MIN_PART_SIZE
+        if copy and copy[1] - copy[0] < MIN_PART_SIZE and end < size:
+            copy = None
+        parts.append((start, end, copy))
+    return parts
+
+
+def readIndex(bucket, keyName, etag):
+    """
+    The chunks of keyName, if they were written for the version with
+    this ETag, otherwise an empty list.
+    """
+    with bucket() as bconn:
+        k = bconn.new_key(INDEX_PREFIX + keyName)
+        try:
+            index = json.loads(k.get_contents_as_string().decode('utf-8'))
+        except boto.exception.S3ResponseError as e:
+            if e.status == 404:
+                return []
+            raise
+    if index.get('etag') != etag.strip('"'):
+        return []
+    return [tuple(c) for c in index['chunks']]
+
+
+def writeIndex(bucket, keyName, etag, chunks):
+    """
+    Store the chunks of the version of keyName with this ETag, so the
+    next upload can reuse them.
+    """
+    index = {'etag': etag.strip('"'), 'chunks': chunks}
+    with bucket() as bconn:
+        k = bconn.new_key(INDEX_PREFIX + keyName)
+        k.set_contents_from_string(json.dumps(index))
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+"""
+An HTTP proxy in front of an S3 compatible server, that fails some of
+the requests on purpose, to see how S3Storage copes:
+
+    --slowdown  part of requests answered 503 SlowDown, as S3 throttles
+    --errors    part of requests answered 500 InternalError
+    --resets    part of requests whose connection is reset, no answer
+    --slow      part of requests held for --latency seconds first
+
+The rest are passed on to the server at --upstream. Point S3Storage at
+the proxy, with the path style calling format:
+
+    python faultProxy.py --upstream localhost:5000 -p 5001 --slowdown 0.1 --resets 0.05
+    S3Storage('bucket', host='localhost', port=5001, is_secure=False,
+              calling_format=OrdinaryCallingFormat())
+"""
+
+import argparse
+import random
+import socket
+import struct
+import threading
+import time
+
+try:
+    import httplib
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    import http.client as httplib
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+
+ERROR = """<?xml version="1.0" encoding="UTF-8"?>
+<Error><Code>%s</Code><Message>%s</Message><RequestId>fault</RequestId></Error>"""
+
+# Headers about the connection, not to be passed on
+HOP_HEADERS = ('connection', 'keep-alive', 'transfer-encoding', 'proxy-connection')
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class FaultHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    # Set by main()
+    args = None
+    counts = {}
+    lock = threading.Lock()
+
+    def do_request(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else None
+
+        args = self.args
+        roll = random.random()
+        if roll < args.slowdown:
+            return self._fail('slowdown', 503, 'SlowDown', 'Please reduce your request rate.')
+        roll -= args.slowdown
+        if roll < args.errors:
+            return self._fail('errors', 500, 'InternalError', 'We encountered an internal error.')
+        roll -= args.errors
+        if roll < args.resets:
+            return self._reset()
+        if random.random() < args.slow:
+            self._count('slow')
+            time.sleep(args.latency)
+        self._count('passed')
+
+        headers = dict((k, v) for k, v in self.headers.items() if k.lower() not in HOP_HEADERS)
+        conn = httplib.HTTPConnection(args.upstream, timeout=60)
+        try:
+            conn.request(self.command, self.path, body, headers)
+            response = conn.getresponse()
+            data = response.read()
+        finally:
+            conn.close()
+
+        self.send_response(response.status, response.reason)
+        for k, v in response.getheaders():
+            if k.lower() not in HOP_HEADERS and k.lower() != 'content-length':
+                self.send_header(k, v)
+        if self.command == 'HEAD':
+            self.send_header('Content-Length', response.getheader('Content-Length', '0'))
+        else:
+            self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(data)
+
+    do_GET = do_PUT = do_POST = do_DELETE = do_HEAD = do_request
+
+    def _fail(self, fault, status, code, message):
+        self._count(fault)
+        data = (ERROR % (code, message)).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/xml')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(data)
+
+    def _reset(self):
+        """
+        Close the connection with a RST, as a dropped connection looks.
+        """
+        self._count('resets')
+        self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+        self.close_connection = True
+        self.connection.close()
+
+    def _count(self, what):
+        with self.lock:
+            self.counts[what] = self.counts.get(what, 0) + 1
+
+    def log_message(self, format, *args):
+        if self.args.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--upstream", default="localhost:5000",
+                        help="host:port of the S3 compatible server.")
+    parser.add_argument("-p", "--port", type=int, default=5001,
+                        help="Port to listen on.")
+    parser.add_argument("--slowdown", type=float, default=0.0,
+                        help="Part of requests answered 503 SlowDown.")
+    parser.add_argument("--errors", type=float, default=0.0,
+                        help="Part of requests answered 500 InternalError.")
+    parser.add_argument("--resets", type=float, default=0.0,
+                        help="Part of requests whose connection is reset.")
+    parser.add_argument("--slow", type=float, default=0.0,
+                        help="Part of requests held for --latency seconds.")
+    parser.add_argument("--latency", type=float, default=1.0,
+                        help="Seconds to hold the slow requests.")
+    parser.add_argument("--seed", type=int, help="Seed for the random faults.")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="Log every request.")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    FaultHandler.args = args
+
+    server = ThreadingHTTPServer(('', args.port), FaultHandler)
+    print("Proxying port %d to %s" % (args.port, args.upstream))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(FaultHandler.counts)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+class KeyPath(object):
+    """
+    Turns (path, file) pairs into key names.
+
+    Paths may start with the bucket name, 'mybucket/model-v1.0/uid-1',
+    which is not part of the key, so it is removed. This is what
+    re.match('^mybucket/(.*)$', path) did, with the bucket name taken
+    literally, so a name with '.' or '+' in it only matches itself.
+
+    The prefix to remove is worked out once, when the search bucket is
+    set, and the names built are remembered, up to memoSize of them, as
+    the same few project files are asked for over and over.
+    """
+
+    def __init__(self, bucket, memoSize=10000):
+        self.memoSize = memoSize
+        self.setBucket(bucket)
+
+    def setBucket(self, bucket):
+        """
+        Set the bucket name to remove from the front of paths.
+        """
+        self.bucket = bucket
+        self._prefix = bucket + '/'
+        self._memo = {}
+
+    def build(self, path, file):
+        memo = self._memo
+        name = memo.get((path, file))
+        if name is not None:
+            return name
+
+        # os.path.join, for '/' separated keys on any system
+        if file.startswith('/'):
+            name = file
+        elif not path or path.endswith('/'):
+            name = path + file
+        else:
+            name = path + '/' + file
+
+        if name.startswith(self._prefix):
+            name = name[len(self._prefix):]  # remove the leading bucket!
+
+        if len(memo) >= self.memoSize:
+            memo.clear()
+        memo[path, file] = name
+        return name
+
+    def buildAll(self, pairs):
+        """
+        build() for each (path, file) pair, as a list.
+        """
+        build = self.build
+        return [build(path, file) for path, file in pairs]
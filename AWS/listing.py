@@ -0,0 +1,115 @@
+import threading
+
+try:
+    from Queue import Queue, Empty, Full
+except ImportError:
+    from queue import Queue, Empty, Full
+
+from boto.s3.prefix import Prefix
+
+
+def listKeys(bucket, prefix='', delimiter='', pageSize=1000):
+    """
+    Generate the keys under prefix, fetching a page of pageSize at a
+    time, only when the previous one has been used up. With a delimiter,
+    the keys that have it after the prefix are rolled up into a Prefix
+    for each 'directory'.
+
+    bucket is a function returning a context manager that gives a
+    Bucket, see S3Storage.bucket. No connection is held between pages.
+    """
+    marker = ''
+    while True:
+        with bucket() as bconn:
+            page = bconn.get_all_keys(prefix=prefix, delimiter=delimiter,
+                                      marker=marker, max_keys=pageSize)
+        for k in page:
+            yield k
+
+        if not page.is_truncated or not len(page):
+            return
+        marker = page.next_marker or page[-1].name
+
+
+def listParallel(bucket, prefix='', shards=None, workers=8, pageSize=1000):
+    """
+    Generate all the keys under prefix, listing several shards of it at
+    the same time, in no particular order.
+
+    shards are prefixes that between them cover prefix, such as
+    ['logs/2014-', 'logs/2015-']. If not given, the 'directories' right
+    under prefix are found with one delimited listing, and used as the
+    shards.
+    """
+    if shards is None:
+        shards = []
+        for k in listKeys(bucket, prefix, '/', pageSize):
+            if isinstance(k, Prefix):
+                shards.append(k.name)
+            else:
+                yield k
+
+    listers = [lambda s=s: listKeys(bucket, s, '', pageSize) for s in shards]
+    for k in _merge(listers, workers, pageSize):
+        yield k
+
+
+def _merge(generators, workers, bufferSize):
+    """
+    Run the generator functions in workers threads, and generate what
+    they produce as it comes. Stopping early stops the threads.
+    """
+    todo = Queue()
+    for g in generators:
+        todo.put(g)
+
+    out = Queue(maxsize=bufferSize)
+    stop = threading.Event()
+    finished = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=0.1)
+                return True
+            except Full:
+                pass
+        return False
+
+    def work():
+        try:
+            while not stop.is_set():
+                try:
+                    g = todo.get_nowait()
+                except Empty:
+                    break
+                for item in g():
+                    if not put(item):
+                        return
+        except Exception as e:
+            put(_Failed(e))
+        finally:
+            put(finished)
+
+    threads = [threading.Thread(target=work) for i in range(min(workers, len(generators)))]
+    for t in threads:
+        t.daemon = True
+        t.start()
+
+    try:
+        running = len(threads)
+        while running:
+            item = out.get()
+            if item is finished:
+                running -= 1
+            elif isinstance(item, _Failed):
+                raise item.error
+            else:
+                yield item
+    finally:
+        stop.set()
+
+
+class _Failed(object):
+    def __init__(self, error):
+        self.error = error
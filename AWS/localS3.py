@@ -0,0 +1,100 @@
+"""
+A local S3 compatible server for the tests, such as moto:
+
+    pip install moto[server]
+    moto_server -p 5000 &
+    S3_TEST_ENDPOINT=localhost:5000 python -m unittest discover
+
+Tests that need it are skipped if S3_TEST_ENDPOINT is not set.
+"""
+
+import os
+import uuid
+import socket
+import argparse
+import threading
+
+import boto
+from boto.s3.connection import OrdinaryCallingFormat
+
+from retry import Retrier
+
+ENDPOINT = os.environ.get('S3_TEST_ENDPOINT')
+
+skipReason = "Set S3_TEST_ENDPOINT to host:port of a local S3 compatible server."
+
+
+def connectArgs(port=None):
+    """
+    The boto.connect_s3 arguments for the server, or a proxy of it on
+    port.
+    """
+    host, serverPort = ENDPOINT.split(':')
+    return dict(aws_access_key_id='test', aws_secret_access_key='test',
+                host=host, port=port or int(serverPort), is_secure=False,
+                calling_format=OrdinaryCallingFormat())
+
+
+def newBucket(name='test'):
+    """
+    A new, empty bucket, with a name of its own. Its requests are
+    retried, as moto now and then fails one with a 500.
+    """
+    conn = Retrier().wrap(boto.connect_s3(**connectArgs()))
+    return conn.create_bucket('%s-%s' % (name, uuid.uuid4().hex[:12]))
+
+
+def startProxy(**faults):
+    """
+    Start a faultProxy.py in front of the server, in a thread, with the
+    given fault rates, e.g. slowdown=0.2. Returns the server, which has
+    the port it listens on in server_address, and the counts of the
+    faults it made in RequestHandlerClass.counts. Stop it with
+    stopProxy.
+    """
+    from faultProxy import FaultHandler, ThreadingHTTPServer
+
+    args = argparse.Namespace(upstream=ENDPOINT, slowdown=0.0, errors=0.0, resets=0.0,
+                              slow=0.0, latency=1.0, verbose=False)
+    for name, value in faults.items():
+        setattr(args, name, value)
+
+    class Handler(FaultHandler):
+        pass
+    Handler.args = args
+    Handler.counts = {}
+    Handler.lock = threading.Lock()
+
+    class Server(ThreadingHTTPServer):
+        connections = []
+        threads = []
+
+        def process_request(self, request, clientAddress):
+            t = threading.Thread(target=self.process_request_thread,
+                                 args=(request, clientAddress))
+            t.daemon = True
+            self.connections.append(request)
+            self.threads.append(t)
+            t.start()
+
+    server = Server(('127.0.0.1', 0), Handler)
+    t = threading.Thread(target=server.serve_forever)
+    t.daemon = True
+    t.start()
+    return server
+
+
+def stopProxy(server):
+    """
+    Stop a proxy from startProxy, and drop the connections kept open to
+    it, so that its threads end.
+    """
+    server.shutdown()
+    for connection in server.connections:
+        try:
+            connection.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+    for t in server.threads:
+        t.join(5)
+    server.server_close()
@@ -0,0 +1,166 @@
+import time
+import sqlite3
+import threading
+
+from boto.s3.prefix import Prefix
+
+from listing import listParallel
+
+# Sorts after every character that can be in a key
+_HIGH = u'\U0010ffff'
+
+
+class Manifest(object):
+    """
+    A local index of the keys in a bucket, in a sqlite file.
+
+    Once it has been filled by refresh(), existence checks and directory
+    style browsing are answered from the index, in microseconds and
+    without any request to S3:
+
+        manifest = Manifest('projects.db')
+        manifest.refresh(storage, 'model-v1.0/')
+        manifest.exists('model-v1.0/uid-1/pid-21/model.xml.gz')
+        dirs, files = manifest.listdir('model-v1.0/uid-1/')
+
+    refresh() can be limited to a prefix, so a part of the bucket that
+    is known to have changed can be brought up to date on its own. An
+    S3Storage given the manifest also records its own writes in it, see
+    S3Storage(manifest=...), so it stays current between refreshes.
+
+    Safe to use from several threads.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(filename, check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS keys (
+                name TEXT PRIMARY KEY,
+                size INTEGER,
+                etag TEXT,
+                modified TEXT,
+                seen INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS refreshed (
+                prefix TEXT PRIMARY KEY,
+                time REAL
+            );
+        """)
+
+    def refresh(self, storage, prefix='', workers=8):
+        """
+        Bring the part of the index under prefix up to date with a
+        listing of the bucket, done in parallel shards. Keys that are no
+        longer in the bucket are dropped. Returns the number of keys.
+        """
+        stamp = int(time.time() * 1000)
+        count = 0
+        rows = []
+        for k in listParallel(storage.bucket, prefix, workers=workers):
+            if isinstance(k, Prefix):
+                continue
+            rows.append((k.name, k.size, k.etag.strip('"'), k.last_modified, stamp))
+            if len(rows) >= 1000:
+                self._upsert(rows)
+                count += len(rows)
+                rows = []
+        self._upsert(rows)
+        count += len(rows)
+
+        with self._lock:
+            self._db.execute("DELETE FROM keys WHERE name >= ? AND name < ? AND seen != ?",
+                             (prefix, prefix + _HIGH, stamp))
+            self._db.execute("INSERT OR REPLACE INTO refreshed VALUES (?, ?)",
+                             (prefix, time.time()))
+            self._db.commit()
+        return count
+
+    def record(self, name, size, etag, modified=None):
+        """
+        Add or update one key, e.g. after writing it.
+        """
+        self._upsert([(name, size, (etag or '').strip('"'), modified, 0)])
+
+    def remove(self, name):
+        self.removeMany([name])
+
+    def removeMany(self, names):
+        with self._lock:
+            self._db.executemany("DELETE FROM keys WHERE name = ?", [(n,) for n in names])
+            self._db.commit()
+
+    def exists(self, name):
+        return self.get(name) is not None
+
+    def get(self, name):
+        """
+        (size, etag, modified) of the key, or None if it is not indexed.
+        """
+        with self._lock:
+            return self._db.execute("SELECT size, etag, modified FROM keys WHERE name = ?",
+                                    (name,)).fetchone()
+
+    def keys(self, prefix=''):
+        """
+        The names of the keys under prefix, in order.
+        """
+        with self._lock:
+            rows = self._db.execute("SELECT name FROM keys WHERE name >= ? AND name < ? ORDER BY name",
+                                    (prefix, prefix + _HIGH)).fetchall()
+        return [r[0] for r in rows]
+
+    def listdir(self, prefix='', delimiter='/'):
+        """
+        Directory style listing: (dirs, files) right under prefix. dirs
+        end with the delimiter.
+
+        Each directory costs one index lookup, whatever is inside it, so
+        this is fast even above large trees.
+        """
+        dirs = []
+        files = []
+        query = "SELECT name FROM keys WHERE name > ? AND name < ? ORDER BY name LIMIT 1"
+        upper = prefix + _HIGH
+
+        with self._lock:
+            row = self._db.execute("SELECT name FROM keys WHERE name >= ? AND name < ? ORDER BY name LIMIT 1",
+                                   (prefix, upper)).fetchone()
+            while row:
+                name = row[0]
+                rest = name[len(prefix):]
+                i = rest.find(delimiter)
+                if i < 0:
+                    files.append(name)
+                    after = name
+                else:
+                    d = prefix + rest[:i + len(delimiter)]
+                    dirs.append(d)
+                    after = d + _HIGH
+                row = self._db.execute(query, (after, upper)).fetchone()
+
+        return dirs, files
+
+    def lastRefresh(self, prefix=''):
+        """
+        The time of the last refresh of prefix, or None.
+        """
+        with self._lock:
+            row = self._db.execute("SELECT time FROM refreshed WHERE prefix = ?", (prefix,)).fetchone()
+        return row[0] if row else None
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM keys").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _upsert(self, rows):
+        if not rows:
+            return
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO keys VALUES (?, ?, ?, ?, ?)", rows)
+            self._db.commit()
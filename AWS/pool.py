@@ -0,0 +1,179 @@
+import time
+import threading
+from contextlib import contextmanager
+
+import boto
+import boto.exception
+
+# Error responses from S3. The whole response has been read, so the
+# connection can be used again.
+RESPONSE_ERRORS = (boto.exception.BotoServerError,)
+
+
+class ConnectionPool(object):
+    """
+    A thread-safe pool of boto S3 connections.
+
+    A boto connection can only be used by one thread at a time, but
+    making one for every request means a new TLS handshake every time.
+    The pool keeps up to size connections. A thread takes one for a
+    request, or a few requests, and hands it back, so the keep-alive
+    HTTP connection under it is used again by the next thread. When all
+    size connections are busy, the next thread waits for one.
+
+    Each connection keeps the handles of the buckets it has used, so a
+    bucket is only looked up once per connection.
+
+    Health checks:
+
+        - A connection that has been idle for more than maxIdle seconds
+          is closed and replaced, instead of finding out on the next
+          request that the server dropped it.
+        - A connection used by a with block that raised anything but an
+          error response from S3, e.g. a socket error or a timeout, is
+          closed and not handed out again. It may be broken, or have
+          half a response left on it.
+
+    connect is a function making a new connection, e.g. boto.connect_s3.
+    """
+
+    def __init__(self, connect, size=16, maxIdle=50):
+        self.connect = connect
+        self.size = size
+        self.maxIdle = maxIdle
+
+        self.created = 0
+        self.discarded = 0
+
+        self._idle = []
+        self._count = 0
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def connection(self):
+        """
+        Use a connection from the pool:
+
+            with pool.connection() as conn:
+                conn.get_all_buckets()
+        """
+        with self._use() as entry:
+            yield entry.conn
+
+    @contextmanager
+    def bucket(self, name, validate=True):
+        """
+        Use a handle on the named bucket, from a connection in the pool.
+        The first time a connection uses a bucket, it is looked up with
+        validate, see boto's get_bucket.
+        """
+        with self._use() as entry:
+            bconn = entry.buckets.get(name)
+            if bconn is None:
+                bconn = entry.conn.get_bucket(name, validate=validate)
+                entry.buckets[name] = bconn
+            yield bconn
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self.size,
+                'open': self._count,
+                'idle': len(self._idle),
+                'created': self.created,
+                'discarded': self.discarded,
+            }
+
+    def close(self):
+        """
+        Close all the idle connections.
+        """
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._count -= len(idle)
+            self._cond.notify_all()
+        for entry in idle:
+            _close(entry)
+
+    @contextmanager
+    def _use(self):
+        entry = self._acquire()
+        broken = False
+        try:
+            yield entry
+        except Exception as e:
+            broken = not isinstance(e, RESPONSE_ERRORS)
+            raise
+        finally:
+            self._release(entry, broken)
+
+    def _acquire(self):
+        stale = []
+        with self._cond:
+            while True:
+                entry = self._takeIdle(stale)
+                if entry is not None or self._count < self.size:
+                    break
+                self._cond.wait()
+            if entry is None:
+                self._count += 1
+                self.created += 1
+
+        for old in stale:
+            _close(old)
+        if entry is not None:
+            return entry
+
+        try:
+            return _Entry(self.connect())
+        except Exception:
+            with self._cond:
+                self._count -= 1
+                self._cond.notify()
+            raise
+
+    def _takeIdle(self, stale):
+        """
+        The most recently used idle connection that is still fresh. The
+        ones that have been idle too long are moved to stale.
+        """
+        now = time.time()
+        while self._idle:
+            entry = self._idle.pop()
+            if now - entry.lastUsed < self.maxIdle:
+                return entry
+            stale.append(entry)
+            self._count -= 1
+            self.discarded += 1
+        return None
+
+    def _release(self, entry, broken=False):
+        with self._cond:
+            if broken:
+                self._count -= 1
+                self.discarded += 1
+            else:
+                entry.lastUsed = time.time()
+                self._idle.append(entry)
+            self._cond.notify()
+
+        if broken:
+            _close(entry)
+
+
+class _Entry(object):
+    """
+    A pooled connection, with its bucket handles.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.buckets = {}
+        self.lastUsed = time.time()
+
+
+def _close(entry):
+    try:
+        entry.conn.close()
+    except Exception:
+        pass
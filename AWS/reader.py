@@ -0,0 +1,226 @@
+import io
+import errno
+import threading
+
+import boto
+import boto.exception
+
+from transfer import MB
+from codec import checkRaw
+
+
+def openReader(bucket, keyName, start=0, end=None, blockSize=MB, readAhead=True):
+    """
+    Open an S3 object for reading as a buffered, seekable file.
+
+    Only bytes [start, end) of the object are seen, the whole object if
+    end is None. Positions given to seek() and returned by tell() are
+    relative to start. See S3RawReader.
+    """
+    raw = S3RawReader(bucket, keyName, start, end, blockSize, readAhead)
+    return io.BufferedReader(raw, blockSize)
+
+
+class S3RawReader(io.RawIOBase):
+    """
+    An S3 object as an unbuffered, seekable file.
+
+    Every read is an HTTP Range GET of at least blockSize bytes, so the
+    memory used does not depend on the size of the object, and bytes
+    that are skipped with seek() are never fetched. With readAhead, the
+    next block is fetched in the background while the current one is
+    being used, so reading from start to end does not wait on a round
+    trip for every block. Seeking from the end, before the size is
+    known, fetches the last block, which gives the size.
+
+    All the ranges are fetched with If-Match on the ETag of the first
+    one, so a reader never mixes two versions of an object. Objects
+    stored with a codec can't be read this way, reading them raises an
+    Exception, see codec.checkRaw.
+
+    bucket is a function returning a context manager that gives a Bucket
+    for the calling thread to use, see S3Storage.bucket.
+    """
+
+    def __init__(self, bucket, keyName, start=0, end=None, blockSize=MB, readAhead=True):
+        io.RawIOBase.__init__(self)
+        self.bucket = bucket
+        self.keyName = keyName
+        self.start = start
+        self.end = end
+        self.blockSize = blockSize
+
+        self.pos = 0
+        self.size = None
+        self.etag = None
+
+        # Data already fetched, as (pos, data), or (pos, _Fetch) while
+        # it is still on the way
+        self._ahead = None
+        self.readAhead = readAhead
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self.pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.getSize() + offset
+        else:
+            raise ValueError("Invalid whence ({})".format(whence))
+
+        if pos < 0:
+            raise IOError(errno.EINVAL, "Negative seek position {}".format(pos))
+        self.pos = pos
+        return pos
+
+    def getSize(self):
+        """
+        The number of bytes that can be read, from start to end.
+        """
+        if self.size is None:
+            # The last block tells us, keep it for the next read, as
+            # this is asked for to seek from the end
+            self._ahead = self._fetchTail()
+        return self.size
+
+    def readinto(self, b):
+        n = len(b)
+        if self.size is not None:
+            n = min(n, self.size - self.pos)
+        if n <= 0:
+            return 0
+
+        data = self._take(self.pos, n)
+        b[:len(data)] = data
+        self.pos += len(data)
+
+        if self.readAhead and self._ahead is None and self.pos < self.size:
+            self._ahead = (self.pos, _Fetch(self._fetch, self.pos, self.blockSize))
+        return len(data)
+
+    def close(self):
+        self._ahead = None
+        io.RawIOBase.close(self)
+
+    def _take(self, pos, n):
+        """
+        At most n bytes from pos, from the read ahead if it has them.
+        """
+        if self._ahead is not None:
+            aheadPos, data = self._ahead
+            self._ahead = None
+            if isinstance(data, _Fetch):
+                # Only wait for it if it is of any use
+                data = data.result() if aheadPos <= pos < aheadPos + data.n else b''
+            if aheadPos <= pos < aheadPos + len(data):
+                data = data[pos - aheadPos:]
+                if len(data) > n:
+                    self._ahead = (pos + n, data[n:])
+                    data = data[:n]
+                return data
+
+        data = self._fetch(pos, max(n, self.blockSize))
+        if len(data) > n:
+            self._ahead = (pos + n, data[n:])
+            data = data[:n]
+        return data
+
+    def _fetch(self, pos, n):
+        """
+        GET n bytes from pos, fewer at the end of the object.
+        """
+        first = self.start + pos
+        last = first + n - 1
+        if self.end is not None:
+            last = min(last, self.end - 1)
+        if last < first:
+            return b''
+
+        return self._get('bytes=%d-%d' % (first, last))
+
+    def _fetchTail(self):
+        """
+        GET the last block, as (pos, data). Without an end, this is a
+        suffix range, which gives the size of the object too.
+        """
+        if self.end is not None:
+            pos = max(self.end - self.start - self.blockSize, 0)
+            return pos, self._fetch(pos, self.blockSize)
+
+        data = self._get('bytes=-%d' % self.blockSize)
+        pos = self.size - len(data)
+        if pos < 0:
+            # The block starts before start
+            data = data[-pos:]
+            pos = 0
+        return pos, data
+
+    def _get(self, byteRange):
+        headers = {'Range': byteRange}
+        if self.etag:
+            headers['If-Match'] = self.etag
+
+        with self.bucket() as bconn:
+            k = bconn.new_key(self.keyName)
+            try:
+                data = k.get_contents_as_string(headers=headers)
+            except boto.exception.S3ResponseError as e:
+                if e.status == 404:
+                    data = None
+                elif e.status == 416:
+                    # Past the end of the object, or the object is empty
+                    if self.size is None:
+                        self._setSize(bconn.get_key(self.keyName).size)
+                    return b''
+                else:
+                    raise
+
+        if data is None:
+            raise IOError(errno.ENOENT, "No such key ({}).".format(self.keyName))
+        checkRaw(k)
+
+        self.etag = k.etag
+        self._setSize(k.size)
+        return data
+
+    def _setSize(self, objectSize):
+        end = objectSize if self.end is None else min(self.end, objectSize)
+        self.size = max(end - self.start, 0)
+
+
+class _Fetch(threading.Thread):
+    """
+    One read ahead, running in the background.
+    """
+
+    def __init__(self, fetch, pos, n):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.fetch = fetch
+        self.pos = pos
+        self.n = n
+        self.data = None
+        self.error = None
+        self.start()
+
+    def run(self):
+        try:
+            self.data = self.fetch(self.pos, self.n)
+        except Exception as e:
+            self.error = e
+
+    def result(self):
+        self.join()
+        if self.error is not None:
+            raise self.error
+        return self.data
@@ -1,11 +1,44 @@
 
 import os.path
+from io import BytesIO
 
-from boto.s3.key import Key, KeyFile
+from boto.s3.key import Key
 from boto.s3.bucket import Bucket
+from contextlib import contextmanager
+from functools import wraps
 import textwrap
+import tempfile
+import hashlib
+import threading
 import boto
-import re
+
+from transfer import Transfer, MB
+from reader import openReader
+from pool import ConnectionPool
+from listing import listKeys, listParallel
+from batch import existsMany, deleteMany
+from keypath import KeyPath
+from codec import getCodec, codecOf, checkRaw, headersFor, encode, encodeFile, DecodingWriter
+from retry import Retrier
+from tracing import NULL_TRACER
+import dedup
+import sync
+
+
+def _operation(name, hedge=False, retry=True):
+    """
+    Run the method as the named operation of the storage's Retrier, see
+    Retrier.operation, in a span of the storage's Tracer.
+    """
+    def decorate(method):
+        @wraps(method)
+        def run(self, *args, **kwargs):
+            with self.tracer.span(name):
+                return self.retrier.operation(name, lambda: method(self, *args, **kwargs),
+                                              hedge=hedge, retry=retry)
+        return run
+    return decorate
+
 
 class S3Storage(object):
     """
@@ -21,193 +54,736 @@ class S3Storage(object):
 
     """
 
-    def __init__(self,bucket):
+    def __init__(self, bucket, partSize=8 * MB, workers=8, cache=None, poolSize=16,
+                 manifest=None, codec=None, dedup=False, chunked=False, retrier=None,
+                 tracer=None, **connectArgs):
         """
         Initilize the class with the bucket name to access.
+
+        One S3Storage can be shared by many threads. Requests go over a
+        pool of up to poolSize connections, see pool.ConnectionPool.
+        Files larger than partSize are moved in parts, workers at a time,
+        see transfer.Transfer. If a cache.S3Cache is given, getFileData
+        and getFileMap read through it. If a manifest.Manifest is given,
+        the files written are recorded in it. If a codec is given, such
+        as 'gzip' or 'fast', storeFileData and storeFile compress with it
+        by default, see codec.getCodec.
+
+        With dedup, storeFileData and storeFile do not upload content that
+        is already stored, see dedupStats. With chunked too, files larger
+        than partSize are cut into content-defined chunks, and only the
+        chunks that changed are uploaded, see storeFile.
+
+        Failed requests are retried, with backoff, by retrier, a
+        retry.Retrier, which may also give each operation a deadline, and
+        hedge reads. Its metrics are in retryStats(). Errors that are not
+        worth retrying, or that go on after the retries, are raised.
+
+        With a tracing.Tracer, each operation is timed, with the phases in
+        it: connecting, looking up the bucket, and each request, and the
+        bytes moved are counted. See traceStats().
+
+        Any other arguments are passed on to boto.connect_s3, e.g. host,
+        port, is_secure and calling_format to use a local S3 compatible
+        server.
+
         :param bucket:
+        :param partSize:
+        :param workers:
+        :param cache:
+        :param poolSize:
+        :param manifest:
+        :param codec:
+        :param dedup:
+        :param chunked:
+        :param retrier:
+        :param tracer:
         :return:
         """
 
         self._bucketName = bucket
         self._re_bucket = bucket
+        self._paths = KeyPath(bucket)
         self._conn = None
         self._bconn = {}
+        self._lock = threading.Lock()
+        self._checked = set()
+        self._connectArgs = connectArgs
+        self._requests = {}
+        self._requestLock = threading.Lock()
+        self.retrier = retrier or Retrier()
+        self.tracer = tracer or NULL_TRACER
+        self.pool = ConnectionPool(self._newConnection, poolSize)
+        self.transfer = Transfer(self.bucket, partSize, workers, retrier=self.retrier)
+        self.cache = cache
+        self.manifest = manifest
+        self.codec = getCodec(codec)
+        self.dedup = dedup
+        self.chunked = chunked
+        self._dedupStats = {'stored': 0, 'skipped': 0, 'bytesSent': 0, 'bytesSaved': 0}
+        self._dedupLock = threading.Lock()
 
     def get_connection(self):
         """
         Connect to the S3 service using boto.
+
+        This is a single connection, for use by one thread. The methods
+        of this class use the pool instead, see bucket().
         """
 
+        with self._lock:
+            if not self._conn:
+                self._conn = self._newConnection()
+            return self._conn
+
+    def _newConnection(self):
         # Access key and secret key stored in users ~/.boto
         #conn = S3Connection()
+        with self.tracer.span('connect'):
+            conn = self._countRequests(boto.connect_s3(**self._connectArgs))
+        return self.retrier.wrap(conn)
 
-        if self._conn:
-            return self._conn
+    @contextmanager
+    def bucket(self, bucket=None):
+        """
+        Use a handle on the named bucket, or the initialized bucket, from
+        a pooled connection. The handle must not be used once the with
+        block is done:
+
+            with storage.bucket() as bconn:
+                key = bconn.get_key(name)
+
+        Raises an Exception if the bucket can't be reached.
+        """
+
+        bucket = bucket or self._bucketName
+        if not self._hasBucket(bucket):
+            raise Exception("No connection to bucket ({}).".format(bucket))
+
+        with self.pool.bucket(bucket, validate=False) as bconn:
+            yield bconn
+
+    def _hasBucket(self, bucket):
+        """
+        Check that the bucket can be reached, once.
+        """
+        if bucket not in self._checked:
+            with self.pool.connection() as conn, self.tracer.span('bucket_lookup', bucket=bucket):
+                try:
+                    conn.get_bucket(bucket)
+                except boto.exception.S3ResponseError as e:
+                    return False
+            self._checked.add(bucket)
+        return True
+
+    def _countRequests(self, conn):
+        """
+        Count every request made on the connection, by HTTP method, and
+        time it, up to the response headers, in a 'request.<method>' span.
+        """
+        makeRequest = conn.make_request
+        requests = self._requests
+        lock = self._requestLock
+        tracer = self.tracer
+
+        def counted(method, *args, **kwargs):
+            with lock:
+                requests[method] = requests.get(method, 0) + 1
+            if not tracer.enabled:
+                return makeRequest(method, *args, **kwargs)
+            with tracer.span('request.' + method, key=args[1] if len(args) > 1 else ''):
+                return makeRequest(method, *args, **kwargs)
+
+        conn.make_request = counted
+        return conn
+
+    def requestCounts(self):
+        """
+        The number of requests sent to S3 so far, by HTTP method,
+        e.g. {'GET': 10, 'HEAD': 1}.
+        """
+        with self._requestLock:
+            return dict(self._requests)
+
+    def resetRequestCounts(self):
+        with self._requestLock:
+            self._requests.clear()
 
-        self._conn = boto.connect_s3()
-        return self._conn
+    def traceStats(self):
+        """
+        The byte counters, and the calls and latency percentiles of each
+        operation and phase, see Tracer.stats.
+        """
+        return self.tracer.stats()
+
+    def retryStats(self):
+        """
+        Retries by kind of failure, and the calls, failures, hedges and
+        latency percentiles of each operation, see Retrier.stats.
+        """
+        return self.retrier.stats()
+
+    def dedupStats(self):
+        """
+        What dedup has done so far: files stored and skipped as unchanged,
+        bytes sent and bytes that did not have to be sent.
+        """
+        with self._dedupLock:
+            return dict(self._dedupStats)
+
+    def _countDedup(self, sent, saved):
+        with self._dedupLock:
+            stats = self._dedupStats
+            stats['skipped' if not sent and saved else 'stored'] += 1
+            stats['bytesSent'] += sent
+            stats['bytesSaved'] += saved
+
+    def _storedKey(self, name, digests, codec):
+        """
+        HEAD name, and return the Key, and whether it holds the content
+        with these (sha256, md5) digests, stored with codec.
+        """
+        with self.bucket() as bconn:
+            k = bconn.get_key(name)
+        if k is None:
+            return None, False
+
+        sha, md5 = digests
+        stored = codecOf(k)
+        if (stored and stored.name) != (codec and codec.name):
+            return k, False
+        if k.get_metadata(dedup.SHA256):
+            return k, k.get_metadata(dedup.SHA256) == sha
+        # Written without dedup, but the ETag of a single part upload is
+        # the MD5 of the content
+        return k, not codec and k.etag.strip('"') == md5
 
     def connect_bucket(self, bucket=None):
         """
         Connect to a named bucket, or to the initialilzed bucket.
+
+        The handle is on the single connection from get_connection, see
+        bucket() for one that is safe to use from any thread.
         :param bucket:
         :return:
         """
 
         bucket = bucket or self._bucketName
 
-        if self._bconn.has_key(bucket):
-            return self._bconn[bucket]
+        with self._lock:
+            if bucket in self._bconn:
+                return self._bconn[bucket]
 
         try:
-            bconn = self.get_connection().get_bucket(bucket)
-            self._bconn[bucket] = bconn
-        except boto.S3ResponseError as e:
-            bconn = None
+            with self.tracer.span('connect_bucket', bucket=bucket):
+                bconn = self.get_connection().get_bucket(bucket)
+        except boto.exception.S3ResponseError as e:
+            return None
 
-        return bconn
+        with self._lock:
+            return self._bconn.setdefault(bucket, bconn)
 
     def getBucket(self):
         return self._bucketName
 
-    def getBucketList(self, bucket=None):
+    def getBucketList(self, bucket=None, prefix='', delimiter=''):
         """
-        Call the boto list function on the deafult bucket connection.
+        List the keys in the bucket, or the default bucket, that start
+        with prefix. With a delimiter, keys that have it after the prefix
+        are rolled up into a single Prefix, like a directory.
+
+        The keys are fetched lazily, a page at a time, see
+        listing.listKeys.
         """
 
-        bconn = self.connect_bucket(bucket=bucket)
-        if bconn:
-            return bconn.list()
+        bucket = bucket or self._bucketName
+        if not self._hasBucket(bucket):
+            return []
 
-        return []
+        return listKeys(lambda: self.bucket(bucket), prefix, delimiter)
+
+    def list_parallel(self, prefix='', shards=None, workers=8):
+        """
+        List all the keys under prefix, several shards at once, in no
+        particular order. By default the shards are the directories
+        right under prefix, see listing.listParallel.
+        """
+        return listParallel(self.bucket, prefix, shards, workers)
+
+    def sync(self, src, dst, delete=False, dryRun=False, checksum=False, workers=8):
+        """
+        Make dst a copy of src, copying only the files that differ, see
+        sync.plan. If src is a local directory, it is uploaded to the
+        prefix dst, otherwise the prefix src is downloaded to the local
+        directory dst:
+
+            storage.sync('work/pid-21', 'model-v1.0/uid-1/pid-21')
+            storage.sync('model-v1.0/uid-1/pid-21', 'work/pid-21')
+
+        The keys under the prefix are found with one listing, in parallel
+        shards, instead of a request per file. Files are copied workers at
+        a time. With delete, files in dst that are not in src are deleted.
+        With dryRun, nothing is changed. checksum, see sync.plan, is not
+        used with a codec, as the ETags are those of the compressed data.
+
+        Returns a dict with the names copied and deleted, the number of
+        files that were the same, and the errors by name, see
+        SyncPlan.result.
+        """
+        upload = os.path.isdir(src)
+        localDir, prefix = (src, dst) if upload else (dst, src)
+        prefix = self.buildPath(prefix, '') if prefix else ''
+
+        local = sync.localFiles(localDir) if os.path.isdir(localDir) else {}
+        remote = sync.remoteFiles(self.list_parallel(prefix, workers=workers), prefix)
+        # Compressed files are stored with other sizes and ETags
+        todo = sync.plan(local, remote, upload, localDir, delete,
+                         checksum and not self.codec, sizes=not self.codec)
+        if dryRun:
+            return todo.result(dryRun=True)
+
+        def localName(name):
+            return os.path.join(localDir, *name.split('/'))
+
+        if upload:
+            errors = sync.runAll(lambda n: self.storeFile(localName(n), prefix, n), todo.copy, workers)
+            if todo.delete:
+                failed = self.delete_many([(prefix, n) for n in todo.delete], workers)
+                errors.update((n, e) for n, e in zip(todo.delete, failed) if e)
+        else:
+            def fetch(name):
+                sync.download(lambda fp: self.getFile(prefix, name, fp), localName(name),
+                              remote[name][1])
+            errors = sync.runAll(fetch, todo.copy, workers)
+            errors.update(sync.runAll(lambda n: os.remove(localName(n)), todo.delete, workers))
+
+        return todo.result(errors)
+
+    def setSearchBucket(self, bucket):
+        """
+        If we are moving files, or we think the bucket in the path is wrong,
+        we can specify a new search bucket.
+        """
+
+        b = self._re_bucket
+        self._re_bucket = bucket or self._bucketName
+        self._paths.setBucket(self._re_bucket)
+
+        return b # return previous value
 
     def buildPath(self, path, file):
         """
         The bucket is stored in the paths, so we need to remove it..
+        See keypath.KeyPath.
         """
+        return self._paths.build(path, file)
 
-        path = os.path.join(path, file)
-        m = re.match('^%s/(.*)$' % self._re_bucket,path)
-        if m:
-            path = m.group(1) # remove the leading bucket!
-
-        return path
+    def build_paths(self, pairs):
+        """
+        buildPath for each (path, file) pair, as a list.
+        """
+        return self._paths.buildAll(pairs)
 
-    def getFile(self, path, file, localfile):
+    @_operation('getFile', retry=False)
+    def getFile(self, path, file, localfile, decode=True):
         """
         Read the contents of the file given by path+file into
-        the localfile.
+        the localfile. Large files are fetched in parallel parts.
+
+        A file stored with a codec is decompressed as it arrives, unless
+        decode is False.
 
         :param path:
         :param file:
         :param localfile:
+        :param decode:
         :return:
         """
 
-        bconn = self.connect_bucket()
-        if not bconn:
-            raise Exception("No connection to default bucket ({}).".format(self._bucketName))
+        first = self.transfer.partSize
+        with self.bucket() as bconn:
+            k = Key(bconn)
+            k.name = self.buildPath(path,file)
+            out = DecodingWriter(localfile, lambda: codecOf(k)) if decode else localfile
+            try:
+                # The first part comes with the size and ETag, small files
+                # take just this one request
+                k.get_contents_to_file(out, headers={'Range': 'bytes=0-%d' % (first - 1)})
+            except boto.exception.S3ResponseError as e:
+                if e.status in (404, 416):
+                    return  # missing, or empty
+                raise
+
+        self.tracer.count('bytes.received', k.size)
+        if k.size > first:
+            self.transfer.downloadTo(k.name, out, key=k, offset=first)
+        if decode:
+            out.finish()
+
+    @_operation('download_file', retry=False)
+    def download_file(self, path, file, filename):
+        """
+        Download path+file to the local filename, with parallel ranged
+        GETs. If the download is interrupted, calling this again only
+        fetches the parts that are missing. The file is saved as it is
+        stored, compressed or not.
 
-        k = Key(bconn)
-        k.name = self.buildPath(path,file)
-        if k.exists():
-            k.get_contents_to_file(localfile)
+        :param path:
+        :param file:
+        :param filename:
+        :return:
+        """
+        self.transfer.download(self.buildPath(path,file), filename)
+        self.tracer.count('bytes.received', os.path.getsize(filename))
 
+    @_operation('exists', hedge=True)
     def exists(self,path,file):
         """
         Check if a file exists on the S3 server.
         """
-        bconn = self.connect_bucket()
-        if not bconn:
-            raise Exception("No connection to default bucket ({}).".format(self._bucketName))
+        with self.bucket() as bconn:
+            k = Key(bconn)
+            k.key = self.buildPath(path,file)
+            return k.exists()
+
+    @_operation('exists_many')
+    def exists_many(self, paths, workers=8):
+        """
+        Check if each of the (path, file) pairs exists on the S3 server.
+        Returns a list of True or False, in the same order.
 
-        k = Key(bconn)
-        k.key = self.buildPath(path,file)
-        return k.exists()
+        Uses HEADs, or listings where several files are in the same
+        directory, whichever takes fewer requests, see batch.existsMany.
 
-    def getFileData(self, path, file):
+        :param paths:
+        :param workers:
+        :return:
+        """
+        return existsMany(self.bucket, self.build_paths(paths), workers)
+
+    @_operation('getFileData', hedge=True)
+    def getFileData(self, path, file, decode=True):
         """
         Get file data as a string.
 
+        A file stored with a codec is decompressed, unless decode is
+        False. The cache always holds decompressed data.
+
         :param path:
         :param file:
+        :param decode:
         :return:
         """
-        bconn = self.connect_bucket()
-        if not bconn:
-            raise Exception("No connection to default bucket ({}).".format(self._bucketName))
+        with self.bucket() as bconn:
+            k = Key(bconn)
+            k.key = self.buildPath(path,file)
+            if self.cache and decode:
+                return self.cache.get(self._cacheKey(k.key), self._cacheFetch(bconn, k.key))
+
+            out = BytesIO()
+            w = DecodingWriter(out, lambda: codecOf(k) if decode else None)
+            try:
+                k.get_contents_to_file(w)
+            except boto.exception.S3ResponseError as e:
+                if e.status == 404:
+                    return None  # a missing file
+                raise
+            w.finish()
+
+        self.tracer.count('bytes.received', k.size)
+        return out.getvalue()
+
+    @_operation('getFileMap')
+    def getFileMap(self, path, file):
+        """
+        Get file data as a read-only mmap of the cached copy, so large
+        files are not read into memory. Without a cache this is the
+        same as getFileData.
 
-        k = Key(bconn)
-        k.key = self.buildPath(path,file)
-        fileData = None
-        try:
-            if k.exists():
-                fileData = k.get_contents_as_string()
-            else:
-                return None
-        except boto.exception.S3ResponseError as e:
-            pass
+        :param path:
+        :param file:
+        :return:
+        """
+        if not self.cache:
+            return self.getFileData(path, file)
+
+        name = self.buildPath(path,file)
+        with self.bucket() as bconn:
+            return self.cache.getMap(self._cacheKey(name), self._cacheFetch(bconn, name))
+
+    def _cacheKey(self, name):
+        return self._bucketName + '/' + name
 
-        return fileData
+    def _cacheFetch(self, bconn, name):
+        """
+        The fetch function for S3Cache.get: a GET of name, conditional on
+        the cached ETag.
+        """
+        def fetch(etag):
+            k = Key(bconn)
+            k.key = name
+            headers = {'If-None-Match': etag} if etag else None
+            out = BytesIO()
+            w = DecodingWriter(out, lambda: codecOf(k))
+            try:
+                k.get_contents_to_file(w, headers=headers)
+            except boto.exception.S3ResponseError as e:
+                if e.status in (304, 404):
+                    return e.status, None, None
+                raise
+            w.finish()
+            self.tracer.count('bytes.received', k.size)
+            return 200, k.etag, out.getvalue()
+        return fetch
 
     def get_file_from_location(self, path, file, location):
         """
         Perform a file seek, and return the file contents from that position.
 
-        Uses the KeyFile to perform low-level file operations.
+        Uses a single ranged GET. Returns None if the file is missing.
+        To read a large file bit by bit, use open_file instead. Raises an
+        Exception if the file is stored compressed, see get_range.
 
         :param path:
         :param file:
         :param location:
         :return:
         """
+        return self.get_range(path, file, location)
 
-        bconn = self.connect_bucket()
-        if not bconn:
-            raise Exception("No connection to default bucket ({}).".format(self._bucketName))
-
-        k = Key(bconn)
-        k.key = self.buildPath(path,file)
+    @_operation('get_range', hedge=True)
+    def get_range(self, path, file, start, end=None):
+        """
+        Return bytes [start, end) of the file, to the end of the file if
+        end is None, with a single ranged GET. Returns None if the file
+        is missing. A file stored with a codec can't be read in ranges,
+        as the offsets would be those of the compressed data, so it
+        raises an Exception, see codec.checkRaw. Use getFileData.
 
-        data = None
-        if k.exists():
-            kf = KeyFile(k)
-            kf.seek(location)
-            size = k.size
-            data = kf.read(size-location)
+        :param path:
+        :param file:
+        :param start:
+        :param end:
+        :return:
+        """
 
+        if end is not None and end <= start:
+            return ''
+
+        last = '' if end is None else end - 1
+        with self.bucket() as bconn:
+            k = Key(bconn)
+            k.key = self.buildPath(path,file)
+            try:
+                data = k.get_contents_as_string(headers={'Range': 'bytes=%d-%s' % (start, last)})
+            except boto.exception.S3ResponseError as e:
+                if e.status == 404:
+                    return None
+                if e.status == 416:
+                    return ''  # start is at or past the end
+                raise
+        checkRaw(k)
+        self.tracer.count('bytes.received', len(data))
         return data
 
+    def open_file(self, path, file, start=0, end=None, blockSize=MB):
+        """
+        Open the file for reading, as a seekable file object that fetches
+        the bytes it needs with ranged GETs, blockSize at a time, reading
+        the next block ahead. Memory use does not depend on the size of
+        the file. See reader.S3RawReader.
+
+        Only bytes [start, end) of the file are seen if they are given.
+        A file stored with a codec can't be read this way, see get_range.
 
-    def storeFileData(self, path, file, data):
+            with storage.open_file('logs', 'sim.log') as fp:
+                fp.seek(-65536, 2)
+                for line in fp:
+                    ...
+
+        :param path:
+        :param file:
+        :param start:
+        :param end:
+        :param blockSize:
+        :return:
         """
-        Write data to the path+file.
+        return openReader(self.bucket, self.buildPath(path,file), start, end, blockSize)
+
+    @_operation('storeFileData')
+    def storeFileData(self, path, file, data, codec=None):
+        """
+        Write data to the path+file, compressed with codec, or the
+        default codec, if there is one. The codec is recorded in the
+        metadata of the file, so getFileData knows how to read it.
+        Text data is stored UTF-8 encoded.
 
         :param path:
         :param file:
         :param data:
+        :param codec:
         :return:
         """
-        bconn = self.connect_bucket()
-        if not bconn:
-            raise Exception("No connection to default bucket ({}).".format(self._bucketName))
+        if not isinstance(data, bytes):
+            data = data.encode('utf-8')
+        codec = getCodec(codec) or self.codec
+        headers = headersFor(codec)
+        if self.dedup:
+            digests = (hashlib.sha256(data).hexdigest(), hashlib.md5(data).hexdigest())
+            old, same = self._storedKey(self.buildPath(path,file), digests, codec)
+            if same:
+                self._countDedup(0, old.size)
+                return
+            headers['x-amz-meta-' + dedup.SHA256] = digests[0]
+
+        stored = encode(data, codec) if codec else data
+        with self.bucket() as bconn:
+            k = Key(bconn)
+            k.key = self.buildPath(path,file)
+            try:
+                fileData = k.set_contents_from_string(stored, headers=headers)
+                self.tracer.count('bytes.sent', len(stored))
+                if self.dedup:
+                    self._countDedup(len(stored), 0)
+                if self.cache:
+                    self.cache.put(self._cacheKey(k.key), k.etag, data)
+                if self.manifest:
+                    self.manifest.record(k.key, len(stored), k.etag)
+            except Exception:
+                # The write may or may not have happened
+                if self.cache:
+                    self.cache.invalidate(self._cacheKey(k.key))
+                raise
+
+    @_operation('removeFile')
+    def removeFile(self, path, file):
+        """
+        Delete path+file. Deleting a file that does not exist is not an
+        error. With dedup, its chunk list goes too, see dedup.writeIndex.
+        """
+        name = self.buildPath(path,file)
+        with self.bucket() as bconn:
+            if self.dedup:
+                result = bconn.delete_keys([name, dedup.INDEX_PREFIX + name], quiet=True)
+                for e in result.errors:
+                    if e.key == name:
+                        raise Exception("Can't delete ({}): {}: {}".format(name, e.code, e.message))
+            else:
+                bconn.delete_key(name)
+        self._forget([name])
 
-        k = Key(bconn)
-        k.key = self.buildPath(path,file)
-        try:
-            fileData = k.set_contents_from_string(data)
-        except boto.exception.S3ResponseError as e:
-            pass
+    @_operation('delete_many')
+    def delete_many(self, paths, workers=8):
+        """
+        Delete each of the (path, file) pairs, up to 1000 a request.
+        Returns a list in the same order, with None for each file that
+        was deleted, or was not there, and the S3 error for the others.
+        With dedup, their chunk lists go too, see dedup.writeIndex.
 
-    def storeFile(self,localfile,path,file):
-        bconn = self.connect_bucket()
-        if not bconn:
-            raise Exception("No connection to default bucket ({}).".format(self._bucketName))
+        :param paths:
+        :param workers:
+        :return:
+        """
+        names = self.build_paths(paths)
+        indexes = [dedup.INDEX_PREFIX + n for n in names] if self.dedup else []
+        errors = deleteMany(self.bucket, names + indexes, workers)[:len(names)]
+        self._forget([n for n, e in zip(names, errors) if e is None])
+        return errors
 
-        k = Key(bconn)
-        k.name = os.path.join(path,file)
-        print ("Key name:%s" % k.name)
-        k.set_contents_from_filename(localfile,replace=True)
+    def _forget(self, names):
+        """
+        Drop deleted keys from the cache and the manifest.
+        """
+        if self.cache:
+            for name in names:
+                self.cache.invalidate(self._cacheKey(name))
+        if self.manifest:
+            self.manifest.removeMany(names)
+
+    @_operation('storeFile')
+    def storeFile(self,localfile,path,file,codec=None):
+        """
+        Upload the localfile to path+file, compressed with codec, or the
+        default codec, if there is one. The file is compressed a chunk at
+        a time into a temporary file, which is then uploaded.
+
+        With dedup, the file is hashed first, and not uploaded at all if
+        the stored file has the same content. With chunked, a file larger
+        than partSize, and not compressed, is cut into content-defined
+        chunks, see dedup.contentChunks. Each is a part of a multipart
+        upload, and the chunks that the stored file already has are
+        copied from it by S3, instead of being sent again.
+        """
+        codec = getCodec(codec) or self.codec
+        name = self.buildPath(path,file)
+        headers = headersFor(codec)
+        size = os.path.getsize(localfile)
+
+        if self.dedup:
+            chunks = None
+            with open(localfile, 'rb') as fp:
+                if self.chunked and not codec and size > self.transfer.partSize:
+                    chunks, sha = dedup.contentChunks(fp)
+                    digests = (sha, None)
+                else:
+                    digests = dedup.contentDigest(fp)
+
+            old, same = self._storedKey(name, digests, codec)
+            if same:
+                self._countDedup(0, old.size)
+                return
+            headers['x-amz-meta-' + dedup.SHA256] = digests[0]
+            if chunks:
+                return self._storeChunks(localfile, name, chunks, old, headers)
+
+        if codec:
+            with tempfile.NamedTemporaryFile(suffix='.' + codec.name) as tmp:
+                with open(localfile, 'rb') as src:
+                    encodeFile(src, tmp, codec)
+                tmp.flush()
+                self._storeFile(tmp.name, name, headers)
+        else:
+            self._storeFile(localfile, name, headers)
+
+    def _storeChunks(self, localfile, name, chunks, old, headers):
+        """
+        Upload a file as the given chunks, copying the ones the old Key
+        has, and keep its chunk list for next time.
+        """
+        size = os.path.getsize(localfile)
+        index = dedup.readIndex(self.bucket, name, old.etag) if old is not None else []
+        parts = dedup.planParts(chunks, index, size)
+        sent, etag = self.transfer.uploadParts(localfile, name, parts, headers,
+                                               old.etag if old is not None else None)
+        dedup.writeIndex(self.bucket, name, etag, chunks)
+        self._countDedup(sent, size - sent)
+        self.tracer.count('bytes.sent', sent)
+
+        if self.cache:
+            self.cache.invalidate(self._cacheKey(name))
+        if self.manifest:
+            self.manifest.record(name, size, etag)
+
+    def _storeFile(self, localfile, name, headers=None):
+        size = os.path.getsize(localfile)
+        etag = None
+        if self.dedup:
+            self._countDedup(size, 0)
+        if size > self.transfer.partSize:
+            # Multipart, resumes an earlier upload of the same key
+            self.transfer.upload(localfile, name, headers)
+        else:
+            with self.bucket() as bconn:
+                k = Key(bconn)
+                k.name = name
+                k.set_contents_from_filename(localfile,replace=True,headers=headers)
+                etag = k.etag
+        self.tracer.count('bytes.sent', size)
+
+        if self.cache:
+            self.cache.invalidate(self._cacheKey(name))
+        if self.manifest:
+            self.manifest.record(name, size, etag)
 
 
 def main():
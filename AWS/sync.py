@@ -0,0 +1,168 @@
+import os
+import calendar
+import hashlib
+import tempfile
+from multiprocessing.pool import ThreadPool
+
+import boto.utils
+from boto.s3.prefix import Prefix
+
+# Ending of the files downloads are written to, '.<name>.<random>.sync-partial'
+PARTIAL = '.sync-partial'
+
+
+class SyncPlan(object):
+    """
+    What a sync has to do: the relative names of the files to copy, and
+    of the files to delete from the destination, with the number of
+    files that are the same on both sides.
+    """
+
+    def __init__(self, copy, delete, same):
+        self.copy = copy
+        self.delete = delete
+        self.same = same
+
+    def result(self, errors=None, dryRun=False):
+        """
+        The plan as the dict returned by sync: copied, deleted, same,
+        errors by name, and dryRun. A file with an error was not copied
+        or deleted.
+        """
+        errors = errors or {}
+        return {'copied': [n for n in self.copy if n not in errors],
+                'deleted': [n for n in self.delete if n not in errors],
+                'same': self.same,
+                'errors': errors,
+                'dryRun': dryRun}
+
+
+def localFiles(localDir):
+    """
+    The files under localDir, as {name: (size, mtime)}. Names are
+    relative to localDir, with '/' separators, as in key names.
+    """
+    files = {}
+    for root, dirs, names in os.walk(localDir):
+        rel = os.path.relpath(root, localDir)
+        for name in names:
+            if name.startswith('.') and name.endswith(PARTIAL):
+                continue  # a download in progress, see download()
+            st = os.stat(os.path.join(root, name))
+            if rel != '.':
+                name = os.path.join(rel, name)
+            files[name.replace(os.sep, '/')] = (st.st_size, st.st_mtime)
+    return files
+
+
+def remoteFiles(keys, prefix):
+    """
+    The keys under prefix, as {name: (size, mtime, etag)}, from one
+    listing. Names are relative to prefix.
+    """
+    files = {}
+    for k in keys:
+        if isinstance(k, Prefix) or k.name.endswith('/'):
+            continue
+        mtime = calendar.timegm(boto.utils.parse_ts(k.last_modified).timetuple())
+        files[k.name[len(prefix):]] = (k.size, mtime, k.etag.strip('"'))
+    return files
+
+
+def plan(local, remote, upload, localDir, delete=False, checksum=False, sizes=True):
+    """
+    Compare the local and remote files, and work out what a sync in the
+    given direction has to copy, and delete if delete is set.
+
+    A file is copied if it is missing from the destination, has another
+    size, or the source is newer: S3 gives the time a key was stored, so
+    an upload is newer than the local file it came from, and downloads
+    are given the time of the key, see download(). If sizes is not set,
+    e.g. the stored files are compressed, sizes are not compared.
+
+    With checksum, files of the same size are compared by content
+    instead of time, hashing the local file, as long as the ETag is its
+    MD5. The ETag of a multipart upload is not, and for those the times
+    are compared.
+    """
+    source, dest = (local, remote) if upload else (remote, local)
+    copy = []
+    same = 0
+    for name in sorted(source):
+        if name not in dest:
+            copy.append(name)
+            continue
+        size, mtime = local[name]
+        rsize, rmtime, etag = remote[name]
+        if sizes and size != rsize:
+            copy.append(name)
+        elif checksum and '-' not in etag:
+            if fileMd5(os.path.join(localDir, name)) != etag:
+                copy.append(name)
+            else:
+                same += 1
+        elif (int(mtime) > rmtime) if upload else (rmtime > int(mtime)):
+            copy.append(name)
+        else:
+            same += 1
+
+    extra = sorted(set(dest) - set(source)) if delete else []
+    return SyncPlan(copy, extra, same)
+
+
+def fileMd5(filename, blockSize=1024 * 1024):
+    md5 = hashlib.md5()
+    with open(filename, 'rb') as fp:
+        while True:
+            block = fp.read(blockSize)
+            if not block:
+                break
+            md5.update(block)
+    return md5.hexdigest()
+
+
+def download(fetch, filename, mtime):
+    """
+    Call fetch(fp) to write a file, into a temporary file that is only
+    renamed to filename once complete, and give it the time of the key.
+    The temporary file is named '.<name>.<random>.sync-partial', which
+    localFiles skips.
+    """
+    folder = os.path.dirname(filename)
+    if folder and not os.path.isdir(folder):
+        try:
+            os.makedirs(folder)
+        except OSError:
+            if not os.path.isdir(folder):
+                raise
+    prefix = '.%s.' % os.path.basename(filename)
+    fd, tmp = tempfile.mkstemp(dir=folder or '.', prefix=prefix, suffix=PARTIAL)
+    try:
+        with os.fdopen(fd, 'wb') as fp:
+            fetch(fp)
+        os.utime(tmp, (mtime, mtime))
+        os.rename(tmp, filename)
+    except Exception:
+        os.remove(tmp)
+        raise
+
+
+def runAll(func, names, workers):
+    """
+    Call func(name) for each name, workers at a time. Returns the errors,
+    as {name: message}.
+    """
+    def run(name):
+        try:
+            func(name)
+        except Exception as e:
+            return name, str(e) or e.__class__.__name__
+        return None
+
+    if not names:
+        return {}
+    pool = ThreadPool(min(workers, len(names)))
+    try:
+        return dict(r for r in pool.map(run, names) if r)
+    finally:
+        pool.terminate()
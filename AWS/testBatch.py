@@ -0,0 +1,79 @@
+import os
+import sys
+import unittest
+
+import localS3
+from s3 import S3Storage
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'Meetings', '2014-04-08', 'boto'))
+from awslib.storage import BasicStorage
+
+
+@unittest.skipUnless(localS3.ENDPOINT, localS3.skipReason)
+class BatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.bconn = localS3.newBucket('batch')
+        self.storage = S3Storage(self.bconn.name, **localS3.connectArgs())
+
+    def store(self, paths):
+        for path, file in paths:
+            self.bconn.new_key(path + '/' + file).set_contents_from_string(b'x')
+
+    def test_deleteOverOneBatch(self):
+        paths = [('dir', 'f%04d' % i) for i in range(1100)]
+        self.store(paths)
+
+        self.storage.resetRequestCounts()
+        errors = self.storage.delete_many(paths + [('dir', 'missing')])
+
+        self.assertEqual(errors, [None] * 1101)
+        # One multi-object delete of 1000 keys, and one of the rest
+        self.assertEqual(self.storage.requestCounts().get('POST'), 2)
+        self.assertEqual(list(self.storage.getBucketList(prefix='dir/')), [])
+
+    def test_existsMany(self):
+        self.store([('a', 'f%d' % i) for i in range(0, 10, 2)] + [('b', 'one')])
+
+        paths = [('a', 'f%d' % i) for i in range(10)] + [('b', 'one'), ('c', 'none')]
+        found = self.storage.exists_many(paths)
+
+        self.assertEqual(found, [i % 2 == 0 for i in range(10)] + [True, False])
+
+
+@unittest.skipUnless(localS3.ENDPOINT, localS3.skipReason)
+class BasicStorageBatchTest(unittest.TestCase):
+    """
+    BasicStorage checks and deletes through its copy of batch.py.
+    """
+
+    def setUp(self):
+        self.bconn = localS3.newBucket('basic-batch')
+        self.storage = BasicStorage(self.bconn.name, **localS3.connectArgs())
+        self.storage.connect()
+
+    def store(self, paths):
+        for path, file in paths:
+            self.bconn.new_key(path + '/' + file).set_contents_from_string(b'x')
+
+    def test_deleteOverOneBatch(self):
+        paths = [('dir', 'f%04d' % i) for i in range(1100)]
+        self.store(paths)
+
+        errors = self.storage.deleteMany(paths + [('dir', 'missing')])
+
+        self.assertEqual(errors, [None] * 1101)
+        self.assertEqual(list(self.bconn.list(prefix='dir/')), [])
+
+    def test_existsMany(self):
+        self.store([('a', 'f%d' % i) for i in range(0, 10, 2)] + [('b', 'one')])
+
+        paths = [('a', 'f%d' % i) for i in range(10)] + [('b', 'one'), ('c', 'none')]
+        found = self.storage.existsMany(paths)
+
+        self.assertEqual(found, [i % 2 == 0 for i in range(10)] + [True, False])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import gzip
+import os
+import unittest
+from io import BytesIO
+
+import codec
+from codec import CODECS, DecodingWriter, getCodec, codecOf, checkRaw, headersFor
+from codec import encode, decode, encodeFile
+
+
+class FakeKey(object):
+    """
+    The metadata of a boto Key.
+    """
+
+    def __init__(self, name, metadata):
+        self.name = name
+        self.metadata = metadata
+
+    def get_metadata(self, name):
+        return self.metadata.get(name)
+
+
+class CodecTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data = os.urandom(100000) + b'abc' * 100000
+
+    def test_roundTrip(self):
+        for c in CODECS.values():
+            packed = encode(self.data, c)
+            self.assertTrue(len(packed) < len(self.data), c.name)
+            self.assertEqual(decode(packed, c), self.data, c.name)
+
+    def test_gzipIsGzip(self):
+        packed = encode(self.data, getCodec('gzip'))
+        self.assertEqual(gzip.GzipFile(fileobj=BytesIO(packed)).read(), self.data)
+
+    def test_encodeFile(self):
+        for c in CODECS.values():
+            out = BytesIO()
+            encodeFile(BytesIO(self.data), out, c, chunkSize=1000)
+            self.assertEqual(decode(out.getvalue(), c), self.data, c.name)
+
+    def test_decodingWriterInPieces(self):
+        c = getCodec('gzip')
+        packed = encode(self.data, c)
+        out = BytesIO()
+        w = DecodingWriter(out, lambda: c)
+        for i in range(0, len(packed), 777):
+            w.write(packed[i:i + 777])
+        w.finish()
+        self.assertEqual(out.getvalue(), self.data)
+
+    def test_decodingWriterWithoutCodec(self):
+        out = BytesIO()
+        w = DecodingWriter(out, lambda: None)
+        w.write(b'plain')
+        w.finish()
+        self.assertEqual(out.getvalue(), b'plain')
+
+    def test_dataAfterTheEnd(self):
+        c = getCodec('gzip')
+        w = DecodingWriter(BytesIO(), c)
+        w.write(encode(b'data', c) + b'more')
+        self.assertRaises(Exception, w.finish)
+
+    def test_getCodec(self):
+        self.assertEqual(getCodec(None), None)
+        gz = getCodec('gzip')
+        self.assertEqual(gz.name, 'gzip')
+        self.assertTrue(getCodec(gz) is gz)
+        self.assertTrue(getCodec('fast') in CODECS.values())
+        self.assertRaises(Exception, getCodec, 'nope')
+
+    def test_metadata(self):
+        gz = getCodec('gzip')
+        self.assertEqual(headersFor(gz), {'x-amz-meta-codec': 'gzip'})
+        self.assertEqual(headersFor(None), {})
+
+        stored = FakeKey('k', {codec.METADATA: 'gzip'})
+        self.assertTrue(codecOf(stored) is gz)
+        self.assertEqual(codecOf(FakeKey('k', {})), None)
+
+    def test_checkRaw(self):
+        checkRaw(FakeKey('k', {}))
+        self.assertRaises(Exception, checkRaw, FakeKey('k', {codec.METADATA: 'gzip'}))
+
+
+if __name__ == '__main__':
+    unittest.main()
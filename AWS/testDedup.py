@@ -0,0 +1,89 @@
+import hashlib
+import random
+import unittest
+from io import BytesIO
+
+import dedup
+from dedup import contentChunks, contentDigest, planParts
+from transfer import MIN_PART_SIZE
+
+# Small chunks, so the tests are quick
+SIZES = dict(minSize=1024, maskBits=10, maxSize=8192)
+
+
+def randomBytes(n, seed):
+    r = random.Random(seed)
+    return bytes(bytearray(r.getrandbits(8) for i in range(n)))
+
+
+class ContentChunksTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data = randomBytes(200000, 1)
+
+    def test_chunksCoverTheFile(self):
+        chunks, sha = contentChunks(BytesIO(self.data), **SIZES)
+
+        self.assertEqual(sha, hashlib.sha256(self.data).hexdigest())
+        self.assertEqual(chunks[0][0], 0)
+        self.assertEqual(chunks[-1][1], len(self.data))
+        for (start, end, digest), following in zip(chunks, chunks[1:] + [None]):
+            self.assertEqual(digest, hashlib.sha256(self.data[start:end]).hexdigest())
+            self.assertTrue(end - start <= SIZES['maxSize'])
+            if following is not None:
+                self.assertEqual(following[0], end)
+                self.assertTrue(end - start >= SIZES['minSize'])
+
+    def test_insertOnlyChangesNearbyChunks(self):
+        chunks, sha = contentChunks(BytesIO(self.data), **SIZES)
+        edited = self.data[:5000] + b'inserted' + self.data[5000:]
+        after, sha = contentChunks(BytesIO(edited), **SIZES)
+
+        before = set(c[2] for c in chunks)
+        changed = [c for c in after if c[2] not in before]
+        self.assertTrue(len(changed) <= 2, changed)
+
+    def test_sameCutsWithoutNumpy(self):
+        if dedup.numpy is None:
+            self.skipTest("numpy is not installed")
+        chunks, sha = contentChunks(BytesIO(self.data), **SIZES)
+        numpy, dedup.numpy = dedup.numpy, None
+        try:
+            plain, sha = contentChunks(BytesIO(self.data), **SIZES)
+        finally:
+            dedup.numpy = numpy
+        self.assertEqual(plain, chunks)
+
+    def test_empty(self):
+        self.assertEqual(contentChunks(BytesIO(b''), **SIZES),
+                         ([], hashlib.sha256(b'').hexdigest()))
+
+    def test_contentDigest(self):
+        self.assertEqual(contentDigest(BytesIO(self.data), blockSize=1000),
+                         (hashlib.sha256(self.data).hexdigest(), hashlib.md5(self.data).hexdigest()))
+
+
+class PlanPartsTest(unittest.TestCase):
+
+    def test_copiesStoredChunks(self):
+        big = MIN_PART_SIZE
+        chunks = [(0, big, 'a'), (big, 2 * big, 'b'), (2 * big, 2 * big + 10, 'c')]
+        index = [(0, big, 'b'), (big, big + 10, 'c')]
+
+        self.assertEqual(planParts(chunks, index, 2 * big + 10),
+                         [(0, big, None),
+                          (big, 2 * big, (0, big)),
+                          (2 * big, 2 * big + 10, (big, big + 10))])
+
+    def test_smallCopyOnlyAtTheEnd(self):
+        big = MIN_PART_SIZE
+        # A copied part smaller than MIN_PART_SIZE may only be the last
+        chunks = [(0, 10, 'small'), (10, big + 10, 'b')]
+        index = [(0, 10, 'small'), (10, big + 10, 'b')]
+
+        self.assertEqual(planParts(chunks, index, big + 10),
+                         [(0, 10, None), (10, big + 10, (10, big + 10))])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import tempfile
+import unittest
+
+import localS3
+from keypath import KeyPath
+from s3 import S3Storage
+
+
+class KeyPathTest(unittest.TestCase):
+
+    def test_build(self):
+        paths = KeyPath('mybucket')
+        self.assertEqual(paths.build('model-v1/uid-1', 'f.txt'), 'model-v1/uid-1/f.txt')
+        self.assertEqual(paths.build('model-v1/', 'f.txt'), 'model-v1/f.txt')
+        self.assertEqual(paths.build('', 'f.txt'), 'f.txt')
+        self.assertEqual(paths.build('model-v1', '/top.txt'), '/top.txt')
+
+    def test_removesBucket(self):
+        paths = KeyPath('mybucket')
+        self.assertEqual(paths.build('mybucket/model-v1', 'f.txt'), 'model-v1/f.txt')
+        self.assertEqual(paths.build('mybucketx/model-v1', 'f.txt'), 'mybucketx/model-v1/f.txt')
+
+    def test_bucketNameIsLiteral(self):
+        paths = KeyPath('my.bucket+1')
+        self.assertEqual(paths.build('my.bucket+1/d', 'f'), 'd/f')
+        self.assertEqual(paths.build('myxbucket+1/d', 'f'), 'myxbucket+1/d/f')
+        self.assertEqual(paths.build('my.bucket1/d', 'f'), 'my.bucket1/d/f')
+
+    def test_setBucket(self):
+        paths = KeyPath('one')
+        self.assertEqual(paths.build('one/d', 'f'), 'd/f')
+        paths.setBucket('two')
+        self.assertEqual(paths.build('one/d', 'f'), 'one/d/f')
+        self.assertEqual(paths.build('two/d', 'f'), 'd/f')
+
+    def test_buildAll(self):
+        paths = KeyPath('b', memoSize=2)
+        pairs = [('b/d', 'f%d' % i) for i in range(5)] * 2
+        self.assertEqual(paths.buildAll(pairs), ['d/f%d' % i for i in range(5)] * 2)
+        self.assertTrue(len(paths._memo) <= 2)
+
+
+@unittest.skipUnless(localS3.ENDPOINT, localS3.skipReason)
+class StoreFileKeyTest(unittest.TestCase):
+
+    def test_storeFileRemovesBucket(self):
+        bconn = localS3.newBucket('keypath')
+        storage = S3Storage(bconn.name, **localS3.connectArgs())
+        fd, filename = tempfile.mkstemp()
+        try:
+            with os.fdopen(fd, 'wb') as fp:
+                fp.write(b'data')
+            storage.storeFile(filename, bconn.name + '/d', 'f')
+        finally:
+            os.remove(filename)
+
+        self.assertEqual([k.name for k in bconn.list()], ['d/f'])
+        self.assertEqual(storage.getFileData(bconn.name + '/d', 'f'), b'data')
+
+
+if __name__ == '__main__':
+    unittest.main()
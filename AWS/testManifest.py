@@ -0,0 +1,77 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import localS3
+from manifest import Manifest
+from s3 import S3Storage
+
+
+class ManifestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.manifest = Manifest(os.path.join(self.dir, 'keys.db'))
+        for name in ['a/1', 'a/2', 'a/b/3', 'a/b/c/4', 'a/d/5', 'ab', 'z']:
+            self.manifest.record(name, 1, '"etag"')
+
+    def tearDown(self):
+        self.manifest.close()
+        shutil.rmtree(self.dir)
+
+    def test_record(self):
+        self.assertTrue(self.manifest.exists('a/1'))
+        self.assertFalse(self.manifest.exists('a/9'))
+        self.assertEqual(self.manifest.get('a/1'), (1, 'etag', None))
+        self.assertEqual(len(self.manifest), 7)
+
+    def test_keys(self):
+        self.assertEqual(self.manifest.keys('a/b/'), ['a/b/3', 'a/b/c/4'])
+        self.assertEqual(self.manifest.keys('a'), ['a/1', 'a/2', 'a/b/3', 'a/b/c/4', 'a/d/5', 'ab'])
+
+    def test_listdir(self):
+        self.assertEqual(self.manifest.listdir('a/'), (['a/b/', 'a/d/'], ['a/1', 'a/2']))
+        self.assertEqual(self.manifest.listdir(), (['a/'], ['ab', 'z']))
+        self.assertEqual(self.manifest.listdir('none/'), ([], []))
+
+    def test_remove(self):
+        self.manifest.removeMany(['a/1', 'a/b/3'])
+        self.manifest.remove('z')
+        self.assertEqual(self.manifest.keys(), ['a/2', 'a/b/c/4', 'a/d/5', 'ab'])
+
+    def test_reopen(self):
+        self.manifest.close()
+        self.manifest = Manifest(os.path.join(self.dir, 'keys.db'))
+        self.assertEqual(len(self.manifest), 7)
+
+
+@unittest.skipUnless(localS3.ENDPOINT, localS3.skipReason)
+class RefreshTest(unittest.TestCase):
+
+    def test_refreshPrefix(self):
+        bconn = localS3.newBucket('manifest')
+        storage = S3Storage(bconn.name, **localS3.connectArgs())
+        for name in ['p/1', 'p/2', 'q/1']:
+            bconn.new_key(name).set_contents_from_string(b'data')
+
+        dir = tempfile.mkdtemp()
+        try:
+            manifest = Manifest(os.path.join(dir, 'keys.db'))
+            manifest.record('p/gone', 1, 'etag')
+            manifest.record('q/kept', 1, 'etag')
+
+            self.assertEqual(manifest.refresh(storage, 'p/'), 2)
+
+            # Only the refreshed prefix is brought up to date
+            self.assertEqual(manifest.keys(), ['p/1', 'p/2', 'q/kept'])
+            self.assertEqual(manifest.get('p/1')[0], 4)
+            self.assertNotEqual(manifest.lastRefresh('p/'), None)
+            self.assertEqual(manifest.lastRefresh('q/'), None)
+            manifest.close()
+        finally:
+            shutil.rmtree(dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import os
+import unittest
+
+import localS3
+from s3 import S3Storage
+
+
+@unittest.skipUnless(localS3.ENDPOINT, localS3.skipReason)
+class ReaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.bconn = localS3.newBucket('reader')
+        self.storage = S3Storage(self.bconn.name, **localS3.connectArgs())
+        self.data = os.urandom(100000)
+        self.storage.storeFileData('logs', 'sim.log', self.data)
+        self.storage.resetRequestCounts()
+
+    def open(self, **kwargs):
+        return self.storage.open_file('logs', 'sim.log', blockSize=4096, **kwargs)
+
+    def test_tailIsOneGet(self):
+        with self.open() as fp:
+            fp.seek(-10, 2)
+            self.assertEqual(fp.read(), self.data[-10:])
+        self.assertEqual(self.storage.requestCounts(), {'GET': 1})
+
+    def test_tailOfRange(self):
+        with self.open(start=1000, end=50000) as fp:
+            self.assertEqual(fp.seek(-10, 2), 48990)
+            self.assertEqual(fp.read(), self.data[49990:50000])
+        self.assertEqual(self.storage.requestCounts(), {'GET': 1})
+
+    def test_tailLongerThanObject(self):
+        with self.storage.open_file('logs', 'sim.log', start=99000, blockSize=4096) as fp:
+            self.assertEqual(fp.seek(0, 2), 1000)
+            fp.seek(0)
+            self.assertEqual(fp.read(), self.data[99000:])
+        self.assertEqual(self.storage.requestCounts(), {'GET': 1})
+
+    def test_readBlocks(self):
+        with self.open() as fp:
+            fp.seek(5000)
+            self.assertEqual(fp.read(20000), self.data[5000:25000])
+            self.assertEqual(fp.read(), self.data[25000:])
+
+
+if __name__ == '__main__':
+    unittest.main()
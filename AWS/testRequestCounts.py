@@ -0,0 +1,52 @@
+import unittest
+from io import BytesIO
+
+import localS3
+from s3 import S3Storage
+
+
+@unittest.skipUnless(localS3.ENDPOINT, localS3.skipReason)
+class RequestCountTest(unittest.TestCase):
+    """
+    Each read is one GET, with no HEAD first.
+    """
+
+    def setUp(self):
+        self.bconn = localS3.newBucket('counts')
+        self.storage = S3Storage(self.bconn.name, **localS3.connectArgs())
+        self.storage.storeFileData('d', 'f', b'0123456789')
+        self.storage.resetRequestCounts()
+
+    def assertOneGet(self):
+        self.assertEqual(self.storage.requestCounts(), {'GET': 1})
+        self.storage.resetRequestCounts()
+
+    def test_getFile(self):
+        out = BytesIO()
+        self.storage.getFile('d', 'f', out)
+        self.assertEqual(out.getvalue(), b'0123456789')
+        self.assertOneGet()
+
+    def test_getFileData(self):
+        self.assertEqual(self.storage.getFileData('d', 'f'), b'0123456789')
+        self.assertOneGet()
+
+    def test_getFileFromLocation(self):
+        self.assertEqual(self.storage.get_file_from_location('d', 'f', 4), b'456789')
+        self.assertOneGet()
+
+    def test_missing(self):
+        out = BytesIO()
+        self.storage.getFile('d', 'missing', out)
+        self.assertEqual(out.getvalue(), b'')
+        self.assertOneGet()
+
+        self.assertEqual(self.storage.getFileData('d', 'missing'), None)
+        self.assertOneGet()
+
+        self.assertEqual(self.storage.get_file_from_location('d', 'missing', 4), None)
+        self.assertOneGet()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import os
+import sys
+import socket
+import unittest
+
+import boto.exception
+
+import localS3
+from retry import Retrier, classify
+from s3 import S3Storage
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'Meetings', '2014-04-08', 'boto'))
+from awslib.storage import BasicStorage
+
+
+def s3Error(status, code):
+    body = '<Error><Code>%s</Code><Message>-</Message></Error>' % code
+    return boto.exception.S3ResponseError(status, code, body)
+
+
+class ClassifyTest(unittest.TestCase):
+
+    def test_classify(self):
+        self.assertEqual(classify(s3Error(503, 'SlowDown')), 'throttled')
+        self.assertEqual(classify(s3Error(500, 'InternalError')), 'server')
+        self.assertEqual(classify(s3Error(400, 'RequestTimeout')), 'timeout')
+        self.assertEqual(classify(s3Error(404, 'NoSuchKey')), 'client')
+        self.assertEqual(classify(socket.timeout()), 'timeout')
+        self.assertEqual(classify(boto.exception.AWSConnectionError('reset')), 'network')
+        self.assertEqual(classify(boto.exception.BotoClientError('bad argument')), 'client')
+        self.assertEqual(classify(ValueError()), 'other')
+
+
+@unittest.skipUnless(localS3.ENDPOINT, localS3.skipReason)
+class FaultProxyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.bconn = localS3.newBucket('retry')
+        self.proxy = None
+
+    def tearDown(self):
+        if self.proxy:
+            localS3.stopProxy(self.proxy)
+
+    def storage(self, **faults):
+        self.proxy = localS3.startProxy(**faults)
+        port = self.proxy.server_address[1]
+        return S3Storage(self.bconn.name, retrier=Retrier(retries=8, base=0.01, cap=0.1),
+                         **localS3.connectArgs(port))
+
+    def test_retriesFaults(self):
+        storage = self.storage(slowdown=0.1, errors=0.1, resets=0.05)
+
+        for i in range(20):
+            storage.storeFileData('d', 'f%d' % i, b'data %d' % i)
+        for i in range(20):
+            self.assertEqual(storage.getFileData('d', 'f%d' % i), b'data %d' % i)
+
+        stats = storage.retryStats()
+        self.assertGreater(sum(stats['retries'].values()), 0)
+        self.assertEqual(stats['giveUps'], 0)
+        self.assertGreater(sum(self.proxy.RequestHandlerClass.counts.values()), 0)
+
+    def test_givesUpWhenAlwaysThrottled(self):
+        storage = self.storage(slowdown=1.0)
+
+        with self.assertRaises(boto.exception.BotoServerError) as e:
+            storage.storeFileData('d', 'f', b'data')
+
+        self.assertEqual(classify(e.exception), 'throttled')
+        stats = storage.retryStats()
+        self.assertEqual(stats['retries'].get('throttled'), 8)
+        self.assertGreaterEqual(stats['giveUps'], 1)
+
+
+@unittest.skipUnless(localS3.ENDPOINT, localS3.skipReason)
+class BasicStorageRetryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.bconn = localS3.newBucket('basic')
+        self.proxy = None
+
+    def tearDown(self):
+        if self.proxy:
+            localS3.stopProxy(self.proxy)
+
+    def storage(self, **faults):
+        self.proxy = localS3.startProxy(**faults)
+        port = self.proxy.server_address[1]
+        storage = BasicStorage(self.bconn.name, retrier=Retrier(retries=8, base=0.01, cap=0.1),
+                               **localS3.connectArgs(port))
+        storage.connect()
+        return storage
+
+    def test_retriesFaults(self):
+        storage = self.storage(slowdown=0.1, errors=0.1, resets=0.05)
+
+        for i in range(20):
+            storage.storeFileData('d', 'f%d' % i, b'data %d' % i)
+        for i in range(20):
+            self.assertEqual(storage.getFileData('d', 'f%d' % i), b'data %d' % i)
+
+        self.assertGreater(sum(storage.retryStats()['retries'].values()), 0)
+
+    def test_throttledWriteRaises(self):
+        storage = self.storage()
+        self.proxy.RequestHandlerClass.args.slowdown = 1.0
+
+        with self.assertRaises(boto.exception.BotoServerError):
+            storage.storeFileData('d', 'f', b'data')
+        self.assertEqual(storage.retryStats()['giveUps'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,14 @@
+import unittest
+
+import checkShared
+
+
+class SharedTest(unittest.TestCase):
+
+    def test_awslibCopiesAreTheSame(self):
+        self.assertEqual(checkShared.differing(), [],
+                         "Run checkShared.py --update to copy the AWS/ modules to awslib.")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import os
+import shutil
+import hashlib
+import tempfile
+import unittest
+
+import sync
+from sync import plan, localFiles, download, runAll
+
+
+class PlanTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, data):
+        with open(os.path.join(self.dir, name), 'wb') as fp:
+            fp.write(data)
+        return hashlib.md5(data).hexdigest()
+
+    def test_upload(self):
+        local = {'new': (1, 100), 'size': (2, 100), 'newer': (1, 200), 'same': (1, 100)}
+        remote = {'size': (3, 150, 'e'), 'newer': (1, 150, 'e'), 'same': (1, 150, 'e'),
+                  'extra': (1, 150, 'e')}
+
+        p = plan(local, remote, True, self.dir)
+        self.assertEqual(p.copy, ['new', 'newer', 'size'])
+        self.assertEqual(p.delete, [])
+        self.assertEqual(p.same, 1)
+
+        self.assertEqual(plan(local, remote, True, self.dir, delete=True).delete, ['extra'])
+
+    def test_download(self):
+        local = {'older': (1, 100), 'same': (1, 150), 'extra': (1, 100)}
+        remote = {'older': (1, 150, 'e'), 'same': (1, 150, 'e'), 'new': (1, 150, 'e')}
+
+        p = plan(local, remote, False, self.dir, delete=True)
+        self.assertEqual(p.copy, ['new', 'older'])
+        self.assertEqual(p.delete, ['extra'])
+        self.assertEqual(p.same, 1)
+
+    def test_sizesNotCompared(self):
+        # Stored compressed, the sizes differ
+        p = plan({'f': (100, 100)}, {'f': (40, 150, 'e')}, True, self.dir, sizes=False)
+        self.assertEqual(p.copy, [])
+
+    def test_checksum(self):
+        md5 = self.write('same', b'data')
+        self.write('changed', b'atad')
+        self.write('multipart', b'data')
+        local = {'same': (4, 200), 'changed': (4, 100), 'multipart': (4, 200)}
+        remote = {'same': (4, 150, md5), 'changed': (4, 150, md5),
+                  'multipart': (4, 150, md5 + '-2')}
+
+        p = plan(local, remote, True, self.dir, checksum=True)
+        # multipart ETags are not MD5s, the times are compared
+        self.assertEqual(p.copy, ['changed', 'multipart'])
+        self.assertEqual(p.same, 1)
+
+    def test_result(self):
+        p = plan({'a': (1, 1), 'b': (1, 1)}, {}, True, self.dir)
+        result = p.result({'b': 'failed'})
+        self.assertEqual(result['copied'], ['a'])
+        self.assertEqual(result['errors'], {'b': 'failed'})
+        self.assertFalse(result['dryRun'])
+
+
+class LocalFilesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_localFiles(self):
+        os.makedirs(os.path.join(self.dir, 'sub', 'deeper'))
+        for name in ['a', 'sub/b', 'sub/deeper/c', 'sub/.b.x1' + sync.PARTIAL, 'd.tmp']:
+            with open(os.path.join(self.dir, *name.split('/')), 'wb') as fp:
+                fp.write(b'12')
+
+        files = localFiles(self.dir)
+        # Only sync's own partial downloads are skipped
+        self.assertEqual(sorted(files), ['a', 'd.tmp', 'sub/b', 'sub/deeper/c'])
+        self.assertEqual(files['a'][0], 2)
+
+    def test_download(self):
+        filename = os.path.join(self.dir, 'sub', 'f')
+        download(lambda fp: fp.write(b'data'), filename, 1000000)
+
+        with open(filename, 'rb') as fp:
+            self.assertEqual(fp.read(), b'data')
+        self.assertEqual(int(os.path.getmtime(filename)), 1000000)
+
+    def test_failedDownloadLeavesNothing(self):
+        def fetch(fp):
+            fp.write(b'half')
+            raise IOError("dropped")
+
+        filename = os.path.join(self.dir, 'f')
+        self.assertRaises(IOError, download, fetch, filename, 1000000)
+        self.assertEqual(os.listdir(self.dir), [])
+
+    def test_runAll(self):
+        def func(name):
+            if name == 'bad':
+                raise Exception("failed")
+
+        self.assertEqual(runAll(func, ['a', 'bad', 'b'], 2), {'bad': 'failed'})
+        self.assertEqual(runAll(func, [], 2), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import socket
+import logging
+import unittest
+
+import localS3
+from s3 import S3Storage
+from tracing import Tracer, Histogram, MemoryExporter, StatsdExporter, LoggingExporter
+from tracing import NULL_TRACER, BOUNDS
+
+
+class TracerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.exporter = MemoryExporter()
+        self.tracer = Tracer([self.exporter])
+
+    def test_nestedSpans(self):
+        with self.tracer.span('outer', key='k'):
+            with self.tracer.span('inner'):
+                pass
+            with self.tracer.span('inner'):
+                pass
+
+        self.assertEqual(self.exporter.names(), ['inner', 'inner', 'outer'])
+        self.assertEqual([s[2] for s in self.exporter.spans], ['outer', 'outer', None])
+        self.assertEqual(self.exporter.spans[2][3], {'key': 'k'})
+
+        spans = self.tracer.stats()['spans']
+        self.assertEqual(spans['inner']['calls'], 2)
+        self.assertEqual(spans['outer']['calls'], 1)
+
+    def test_errorTag(self):
+        with self.assertRaises(KeyError):
+            with self.tracer.span('failing'):
+                raise KeyError('k')
+        self.assertEqual(self.exporter.spans[0][3], {'error': 'KeyError'})
+
+    def test_counts(self):
+        self.tracer.count('bytes.sent', 10)
+        self.tracer.count('bytes.sent', 5, key='k')
+        self.assertEqual(self.tracer.stats()['counters'], {'bytes.sent': 15})
+        self.assertEqual(self.exporter.counts, [('bytes.sent', 10, {}), ('bytes.sent', 5, {'key': 'k'})])
+
+        self.tracer.reset()
+        self.assertEqual(self.tracer.stats(), {'counters': {}, 'spans': {}})
+
+    def test_disabled(self):
+        tracer = Tracer([self.exporter], enabled=False)
+        with tracer.span('x'):
+            tracer.count('y')
+        self.assertEqual(tracer.stats(), {'counters': {}, 'spans': {}})
+        self.assertEqual(self.exporter.spans, [])
+        self.assertTrue(NULL_TRACER.span('a') is NULL_TRACER.span('b'))
+
+
+class HistogramTest(unittest.TestCase):
+
+    def test_percentiles(self):
+        h = Histogram()
+        self.assertEqual(h.percentile(50), None)
+        for i in range(90):
+            h.add(0.00015)
+        for i in range(10):
+            h.add(0.5)
+
+        self.assertEqual(h.percentile(50), BOUNDS[1])
+        self.assertEqual(h.percentile(90), BOUNDS[1])
+        self.assertTrue(0.5 <= h.percentile(95) < 1.0)
+        stats = h.stats()
+        self.assertEqual(stats['calls'], 100)
+        self.assertAlmostEqual(stats['total'], 90 * 0.00015 + 10 * 0.5)
+
+    def test_slowerThanTheBounds(self):
+        h = Histogram()
+        h.add(BOUNDS[-1] * 2)
+        self.assertEqual(h.percentile(99), float('inf'))
+
+
+class ExporterTest(unittest.TestCase):
+
+    def test_statsd(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        server.bind(('127.0.0.1', 0))
+        server.settimeout(5)
+        try:
+            exporter = StatsdExporter('127.0.0.1', server.getsockname()[1], prefix='app')
+            exporter.span('request.GET', 0.0125, None, {})
+            exporter.count('bytes:sent', 3, {})
+            exporter.close()
+
+            self.assertEqual(server.recv(100), b'app.request.GET:12.500|ms')
+            self.assertEqual(server.recv(100), b'app.bytes_sent:3|c')
+        finally:
+            server.close()
+
+    def test_logging(self):
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        logger = logging.getLogger('testTracing')
+        logger.addHandler(handler)
+        logger.setLevel(logging.DEBUG)
+        try:
+            exporter = LoggingExporter(logger)
+            exporter.span('inner', 0.002, 'outer', {'key': 'k'})
+            exporter.count('bytes.sent', 3, {})
+        finally:
+            logger.removeHandler(handler)
+
+        self.assertEqual([r.getMessage() for r in records],
+                         ['outer/inner 2.0ms key=k', 'bytes.sent +3 '])
+
+
+@unittest.skipUnless(localS3.ENDPOINT, localS3.skipReason)
+class StorageTracingTest(unittest.TestCase):
+
+    def test_getFileDataSpans(self):
+        bconn = localS3.newBucket('tracing')
+        exporter = MemoryExporter()
+        storage = S3Storage(bconn.name, tracer=Tracer([exporter]), **localS3.connectArgs())
+        storage.storeFileData('d', 'f', b'data')
+        exporter.clear()
+
+        self.assertEqual(storage.getFileData('d', 'f'), b'data')
+
+        self.assertEqual(exporter.names(), ['request.GET', 'getFileData'])
+        self.assertEqual(exporter.spans[0][2], 'getFileData')
+        self.assertEqual(exporter.counts, [('bytes.received', 4, {})])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import shutil
+import tempfile
+import unittest
+from io import BytesIO
+
+import boto.exception
+
+import localS3
+from s3 import S3Storage
+from transfer import MB, _Buffer, _uploadStateFile, _writeState
+
+
+@unittest.skipUnless(localS3.ENDPOINT, localS3.skipReason)
+class TransferTest(unittest.TestCase):
+
+    def setUp(self):
+        self.bconn = localS3.newBucket('transfer')
+        self.storage = S3Storage(self.bconn.name, partSize=5 * MB, workers=2,
+                                 **localS3.connectArgs())
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, 'big.bin')
+        self.data = os.urandom(12 * MB)
+        with open(self.filename, 'wb') as fp:
+            fp.write(self.data)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def startUpload(self, keyName, headers):
+        """
+        An unfinished upload of the file, with only its first part sent.
+        """
+        mp = self.bconn.initiate_multipart_upload(keyName, headers=headers)
+        with open(self.filename, 'rb') as fp:
+            mp.upload_part_from_file(fp, 1, size=5 * MB)
+        return mp
+
+    def test_resumeWithOtherHeadersStartsAgain(self):
+        self.startUpload('k', {'x-amz-meta-codec': 'gzip'})
+
+        self.storage.transfer.upload(self.filename, 'k', {'x-amz-meta-sha256': 'abc'})
+
+        key = self.bconn.get_key('k')
+        self.assertEqual(key.get_metadata('codec'), None)
+        self.assertEqual(key.get_metadata('sha256'), 'abc')
+        self.assertEqual(key.get_contents_as_string(), self.data)
+        self.assertEqual(len(self.bconn.get_all_multipart_uploads()), 0)
+
+    def test_resumeWithSameHeaders(self):
+        headers = {'x-amz-meta-sha256': 'abc'}
+        mp = self.startUpload('k', headers)
+        _writeState(_uploadStateFile('k', self.filename), {'id': mp.id, 'headers': headers})
+
+        self.storage.resetRequestCounts()
+        self.storage.transfer.upload(self.filename, 'k', headers)
+
+        # Only parts 2 and 3 are sent
+        self.assertEqual(self.storage.requestCounts().get('PUT'), 2)
+        key = self.bconn.get_key('k')
+        self.assertEqual(key.get_metadata('sha256'), 'abc')
+        self.assertEqual(key.get_contents_as_string(), self.data)
+        self.assertFalse(os.path.exists(_uploadStateFile('k', self.filename)))
+
+    def test_rangedGetIfMatch(self):
+        self.storage.storeFileData('', 'small', b'0123456789')
+        etag = self.bconn.get_key('small').etag
+
+        out = _Buffer()
+        self.storage.transfer._getRange('small', 2, 5, out, etag)
+        self.assertEqual(out.getvalue(), b'234')
+
+        with self.assertRaises(boto.exception.S3ResponseError) as e:
+            self.storage.transfer._getRange('small', 2, 5, _Buffer(), '"not-the-etag"')
+        self.assertEqual(e.exception.status, 412)
+
+    def test_getFileInParts(self):
+        self.storage.storeFile(self.filename, '', 'big')
+        out = BytesIO()
+        self.storage.getFile('', 'big', out)
+        self.assertEqual(out.getvalue(), self.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,251 @@
+import time
+import socket
+import logging
+import threading
+from bisect import bisect_left
+
+# Upper bounds of the latency histogram buckets, in seconds, from 100us
+# doubling to about 105s. Slower times go in a last, open bucket.
+BOUNDS = [0.0001 * 2 ** i for i in range(21)]
+
+
+class Tracer(object):
+    """
+    Timing spans, byte counters and latency histograms for storage calls.
+
+    A span times a phase of a call, and spans opened inside it in the
+    same thread are its children:
+
+        with tracer.span('getFileData', key=name):
+            with tracer.span('request.GET'):
+                ...
+
+    Every span's time goes into the histogram of its name, and every
+    count() into its counter, see stats(). Each is also passed on to the
+    exporters, such as LoggingExporter, StatsdExporter or MemoryExporter,
+    which all have the methods:
+
+        span(name, seconds, parent, tags)
+        count(name, value, tags)
+
+    A Tracer that is not enabled, like NULL_TRACER, does nothing at all,
+    its spans are a shared object that does not even read the clock.
+    """
+
+    def __init__(self, exporters=None, enabled=True):
+        self.exporters = list(exporters or [])
+        self.enabled = enabled
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+
+    def span(self, name, **tags):
+        if not self.enabled:
+            return _NO_SPAN
+        return _Span(self, name, tags)
+
+    def count(self, name, value=1, **tags):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+        for e in self.exporters:
+            e.count(name, value, tags)
+
+    def histogram(self, name):
+        with self._lock:
+            h = self._histograms.get(name)
+            if h is None:
+                h = self._histograms[name] = Histogram()
+            return h
+
+    def stats(self):
+        """
+        The counters, and for each span name its number of calls, total
+        time, and p50, p95 and p99 latencies in seconds, from the
+        histogram buckets.
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = list(self._histograms.items())
+        return {'counters': counters,
+                'spans': dict((name, h.stats()) for name, h in histograms)}
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def _finished(self, name, seconds, parent, tags):
+        self.histogram(name).add(seconds)
+        for e in self.exporters:
+            e.span(name, seconds, parent, tags)
+
+
+class _Span(object):
+    __slots__ = ('tracer', 'name', 'tags', 'parent', 'start')
+
+    def __init__(self, tracer, name, tags):
+        self.tracer = tracer
+        self.name = name
+        self.tags = tags
+
+    def __enter__(self):
+        local = self.tracer._local
+        self.parent = getattr(local, 'span', None)
+        local.span = self
+        self.start = time.time()
+        return self
+
+    def __exit__(self, kind, error, tb):
+        seconds = time.time() - self.start
+        self.tracer._local.span = self.parent
+        if kind is not None:
+            self.tags['error'] = kind.__name__
+        self.tracer._finished(self.name, seconds,
+                              self.parent.name if self.parent else None, self.tags)
+        return False
+
+
+class _NoSpan(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, kind, error, tb):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+# The default tracer of the storage classes
+NULL_TRACER = Tracer(enabled=False)
+
+
+class Histogram(object):
+    """
+    Counts of latencies in fixed buckets, see BOUNDS. Percentiles are
+    given as the upper bound of their bucket, so they are at most twice
+    the real value, in constant memory however many calls there are.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.buckets = [0] * (len(BOUNDS) + 1)
+        self.calls = 0
+        self.total = 0.0
+
+    def add(self, seconds):
+        i = bisect_left(BOUNDS, seconds)
+        with self._lock:
+            self.buckets[i] += 1
+            self.calls += 1
+            self.total += seconds
+
+    def percentile(self, p):
+        with self._lock:
+            buckets = list(self.buckets)
+            calls = self.calls
+        if not calls:
+            return None
+        wanted = calls * p / 100.0
+        seen = 0
+        for i, n in enumerate(buckets):
+            seen += n
+            if seen >= wanted and n:
+                return BOUNDS[i] if i < len(BOUNDS) else float('inf')
+        return None
+
+    def stats(self):
+        stats = dict((p, self.percentile(n)) for p, n in (('p50', 50), ('p95', 95), ('p99', 99)))
+        with self._lock:
+            stats.update(calls=self.calls, total=self.total)
+        return stats
+
+
+class LoggingExporter(object):
+    """
+    Log each span and count at DEBUG, or the given level.
+    """
+
+    def __init__(self, logger=None, level=logging.DEBUG):
+        self.logger = logger or logging.getLogger('s3storage.trace')
+        self.level = level
+
+    def span(self, name, seconds, parent, tags):
+        if self.logger.isEnabledFor(self.level):
+            self.logger.log(self.level, "%s%s %.1fms %s", parent + '/' if parent else '',
+                            name, seconds * 1000, _tagText(tags))
+
+    def count(self, name, value, tags):
+        if self.logger.isEnabledFor(self.level):
+            self.logger.log(self.level, "%s +%d %s", name, value, _tagText(tags))
+
+
+class StatsdExporter(object):
+    """
+    Send spans as timers and counts as counters to a statsd server, over
+    UDP, 'prefix.name:12.5|ms'. Sending never blocks, and failures are
+    ignored, as statsd does.
+    """
+
+    def __init__(self, host='localhost', port=8125, prefix='s3storage'):
+        self.address = (host, port)
+        self.prefix = prefix + '.' if prefix else ''
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.setblocking(False)
+
+    def span(self, name, seconds, parent, tags):
+        self._send('%s:%.3f|ms' % (self._name(name), seconds * 1000))
+
+    def count(self, name, value, tags):
+        self._send('%s:%d|c' % (self._name(name), value))
+
+    def close(self):
+        self._sock.close()
+
+    def _name(self, name):
+        for c in ':|@':
+            name = name.replace(c, '_')
+        return self.prefix + name
+
+    def _send(self, line):
+        try:
+            self._sock.sendto(line.encode('ascii'), self.address)
+        except (socket.error, UnicodeError):
+            pass
+
+
+class MemoryExporter(object):
+    """
+    Keep every span, as (name, seconds, parent, tags), and count, as
+    (name, value, tags), in lists, e.g. to check them in a test.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.spans = []
+        self.counts = []
+
+    def span(self, name, seconds, parent, tags):
+        with self._lock:
+            self.spans.append((name, seconds, parent, tags))
+
+    def count(self, name, value, tags):
+        with self._lock:
+            self.counts.append((name, value, tags))
+
+    def names(self):
+        with self._lock:
+            return [s[0] for s in self.spans]
+
+    def clear(self):
+        with self._lock:
+            self.spans = []
+            self.counts = []
+
+
+def _tagText(tags):
+    return ' '.join('%s=%s' % kv for kv in sorted(tags.items()))
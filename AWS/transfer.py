@@ -0,0 +1,339 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from collections import deque
+from multiprocessing.pool import ThreadPool
+
+import boto
+import boto.s3.multipart
+import boto.utils
+
+from retry import Retrier
+
+MB = 1024 * 1024
+
+# S3 limits on multipart uploads
+MIN_PART_SIZE = 5 * MB
+MAX_PARTS = 10000
+
+
+class Transfer(object):
+    """
+    Parallel multipart upload and ranged download of S3 objects.
+
+    Large objects are split into parts of partSize bytes, and up to
+    workers parts are moved at the same time, each over its own
+    connection. A part that fails is tried again, up to retries times,
+    without starting the whole object over.
+
+    Both directions can be resumed:
+
+        - upload() looks for an unfinished multipart upload of the same
+          key, from the same file with the same headers, and only sends
+          the parts that are missing or different. The upload id and
+          headers are kept in a state file in the temporary directory,
+          as S3 does not give back the headers of an unfinished upload.
+        - download() writes to '<filename>.part', and keeps the list of
+          finished parts in '<filename>.part.state'. Running it again
+          fetches only the remaining parts, as long as the object's ETag
+          has not changed.
+
+    bucket is a function returning a context manager that gives a Bucket
+    for the calling thread to use, see S3Storage.bucket. Parts are retried
+    by retrier, a retry.Retrier, by default one that tries retries times.
+    """
+
+    def __init__(self, bucket, partSize=8 * MB, workers=8, retries=3, retrier=None):
+        self.bucket = bucket
+        self.partSize = partSize
+        self.workers = workers
+        self.retries = retries
+        self.retrier = retrier or Retrier(retries)
+
+    def partRanges(self, size, offset=0):
+        """
+        The (number, start, end) of each part of an object of the given
+        size, from offset on, numbered from 1. end is exclusive.
+        """
+        partSize = max(self.partSize, MIN_PART_SIZE, -(-size // MAX_PARTS))
+        ranges = []
+        for i, start in enumerate(range(offset, size, partSize)):
+            ranges.append((i + 1, start, min(start + partSize, size)))
+        return ranges
+
+    def upload(self, filename, keyName, headers=None):
+        """
+        Upload a local file to keyName as a parallel multipart upload.
+        """
+        size = os.path.getsize(filename)
+        ranges = self.partRanges(size)
+        headers = dict(headers or {})
+        stateFile = _uploadStateFile(keyName, filename)
+        state = _readState(stateFile)
+
+        done = {}
+        with self.bucket() as bucket:
+            mp = self._findUpload(bucket, keyName)
+            if mp is not None:
+                if state.get('id') != mp.id or state.get('headers') != headers:
+                    # Started elsewhere, or with other metadata, which
+                    # complete_upload would keep
+                    mp.cancel_upload()
+                    mp = None
+                else:
+                    done = dict((p.part_number, p.etag.strip('"')) for p in mp)
+                    if done and max(done) > len(ranges):
+                        # Cut up differently, complete_upload would keep the extra parts
+                        mp.cancel_upload()
+                        mp = None
+                        done = {}
+            if mp is None:
+                mp = bucket.initiate_multipart_upload(keyName, headers=headers)
+                _writeState(stateFile, {'id': mp.id, 'headers': headers})
+
+        def send(part):
+            num, start, end = part
+            with open(filename, 'rb') as fp:
+                fp.seek(start)
+                md5 = boto.utils.compute_md5(fp, size=end - start)
+                if done.get(num) == md5[0]:
+                    return 0  # Sent by an earlier attempt
+
+                def put():
+                    fp.seek(start)
+                    with self.bucket() as bucket:
+                        upload = self._bucketUpload(mp, bucket)
+                        upload.upload_part_from_file(fp, num, md5=md5, size=end - start)
+                self._retry(put)
+            return end - start
+
+        self._map(send, ranges)
+        with self.bucket() as bucket:
+            self._bucketUpload(mp, bucket).complete_upload()
+        os.remove(stateFile)
+
+    def uploadParts(self, filename, keyName, parts, headers=None, etag=None):
+        """
+        Upload keyName as a multipart upload of the given parts, a list of
+        (start, end, copy). Bytes [start, end) of the local file are sent,
+        unless copy is a (start, end) range of the object stored as
+        keyName, with the given ETag, which S3 copies into the part
+        itself. Returns the number of bytes sent, and the new ETag.
+        """
+        with self.bucket() as bucket:
+            mp = bucket.initiate_multipart_upload(keyName, headers=headers)
+            bucketName = bucket.name
+        copyHeaders = {'x-amz-copy-source-if-match': etag} if etag else None
+
+        def send(part):
+            num, (start, end, copy) = part
+
+            def put():
+                with self.bucket() as bucket:
+                    upload = self._bucketUpload(mp, bucket)
+                    if copy:
+                        upload.copy_part_from_key(bucketName, keyName, num, copy[0], copy[1] - 1,
+                                                  headers=copyHeaders)
+                        return
+                    with open(filename, 'rb') as fp:
+                        fp.seek(start)
+                        upload.upload_part_from_file(fp, num, size=end - start)
+            self._retry(put)
+            return 0 if copy else end - start
+
+        try:
+            sent = sum(self._map(send, list(enumerate(parts, 1))))
+            with self.bucket() as bucket:
+                done = self._bucketUpload(mp, bucket).complete_upload()
+        except Exception:
+            with self.bucket() as bucket:
+                self._bucketUpload(mp, bucket).cancel_upload()
+            raise
+        return sent, done.etag
+
+    def download(self, keyName, filename):
+        """
+        Download keyName to a local file with parallel ranged GETs. An
+        interrupted download is carried on from where it stopped.
+        """
+        key = self._retry(lambda: self._getKey(keyName))
+        if key is None:
+            raise Exception("No such key ({}).".format(keyName))
+
+        etag = key.etag
+        ranges = self.partRanges(key.size)
+        partFile = filename + '.part'
+        stateFile = partFile + '.state'
+
+        state = _readState(stateFile)
+        if (state.get('etag') != etag or state.get('partSize') != self.partSize or
+                not os.path.exists(partFile)):
+            state = {'etag': etag, 'partSize': self.partSize, 'done': []}
+            with open(partFile, 'wb') as fp:
+                fp.truncate(key.size)
+            _writeState(stateFile, state)
+
+        finished = set(state['done'])
+        lock = threading.Lock()
+
+        def fetch(part):
+            num, start, end = part
+            if num in finished:
+                return 0
+
+            with open(partFile, 'r+b') as fp:
+                def get():
+                    fp.seek(start)
+                    self._getRange(keyName, start, end, fp, etag)
+                self._retry(get)
+
+            with lock:
+                state['done'].append(num)
+                _writeState(stateFile, state)
+            return end - start
+
+        self._map(fetch, ranges)
+        os.rename(partFile, filename)
+        os.remove(stateFile)
+
+    def downloadTo(self, keyName, fp, key=None, offset=0):
+        """
+        Download keyName into an open file object, fetching the parts in
+        parallel and writing them in order. If offset is given, only the
+        bytes from there on are fetched.
+
+        At most 2 * workers parts are fetched or waiting to be written at
+        any time, so a slow part holds back a few parts in memory, not
+        the rest of the object.
+        """
+        if key is None:
+            key = self._retry(lambda: self._getKey(keyName))
+            if key is None:
+                raise Exception("No such key ({}).".format(keyName))
+
+        etag = key.etag
+
+        @self.retrier.bind
+        def fetch(part):
+            num, start, end = part
+            out = _Buffer()
+            self._retry(lambda: self._getRange(keyName, start, end, out.reset(), etag))
+            return out.getvalue()
+
+        parts = iter(self.partRanges(key.size, offset))
+        window = deque()
+        pool = ThreadPool(self.workers)
+
+        def submit():
+            part = next(parts, None)
+            if part is not None:
+                window.append(pool.apply_async(fetch, (part,)))
+
+        try:
+            for i in range(2 * self.workers):
+                submit()
+            while window:
+                fp.write(window.popleft().get())
+                submit()
+        finally:
+            pool.terminate()
+
+    def _getRange(self, keyName, start, end, fp, etag):
+        """
+        GET bytes [start, end) of the object into fp. If-Match makes sure
+        every part comes from the same version of the object.
+        """
+        headers = {'Range': 'bytes=%d-%d' % (start, end - 1), 'If-Match': etag}
+        with self.bucket() as bucket:
+            bucket.new_key(keyName).get_contents_to_file(fp, headers=headers)
+
+    def _getKey(self, keyName):
+        with self.bucket() as bucket:
+            return bucket.get_key(keyName)
+
+    def _map(self, func, parts):
+        pool = ThreadPool(self.workers)
+        try:
+            # The workers keep the deadline of the operation, if any
+            return pool.map(self.retrier.bind(func), parts)
+        finally:
+            pool.terminate()
+
+    def _retry(self, func):
+        """
+        Call func, trying again on failures worth retrying, see
+        retry.Retrier.call.
+        """
+        return self.retrier.call(func)
+
+    def _findUpload(self, bucket, keyName):
+        """
+        The newest unfinished multipart upload of keyName, if any. Only
+        the uploads of keys starting with keyName are listed.
+        """
+        found = None
+        keyMarker = uploadMarker = ''
+        while True:
+            page = bucket.get_all_multipart_uploads(prefix=keyName, key_marker=keyMarker,
+                                                    upload_id_marker=uploadMarker)
+            for mp in page:
+                if mp.key_name == keyName:
+                    found = mp
+            if not page.is_truncated or not len(page):
+                return found
+            keyMarker = page.next_key_marker
+            uploadMarker = page.next_upload_id_marker
+
+    def _bucketUpload(self, mp, bucket):
+        """
+        A copy of the upload bound to the calling thread's bucket.
+        """
+        upload = boto.s3.multipart.MultiPartUpload(bucket)
+        upload.key_name = mp.key_name
+        upload.id = mp.id
+        return upload
+
+
+class _Buffer(object):
+    """
+    Collects the pieces of one part in memory.
+    """
+
+    def __init__(self):
+        self.pieces = []
+
+    def reset(self):
+        self.pieces = []
+        return self
+
+    def write(self, data):
+        self.pieces.append(data)
+
+    def getvalue(self):
+        return b''.join(self.pieces)
+
+
+def _readState(stateFile):
+    try:
+        with open(stateFile) as fp:
+            return json.load(fp)
+    except (IOError, ValueError):
+        return {}
+
+
+def _uploadStateFile(keyName, filename):
+    """
+    Where the state of an upload of filename to keyName is kept.
+    """
+    name = json.dumps([keyName, os.path.abspath(filename)])
+    digest = hashlib.md5(name.encode('ascii')).hexdigest()
+    return os.path.join(tempfile.gettempdir(), 's3upload-%s.state' % digest)
+
+
+def _writeState(stateFile, state):
+    tmp = stateFile + '.tmp'
+    with open(tmp, 'w') as fp:
+        json.dump(state, fp)
+    os.rename(tmp, stateFile)
@@ -0,0 +1,321 @@
+__author__ = 'kutenai'
+
+from math import pi
+
+import numpy as np
+
+from PathAction import PathAction
+from PathArray import TYPE_CODES
+from PathTransform import resolvePathWithCurrent
+from Transform import Transform
+
+MOVE = TYPE_CODES['move']
+CLOSE = TYPE_CODES['close']
+CURVE = TYPE_CODES['curve']
+SMOOTH = TYPE_CODES['smoothcurve']
+QUAD = TYPE_CODES['quad']
+SMOOTHQUAD = TYPE_CODES['smoothquad']
+ARC = TYPE_CODES['arc']
+
+
+def flattenPath(pa, tolerance=0.1, xform=None, maxSegments=10000):
+    """
+    Turn a PathArray into polylines, one (N,2) array per subpath.
+
+    Curves and arcs are replaced by line segments that stay within
+    tolerance of the true curve. The number of segments is picked for
+    each curve from its shape: Wang's bound on the second derivative for
+    the Beziers, and the sagitta of the step angle for arcs. Every
+    sample of every curve in the path is then evaluated in one set of
+    numpy operations, in Bernstein form, instead of point by point.
+
+    Quadratics are raised to cubics, and the smooth S/T commands use the
+    reflected control point of the previous command, as in the SVG spec.
+    A closed subpath ends with its first point. If xform is given, the
+    polylines are transformed and tolerance is in transformed units.
+    """
+    return [p for p, closed in flattenSubpaths(pa, tolerance, xform, maxSegments)]
+
+
+def flattenSubpaths(pa, tolerance=0.1, xform=None, maxSegments=10000):
+    """
+    The same as flattenPath, but returns (polyline, closed) pairs.
+    """
+    if not len(pa):
+        return []
+
+    if xform is not None:
+        # Flatten in path units, with the tolerance scaled to match
+        scale = np.linalg.norm(xform.matrix()[:, :2], 2)
+        if scale > 0:
+            tolerance = tolerance / scale
+
+    out, splits, closing = _flatten(pa, float(tolerance), maxSegments)
+
+    if xform is not None:
+        out = xform.transformPoints(out)
+
+    ends = list(splits) + [len(out)]
+    polylines = np.split(out, splits)
+    return [(p, bool(closing[e - 1])) for p, e in zip(polylines, ends)]
+
+
+def flattenToActions(pa, tolerance=0.1, xform=None, maxSegments=10000):
+    """
+    Flatten a PathArray into absolute move/line/close PathActions.
+    """
+    actions = []
+    for polyline, closed in flattenSubpaths(pa, tolerance, xform, maxSegments):
+        points = polyline.tolist()
+        actions.append(PathAction('move', [points[0]], True))
+        if closed:
+            points = points[:-1]
+        for p in points[1:]:
+            actions.append(PathAction('line', [p], True))
+        if closed:
+            actions.append(PathAction('close', [], False))
+    return actions
+
+
+def _flatten(pa, tolerance, maxSegments):
+    """
+    Returns the flattened points of the whole path, the indices where
+    new subpaths start, and a flag for each point that closes a subpath.
+    """
+    n = len(pa)
+    codes = pa.codes
+    first = pa.offsets[:-1]
+    last = pa.offsets[1:] - 1
+
+    pts, cp = resolvePathWithCurrent(pa, Transform())
+    p0 = cp[:-1]
+
+    counts = np.ones(n, dtype=np.intp)
+
+    # Beziers, as cubics
+    curves = np.flatnonzero(np.in1d(codes, [CURVE, SMOOTH, QUAD, SMOOTHQUAD]))
+    P = _cubicControls(codes, curves, first, pts, p0)
+    curveCounts = _cubicSegments(P, tolerance, maxSegments)
+    counts[curves] = curveCounts
+
+    # Arcs
+    arcs = np.flatnonzero(codes == ARC)
+    arcParams = pa.arcs[pa.arcIndex[arcs]] if len(arcs) else np.zeros((0, 5))
+    arcGeom = _arcCenters(p0[arcs], pts[first[arcs]], arcParams)
+    arcCounts = _arcSegments(arcGeom, tolerance, maxSegments)
+    counts[arcs] = arcCounts
+
+    # A close that is not followed by a move starts a new subpath at
+    # the same point, so it has an extra point.
+    isClose = codes == CLOSE
+    nextMove = np.append(codes[1:] == MOVE, True)
+    closeHead = isClose & ~nextMove
+    closeHead[-1] = False
+    counts[closeHead] += 1
+
+    # A path that does not start with a move starts at the current point
+    lead = 0 if codes[0] == MOVE else 1
+    pos = lead + np.concatenate(([0], np.cumsum(counts)[:-1]))
+    out = np.empty((lead + counts.sum(), 2))
+    if lead:
+        out[0] = p0[0]
+
+    simple = np.flatnonzero(~np.in1d(codes, [CURVE, SMOOTH, QUAD, SMOOTHQUAD, ARC, CLOSE]))
+    out[pos[simple]] = pts[last[simple]]
+
+    closes = np.flatnonzero(isClose)
+    out[pos[closes]] = cp[closes + 1]
+    heads = np.flatnonzero(closeHead)
+    out[pos[heads] + 1] = cp[heads + 1]
+
+    if len(curves):
+        owner, t = _samples(curveCounts)
+        out[pos[curves][owner] + _sampleIndex(curveCounts)] = _evalCubic(P[:, owner], t)
+
+    if len(arcs):
+        owner, t = _samples(arcCounts)
+        out[pos[arcs][owner] + _sampleIndex(arcCounts)] = _evalArc(arcGeom, owner, t, pts[first[arcs]])
+
+    closing = np.zeros(len(out), dtype=np.bool_)
+    closing[pos[closes]] = True
+
+    moves = np.flatnonzero(codes == MOVE)
+    splits = np.concatenate((pos[moves], pos[heads] + 1))
+    splits = np.unique(splits[splits > 0])
+    return out, splits, closing
+
+
+def _cubicControls(codes, curves, first, pts, p0):
+    """
+    The four control points of each Bezier, as a (4,K,2) array.
+    """
+    P = np.empty((4, len(curves), 2))
+    if not len(curves):
+        return P
+
+    c = codes[curves]
+    f = first[curves]
+    start = p0[curves]
+    P[0] = start
+
+    # The second control point of each action, used by a following S
+    ctrl2 = np.full((len(codes), 2), np.nan)
+    cubic = np.flatnonzero(codes == CURVE)
+    ctrl2[cubic] = pts[first[cubic] + 1]
+    smooth = np.flatnonzero(codes == SMOOTH)
+    ctrl2[smooth] = pts[first[smooth]]
+
+    # The control point of each quadratic, a T follows the one before it
+    quadCtrl = np.full((len(codes), 2), np.nan)
+    quad = np.flatnonzero(codes == QUAD)
+    quadCtrl[quad] = pts[first[quad]]
+    for i in np.flatnonzero(codes == SMOOTHQUAD).tolist():
+        if i > 0 and codes[i - 1] in (QUAD, SMOOTHQUAD):
+            quadCtrl[i] = 2 * p0[i] - quadCtrl[i - 1]
+        else:
+            quadCtrl[i] = p0[i]
+
+    isC = c == CURVE
+    P[1, isC] = pts[f[isC]]
+    P[2, isC] = pts[f[isC] + 1]
+    P[3, isC] = pts[f[isC] + 2]
+
+    isS = c == SMOOTH
+    prev = curves[isS] - 1
+    reflect = (prev >= 0) & np.in1d(codes[np.maximum(prev, 0)], [CURVE, SMOOTH])
+    P[1, isS] = np.where(reflect[:, None], 2 * start[isS] - ctrl2[np.maximum(prev, 0)], start[isS])
+    P[2, isS] = pts[f[isS]]
+    P[3, isS] = pts[f[isS] + 1]
+
+    isQ = (c == QUAD) | (c == SMOOTHQUAD)
+    q = quadCtrl[curves[isQ]]
+    end = pts[f[isQ] + np.where(c[isQ] == QUAD, 1, 0)]
+    P[1, isQ] = start[isQ] + 2.0 / 3.0 * (q - start[isQ])
+    P[2, isQ] = end + 2.0 / 3.0 * (q - end)
+    P[3, isQ] = end
+
+    return P
+
+
+def _cubicSegments(P, tolerance, maxSegments):
+    """
+    Segments needed for each cubic, from Wang's formula. The polyline of
+    n even steps is within (1/8) * max|B''| / n^2 of the curve.
+    """
+    if not P.shape[1]:
+        return np.zeros(0, dtype=np.intp)
+
+    d1 = np.hypot(*(P[0] - 2 * P[1] + P[2]).T)
+    d2 = np.hypot(*(P[1] - 2 * P[2] + P[3]).T)
+    m = 6 * np.maximum(d1, d2)
+    n = np.ceil(np.sqrt(m / (8 * tolerance)))
+    return np.clip(np.nan_to_num(n), 1, maxSegments).astype(np.intp)
+
+
+def _evalCubic(P, t):
+    t = t[:, None]
+    s = 1 - t
+    return (s * s * s) * P[0] + (3 * s * s * t) * P[1] + (3 * s * t * t) * P[2] + (t * t * t) * P[3]
+
+
+def _arcCenters(start, end, params):
+    """
+    Convert arcs from the SVG endpoint form to the center form. See
+    http://www.w3.org/TR/SVG/implnote.html#ArcConversionEndpointToCenter
+
+    Returns a dict of arrays, with 'line' set for arcs that are drawn as
+    a straight line (a zero radius), or not at all (no length).
+    """
+    rx = np.abs(params[:, 0])
+    ry = np.abs(params[:, 1])
+    phi = np.radians(params[:, 2])
+    largeArc = params[:, 3] != 0
+    sweep = params[:, 4] != 0
+
+    line = (rx == 0) | (ry == 0) | np.all(start == end, axis=1)
+    rx = np.where(line, 1.0, rx)
+    ry = np.where(line, 1.0, ry)
+
+    cos = np.cos(phi)
+    sin = np.sin(phi)
+    dx = (start[:, 0] - end[:, 0]) / 2
+    dy = (start[:, 1] - end[:, 1]) / 2
+    x1 = cos * dx + sin * dy
+    y1 = -sin * dx + cos * dy
+
+    # Scale up radii that are too small to reach the end point
+    lam = (x1 / rx) ** 2 + (y1 / ry) ** 2
+    grow = np.sqrt(np.maximum(lam, 1.0))
+    rx = rx * grow
+    ry = ry * grow
+
+    num = (rx * ry) ** 2 - (rx * y1) ** 2 - (ry * x1) ** 2
+    den = (rx * y1) ** 2 + (ry * x1) ** 2
+    den = np.where(den == 0, 1.0, den)
+    coef = np.sqrt(np.maximum(num, 0) / den)
+    coef = np.where(largeArc == sweep, -coef, coef)
+    cx1 = coef * rx * y1 / ry
+    cy1 = -coef * ry * x1 / rx
+
+    cx = cos * cx1 - sin * cy1 + (start[:, 0] + end[:, 0]) / 2
+    cy = sin * cx1 + cos * cy1 + (start[:, 1] + end[:, 1]) / 2
+
+    theta = np.arctan2((y1 - cy1) / ry, (x1 - cx1) / rx)
+    dtheta = np.arctan2((-y1 - cy1) / ry, (-x1 - cx1) / rx) - theta
+    dtheta = np.where(~sweep & (dtheta > 0), dtheta - 2 * pi, dtheta)
+    dtheta = np.where(sweep & (dtheta < 0), dtheta + 2 * pi, dtheta)
+
+    return {
+        'line': line, 'rx': rx, 'ry': ry, 'cos': cos, 'sin': sin,
+        'cx': cx, 'cy': cy, 'theta': theta, 'dtheta': dtheta,
+    }
+
+
+def _arcSegments(arc, tolerance, maxSegments):
+    """
+    Segments needed for each arc, so the sagitta r*(1-cos(step/2)) of
+    each step stays within tolerance.
+    """
+    r = np.maximum(arc['rx'], arc['ry'])
+    ratio = np.clip(1 - tolerance / r, -1, 1)
+    step = 2 * np.arccos(ratio)
+    step = np.where(step > 0, step, pi / 2)
+    n = np.ceil(np.abs(arc['dtheta']) / step)
+    n = np.clip(np.nan_to_num(n), 1, maxSegments).astype(np.intp)
+    n[arc['line']] = 1
+    return n
+
+
+def _evalArc(arc, owner, t, ends):
+    theta = arc['theta'][owner] + arc['dtheta'][owner] * t
+    ex = arc['rx'][owner] * np.cos(theta)
+    ey = arc['ry'][owner] * np.sin(theta)
+    cos = arc['cos'][owner]
+    sin = arc['sin'][owner]
+    out = np.empty((len(t), 2))
+    out[:, 0] = arc['cx'][owner] + cos * ex - sin * ey
+    out[:, 1] = arc['cy'][owner] + sin * ex + cos * ey
+
+    # The last sample of each arc, and straight line arcs, land exactly
+    # on the end point
+    exact = (t == 1) | arc['line'][owner]
+    out[exact] = ends[owner[exact]]
+    return out
+
+
+def _samples(counts):
+    """
+    For segments split into counts[k] steps, the owning segment and the
+    parameter t in (0,1] of every sample.
+    """
+    owner = np.repeat(np.arange(len(counts)), counts)
+    t = (_sampleIndex(counts) + 1.0) / counts[owner]
+    return owner, t
+
+
+def _sampleIndex(counts):
+    """
+    The index of each sample within its own segment.
+    """
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    return np.arange(counts.sum()) - np.repeat(starts, counts)
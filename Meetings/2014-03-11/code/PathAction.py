@@ -32,6 +32,16 @@ class PathAction(object):
             self.char = 'l'
         elif self.type == "close":
             self.char = 'z'
+        elif self.type == "hline":
+            self.char = 'h'
+        elif self.type == "vline":
+            self.char = 'v'
+        elif self.type == "smoothcurve":
+            self.char = 's'
+        elif self.type == "quad":
+            self.char = 'q'
+        elif self.type == "smoothquad":
+            self.char = 't'
         else:
             self.char = "?"
 
@@ -47,7 +57,7 @@ class PathAction(object):
             s = s + " Rel"
 
         for p in self.points:
-            s = s + " %f,%f" % (p[0],p[1])
+            s = s + " " + ",".join(["%f" % v for v in p])
 
         return s
 
@@ -67,6 +77,9 @@ class PathAction(object):
         currPt x,y values to the points and return
         the new value.
         """
+        if self.type in ("hline","vline"):
+            return self.getLinePoints(currPt,xform)
+
         if self.isAbs:
             # Absolute values.
             newPts = []
@@ -88,3 +101,31 @@ class PathAction(object):
 
             return pts
 
+    def getLinePoints(self,currPt,xform):
+        """
+        The hline and vline actions only carry one value, the
+        other one comes from the currPt. For absolute values, the
+        transform must not rotate or skew, since only the transformed
+        currPt is known.
+        """
+        pts = []
+        for pt in self.points:
+            if self.type == "hline":
+                if self.isAbs:
+                    x = xform.transformPoint(pt[0],0.0)[0]
+                    y = currPt[1]
+                else:
+                    sx,sy = xform.scalePoint(pt[0],0.0)
+                    x = sx + currPt[0]
+                    y = sy + currPt[1]
+            else:
+                if self.isAbs:
+                    x = currPt[0]
+                    y = xform.transformPoint(0.0,pt[0])[1]
+                else:
+                    sx,sy = xform.scalePoint(0.0,pt[0])
+                    x = sx + currPt[0]
+                    y = sy + currPt[1]
+            pts.append(Point(x,y))
+
+        return pts
@@ -0,0 +1,255 @@
+__author__ = 'kutenai'
+
+import struct
+from array import array
+
+import numpy as np
+
+from PathAction import PathAction
+
+# Action types, in code order. The code stored for an action is the
+# index of its type in this tuple.
+TYPES = ('move', 'line', 'curve', 'arc', 'close', 'hline', 'vline',
+         'smoothcurve', 'quad', 'smoothquad')
+TYPE_CODES = dict((t, i) for i, t in enumerate(TYPES))
+
+# Column order of the arc parameters.
+ARC_FIELDS = ('rx', 'ry', 'rotation', 'largeArc', 'sweepFlag')
+
+
+def arcOpts(row):
+    """
+    The PathAction opts of an arc, from its row of arcs (see ARC_FIELDS).
+    """
+    opts = dict(zip(ARC_FIELDS, row))
+    opts['largeArc'] = int(opts['largeArc'])
+    opts['sweepFlag'] = int(opts['sweepFlag'])
+    return opts
+
+NAN = float('nan')
+
+# Header for toBytes: magic, version, actions, points, arcs
+_HEADER = struct.Struct('<4sIIII')
+_MAGIC = b'PTHA'
+_VERSION = 1
+
+
+class PathArray(object):
+    """
+    Columnar storage for a parsed path.
+
+    Instead of a list of PathAction objects, each holding lists of [x,y]
+    lists and an opts dict, the path is kept in a few contiguous arrays:
+
+        codes    - uint8, action type for each action (see TYPES)
+        isAbs    - bool, absolute/relative flag for each action
+        offsets  - int32, len(actions)+1 offsets into coords. The points
+                   for action i are coords[offsets[i]:offsets[i+1]]
+        coords   - float64 (npoints,2), every point of every action.
+                   hline points store y as NaN, vline points x as NaN.
+        arcIndex - int32, row in arcs for arc actions, -1 otherwise
+        arcs     - float64 (narcs,5), arc parameters (see ARC_FIELDS)
+
+    Indexing a PathArray returns a PathAction whose points are a numpy
+    view into coords, so existing code that works with PathActions can
+    use it without copying any coordinates.
+    """
+
+    def __init__(self, codes, isAbs, offsets, coords, arcIndex, arcs):
+        self.codes = codes
+        self.isAbs = isAbs
+        self.offsets = offsets
+        self.coords = coords
+        self.arcIndex = arcIndex
+        self.arcs = arcs
+
+    @classmethod
+    def fromPath(cls, path, scanner):
+        """
+        Build a PathArray straight from a path string. The scanner
+        (a PathScanner) emits into the arrays, no PathActions are made.
+        """
+        builder = PathArrayBuilder()
+        scanner.scan(path, builder.emit)
+        return builder.build()
+
+    @classmethod
+    def fromActions(cls, actions):
+        """
+        Build a PathArray from an existing list of PathActions.
+        """
+        builder = PathArrayBuilder()
+        for a in actions:
+            builder.emit(a.type, a.points, a.isAbs, a.opts)
+        return builder.build()
+
+    @classmethod
+    def fromBytes(cls, data):
+        """
+        Rebuild a PathArray written by toBytes. The arrays are read-only
+        views of data, nothing is copied.
+        """
+        magic, version, n, npoints, narcs = _HEADER.unpack_from(data, 0)
+        if magic != _MAGIC or version != _VERSION:
+            raise Exception("Invalid PathArray data")
+
+        pos = [_HEADER.size]
+
+        def take(dtype, count):
+            a = np.frombuffer(data, dtype, count, pos[0])
+            pos[0] += a.nbytes
+            return a
+
+        return cls(take(np.uint8, n),
+                   take(np.bool_, n),
+                   take('<i4', n + 1).astype(np.intc, copy=False),
+                   take('<f8', npoints * 2).reshape(-1, 2),
+                   take('<i4', n).astype(np.intc, copy=False),
+                   take('<f8', narcs * len(ARC_FIELDS)).reshape(-1, len(ARC_FIELDS)))
+
+    def toBytes(self):
+        """
+        Pack the arrays into a compact little-endian byte string.
+        """
+        return b''.join([
+            _HEADER.pack(_MAGIC, _VERSION, len(self.codes), len(self.coords), len(self.arcs)),
+            self.codes.astype(np.uint8).tobytes(),
+            self.isAbs.astype(np.bool_).tobytes(),
+            self.offsets.astype('<i4').tobytes(),
+            self.coords.astype('<f8').tobytes(),
+            self.arcIndex.astype('<i4').tobytes(),
+            self.arcs.astype('<f8').tobytes(),
+        ])
+
+    def freeze(self):
+        """
+        Make the arrays read-only, so the PathArray can be shared.
+        """
+        for a in (self.codes, self.isAbs, self.offsets, self.coords, self.arcIndex, self.arcs):
+            a.flags.writeable = False
+        return self
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __iter__(self):
+        for i in range(len(self.codes)):
+            yield self[i]
+
+    def __getitem__(self, item):
+        n = len(self.codes)
+        if item < 0:
+            item += n
+        if item < 0 or item >= n:
+            raise IndexError("PathArray index out of range:%d" % item)
+
+        type = TYPES[self.codes[item]]
+        start = self.offsets[item]
+        end = self.offsets[item + 1]
+
+        if type == 'hline':
+            points = self.coords[start:end, :1]
+        elif type == 'vline':
+            points = self.coords[start:end, 1:]
+        else:
+            points = self.coords[start:end]
+
+        pa = PathAction(type, points, bool(self.isAbs[item]))
+
+        row = self.arcIndex[item]
+        if row >= 0:
+            pa.setOpts(arcOpts(self.arcs[row].tolist()))
+
+        return pa
+
+    def actions(self):
+        """
+        Return the path as a list of PathActions (views into this array).
+        """
+        coords = self.coords
+        arcs = self.arcs
+        offsets = self.offsets.tolist()
+        isAbs = self.isAbs.tolist()
+        arcIndex = self.arcIndex.tolist()
+
+        actions = []
+        for i, code in enumerate(self.codes.tolist()):
+            type = TYPES[code]
+            start = offsets[i]
+            end = offsets[i + 1]
+            if type == 'hline':
+                points = coords[start:end, :1]
+            elif type == 'vline':
+                points = coords[start:end, 1:]
+            else:
+                points = coords[start:end]
+
+            pa = PathAction(type, points, isAbs[i])
+            row = arcIndex[i]
+            if row >= 0:
+                pa.setOpts(arcOpts(arcs[row].tolist()))
+            actions.append(pa)
+
+        return actions
+
+    def nbytes(self):
+        """
+        Total memory used by the arrays.
+        """
+        return (self.codes.nbytes + self.isAbs.nbytes + self.offsets.nbytes
+                + self.coords.nbytes + self.arcIndex.nbytes + self.arcs.nbytes)
+
+
+class PathArrayBuilder(object):
+    """
+    Accumulates actions into typed arrays. The emit method matches the
+    callback used by PathScanner.scan.
+    """
+
+    def __init__(self):
+        self.codes = array('B')
+        self.isAbs = array('B')
+        self.offsets = array('i', [0])
+        self.coords = array('d')
+        self.arcIndex = array('i')
+        self.arcs = array('d')
+
+    def emit(self, type, points, isAbs, opts):
+        self.codes.append(TYPE_CODES[type])
+        self.isAbs.append(1 if isAbs else 0)
+
+        coords = self.coords
+        if type == 'hline':
+            for p in points:
+                coords.extend((p[0], NAN))
+        elif type == 'vline':
+            for p in points:
+                coords.extend((NAN, p[0]))
+        else:
+            for p in points:
+                coords.extend((p[0], p[1]))
+        self.offsets.append(len(coords) // 2)
+
+        if type == 'arc':
+            self.arcIndex.append(len(self.arcs) // len(ARC_FIELDS))
+            self.arcs.extend([opts[f] for f in ARC_FIELDS])
+        else:
+            self.arcIndex.append(-1)
+
+    def build(self):
+        return PathArray(
+            _asArray(self.codes, np.uint8),
+            _asArray(self.isAbs, np.bool_),
+            _asArray(self.offsets, np.intc),
+            _asArray(self.coords, np.float64).reshape(-1, 2),
+            _asArray(self.arcIndex, np.intc),
+            _asArray(self.arcs, np.float64).reshape(-1, len(ARC_FIELDS)))
+
+
+def _asArray(a, dtype):
+    """
+    Wrap an array.array without copying it.
+    """
+    if not len(a):
+        return np.zeros(0, dtype)
+    return np.frombuffer(a, dtype)
@@ -0,0 +1,186 @@
+__author__ = 'kutenai'
+
+import os
+import hashlib
+import tempfile
+from collections import OrderedDict
+
+from PathAction import PathAction
+from PathArray import PathArray, TYPES, arcOpts
+
+
+class PathCache(object):
+    """
+    Memoize a PathParser, so repeated path strings are only parsed once.
+
+    Parsed paths are kept as read-only PathArrays in an LRU of the given
+    size. If a directory is given, each parsed path is also written there
+    in the compact PathArray.toBytes format, named by the SHA-1 of the
+    path string, so later runs can skip parsing altogether.
+
+        cache = PathCache(PathParser('scanner'), size=10000, directory='.pathcache')
+        actions = cache.parsePath(d)
+
+    parsePath returns new PathAction objects on every call, but their
+    points are shared tuples, and parseArray returns the shared PathArray
+    with its arrays marked read-only. A caller can change its own
+    actions, but has to copy the points before changing them. This keeps
+    cached results safe to share.
+
+    The directory can be shared by several processes. Files are written
+    to a temporary name and renamed into place.
+    """
+
+    def __init__(self, parser, size=1024, directory=None):
+        self.parser = parser
+        self.size = size
+        self.directory = directory
+        self.entries = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.diskHits = 0
+
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def parsePath(self, path):
+        """
+        Parse the passed in path string, using the cache.
+        Returns an array of actions from the path
+        """
+        entry = self._lookup(path)
+        if entry[1] is None:
+            entry[1] = _frozenActions(entry[0])
+
+        actions = []
+        for type, points, isAbs, opts in entry[1]:
+            pa = PathAction(type, points, isAbs)
+            if opts:
+                pa.setOpts(opts)
+            actions.append(pa)
+        return actions
+
+    def parseArray(self, path):
+        """
+        Parse the passed in path string into a shared, read-only PathArray.
+        """
+        return self._lookup(path)[0]
+
+    def _lookup(self, path):
+        """
+        Get the [PathArray, frozen actions] entry for a path. The frozen
+        actions are only made when parsePath needs them.
+        """
+        entries = self.entries
+        entry = entries.pop(path, None)
+        if entry is not None:
+            self.hits += 1
+            entries[path] = entry
+            return entry
+
+        self.misses += 1
+        pa = self._load(path)
+        if pa is None:
+            pa = self.parser.parseArray(path).freeze()
+            self._store(path, pa)
+        else:
+            self.diskHits += 1
+
+        entry = [pa, None]
+        entries[path] = entry
+        if len(entries) > self.size:
+            entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        """
+        Empty the memory cache. The disk cache is left alone.
+        """
+        self.entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'diskHits': self.diskHits,
+            'hitRate': float(self.hits) / lookups if lookups else 0.0,
+        }
+
+    def fileName(self, path):
+        """
+        The disk cache file for a path string.
+        """
+        if isinstance(path, bytes):
+            data = path
+        else:
+            data = path.encode('utf-8')
+        digest = hashlib.sha1(data).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest + '.pth')
+
+    def _load(self, path):
+        if not self.directory:
+            return None
+
+        try:
+            with open(self.fileName(path), 'rb') as fp:
+                data = fp.read()
+        except IOError:
+            return None
+
+        try:
+            return PathArray.fromBytes(data)
+        except Exception:
+            # Truncated or from another version, parse again
+            return None
+
+    def _store(self, path, pa):
+        if not self.directory:
+            return
+
+        name = self.fileName(path)
+        folder = os.path.dirname(name)
+        if not os.path.isdir(folder):
+            try:
+                os.makedirs(folder)
+            except OSError:
+                # Made by another process in the meantime
+                pass
+
+        fd, tmp = tempfile.mkstemp(dir=folder, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fp:
+                fp.write(pa.toBytes())
+            os.rename(tmp, name)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+
+def _frozenActions(pa):
+    """
+    The actions of a PathArray as (type, points, isAbs, opts) with the
+    points as tuples, so they can be handed out without copying.
+    """
+    coords = [tuple(p) for p in pa.coords.tolist()]
+    offsets = pa.offsets.tolist()
+    isAbs = pa.isAbs.tolist()
+    arcIndex = pa.arcIndex.tolist()
+    arcs = pa.arcs.tolist()
+
+    frozen = []
+    for i, code in enumerate(pa.codes.tolist()):
+        type = TYPES[code]
+        points = coords[offsets[i]:offsets[i + 1]]
+        if type == 'hline':
+            points = [(p[0],) for p in points]
+        elif type == 'vline':
+            points = [(p[1],) for p in points]
+
+        opts = arcOpts(arcs[arcIndex[i]]) if arcIndex[i] >= 0 else None
+
+        frozen.append((type, tuple(points), isAbs[i], opts))
+    return tuple(frozen)
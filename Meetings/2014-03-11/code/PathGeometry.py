@@ -0,0 +1,280 @@
+__author__ = 'kutenai'
+
+from math import pi
+from collections import OrderedDict
+
+import numpy as np
+
+import Flatten
+from PathArray import PathArray
+from PathTransform import resolvePathWithCurrent
+from Transform import Transform
+
+
+class PathMetrics(object):
+    """
+    Measurements of one path.
+
+        bounds   - (xmin, ymin, xmax, ymax), exact for curves and arcs,
+                   or None for an empty path
+        length   - total length of every subpath
+        area     - signed area, with every subpath closed, positive when
+                   the points go clockwise on screen (y down)
+        centroid - (x, y) centre of the area, or the centre of the
+                   bounds when the area is zero
+    """
+
+    def __init__(self, bounds, length, area, centroid):
+        self.bounds = bounds
+        self.length = length
+        self.area = area
+        self.centroid = centroid
+
+    def __repr__(self):
+        return "PathMetrics(bounds=%s, length=%f, area=%f, centroid=%s)" % (
+            self.bounds, self.length, self.area, self.centroid)
+
+
+def measurePaths(arrays, tolerance=0.01):
+    """
+    Measure a batch of paths, each a PathArray or a list of PathActions.
+    Returns a PathMetrics for each.
+
+    Each path is flattened (see Flatten.flattenSubpaths), then the
+    lengths, areas and centroids of every polyline of every path are
+    worked out together, and summed per path. The length, area and
+    centroid are those of the polylines, so within tolerance of the
+    curves. The bounds come from the curves themselves.
+    """
+    if not len(arrays):
+        return []
+
+    arrays = [_asPathArray(a) for a in arrays]
+
+    chunks = []
+    owners = []
+    for i, pa in enumerate(arrays):
+        for polyline, closed in Flatten.flattenSubpaths(pa, tolerance):
+            chunks.append(polyline)
+            owners.append(i)
+
+    n = len(arrays)
+    length = np.zeros(n)
+    area = np.zeros(n)
+    moment = np.zeros((n, 2))
+
+    if chunks:
+        sizes = np.array([len(c) for c in chunks])
+        pts = np.concatenate(chunks)
+        owner = np.repeat(owners, sizes)
+
+        # The next point around each polyline, wrapping at the end
+        starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+        nxt = np.arange(len(pts)) + 1
+        nxt[starts + sizes - 1] = starts
+
+        x, y = pts[:, 0], pts[:, 1]
+        nx, ny = x[nxt], y[nxt]
+
+        seg = np.hypot(nx - x, ny - y)
+        seg[starts + sizes - 1] = 0  # no closing segment for open polylines
+        length = np.bincount(owner, seg, n)
+
+        cross = x * ny - nx * y
+        area = np.bincount(owner, cross, n) / 2
+        moment[:, 0] = np.bincount(owner, (x + nx) * cross, n)
+        moment[:, 1] = np.bincount(owner, (y + ny) * cross, n)
+
+    bounds = pathBounds(arrays)
+
+    results = []
+    for i in range(n):
+        b = bounds[i]
+        if np.isnan(b[0]):
+            b = None
+        else:
+            b = tuple(b.tolist())
+
+        # Treat an area that is only rounding error as zero
+        if abs(area[i]) > 1e-12 * length[i] ** 2:
+            centroid = tuple((moment[i] / (6 * area[i])).tolist())
+        elif b:
+            centroid = ((b[0] + b[2]) / 2, (b[1] + b[3]) / 2)
+        else:
+            centroid = None
+
+        results.append(PathMetrics(b, float(length[i]), float(area[i]), centroid))
+    return results
+
+
+def pathBounds(arrays):
+    """
+    Exact bounding boxes of a batch of PathArrays, as an (N,4) array of
+    xmin, ymin, xmax, ymax. Empty paths are NaN.
+
+    The box covers the end points of every action, plus the turning
+    points of the curves: the roots of the derivative of each Bezier,
+    and the angles where each arc is horizontal or vertical.
+    """
+    candidates = []
+    counts = []
+    for pa in arrays:
+        pts = _extremePoints(_asPathArray(pa))
+        candidates.append(pts)
+        counts.append(len(pts))
+
+    bounds = np.full((len(arrays), 4), np.nan)
+    counts = np.array(counts)
+    has = counts > 0
+    if not has.any():
+        return bounds
+
+    pts = np.concatenate(candidates)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[has]
+    bounds[has, 0:2] = np.minimum.reduceat(pts, starts)
+    bounds[has, 2:4] = np.maximum.reduceat(pts, starts)
+    return bounds
+
+
+def _asPathArray(path):
+    if isinstance(path, PathArray):
+        return path
+    return PathArray.fromActions(path)
+
+
+def _extremePoints(pa):
+    """
+    Every point of a path that could be on its bounding box.
+    """
+    if not len(pa):
+        return np.zeros((0, 2))
+
+    codes = pa.codes
+    first = pa.offsets[:-1]
+    last = pa.offsets[1:] - 1
+    pts, cp = resolvePathWithCurrent(pa, Transform())
+
+    # End points, and the start of a path that does not begin with a move
+    drawn = codes != Flatten.CLOSE
+    found = [pts[last[drawn]]]
+    if codes[0] != Flatten.MOVE:
+        found.append(cp[:1])
+
+    curves = np.flatnonzero(np.in1d(codes, [Flatten.CURVE, Flatten.SMOOTH,
+                                            Flatten.QUAD, Flatten.SMOOTHQUAD]))
+    if len(curves):
+        P = Flatten._cubicControls(codes, curves, first, pts, cp[:-1])
+        found.append(_cubicExtremes(P))
+
+    arcs = np.flatnonzero(codes == Flatten.ARC)
+    if len(arcs):
+        geom = Flatten._arcCenters(cp[arcs], pts[first[arcs]], pa.arcs[pa.arcIndex[arcs]])
+        found.append(_arcExtremes(geom))
+
+    return np.concatenate(found)
+
+
+def _cubicExtremes(P):
+    """
+    Points of the cubics where dx/dt or dy/dt is zero, for t in (0,1).
+    """
+    # B'(t)/3 = a t^2 + b t + c, for each axis
+    a = -P[0] + 3 * P[1] - 3 * P[2] + P[3]
+    b = 2 * (P[0] - 2 * P[1] + P[2])
+    c = P[1] - P[0]
+
+    disc = b * b - 4 * a * c
+    root = np.sqrt(np.maximum(disc, 0))
+    quadratic = np.abs(a) > 1e-12
+    safeA = np.where(quadratic, a, 1.0)
+    safeB = np.where(b != 0, b, 1.0)
+
+    t1 = np.where(quadratic, (-b + root) / (2 * safeA), -c / safeB)
+    t2 = np.where(quadratic, (-b - root) / (2 * safeA), -1.0)
+    valid1 = (quadratic & (disc >= 0)) | (~quadratic & (b != 0))
+    valid2 = quadratic & (disc >= 0)
+
+    ts = np.concatenate((t1.ravel(), t2.ravel()))
+    ok = np.concatenate((valid1.ravel(), valid2.ravel())) & (ts > 0) & (ts < 1)
+
+    # Which curve each root belongs to; roots are ordered curve, axis
+    k = np.tile(np.repeat(np.arange(P.shape[1]), 2), 2)[ok]
+    t = ts[ok][:, None]
+    s = 1 - t
+    return (s * s * s) * P[0, k] + (3 * s * s * t) * P[1, k] + (3 * s * t * t) * P[2, k] + (t * t * t) * P[3, k]
+
+
+def _arcExtremes(arc):
+    """
+    Points of the arcs where they are horizontal or vertical.
+    """
+    rx, ry = arc['rx'], arc['ry']
+    cos, sin = arc['cos'], arc['sin']
+    theta, dtheta = arc['theta'], arc['dtheta']
+
+    tx = np.arctan2(-ry * sin, rx * cos)
+    ty = np.arctan2(ry * cos, rx * sin)
+    cands = np.stack((tx, tx + pi, ty, ty + pi), axis=1)
+
+    # How far round the sweep each candidate angle is
+    along = np.where(dtheta[:, None] >= 0,
+                     np.mod(cands - theta[:, None], 2 * pi),
+                     np.mod(theta[:, None] - cands, 2 * pi))
+    ok = (along <= np.abs(dtheta)[:, None]) & ~arc['line'][:, None]
+
+    k = np.nonzero(ok)[0]
+    angle = cands[ok]
+    ex = rx[k] * np.cos(angle)
+    ey = ry[k] * np.sin(angle)
+    out = np.empty((len(k), 2))
+    out[:, 0] = arc['cx'][k] + cos[k] * ex - sin[k] * ey
+    out[:, 1] = arc['cy'][k] + sin[k] * ex + cos[k] * ey
+    return out
+
+
+class GeometryCache(object):
+    """
+    Keeps the PathMetrics of each path string, so they are only worked
+    out once. Missing paths are parsed with the given parser (anything
+    with parseArray, such as a PathParser or PathCache) and measured
+    together in one batch.
+
+    At most maxEntries paths are kept, the least recently used are
+    dropped first, as in PathCache.
+    """
+
+    def __init__(self, parser, tolerance=0.01, maxEntries=1024):
+        self.parser = parser
+        self.tolerance = tolerance
+        self.maxEntries = maxEntries
+        self.entries = OrderedDict()
+
+    def measure(self, paths):
+        """
+        Returns a PathMetrics for each path string.
+        """
+        entries = self.entries
+        found = {}
+        missing = []
+        for p in paths:
+            if p in found:
+                continue
+            m = entries.pop(p, None)
+            if m is None:
+                missing.append(p)
+            else:
+                entries[p] = m  # now the most recently used
+            found[p] = m
+
+        if missing:
+            arrays = [self.parser.parseArray(p) for p in missing]
+            for p, m in zip(missing, measurePaths(arrays, self.tolerance)):
+                found[p] = m
+                entries[p] = m
+            while len(entries) > self.maxEntries:
+                entries.popitem(last=False)
+
+        return [found[p] for p in paths]
+
+    def clear(self):
+        self.entries.clear()
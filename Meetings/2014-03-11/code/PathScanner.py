@@ -0,0 +1,238 @@
+__author__ = 'kutenai'
+
+import re
+
+from PathAction import PathAction
+
+# Each matcher skips the leading whitespace and commas itself, so the
+# scanner never needs a separate "skip" step between tokens.
+_COMMAND_RE = re.compile(r'[\s,]*([MmZzLlHhVvCcSsQqTtAa])')
+_NUMBER_RE = re.compile(r'[\s,]*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)')
+_FLAG_RE = re.compile(r'[\s,]*([01])')
+_END_RE = re.compile(r'[\s,]*$')
+
+# Characters a stream can safely be split before or after
+_BOUNDARY = ' \t\r\n,MmZzLlHhVvCcSsQqTtAa'
+
+# Number of values consumed by one repetition of each command.
+_ARG_COUNTS = {
+    'M': 2, 'L': 2, 'C': 6, 'A': 7,
+    'H': 1, 'V': 1, 'S': 4, 'Q': 4, 'T': 2,
+    'Z': 0,
+}
+
+
+class PathScanner(object):
+    """
+    Hand written replacement for the pyparsing grammar in PathParser.
+
+    The path string is scanned once, left to right, using a handful of
+    pre-compiled regular expressions anchored at the current position.
+    There is no backtracking between alternatives, so the cost is linear
+    in the length of the path.
+
+    Unlike the grammar, the scanner accepts the compact forms allowed by
+    the SVG specification, such as '.5', '1e5', '+3', '-1-2', '1.5.5' and
+    arc flags written without separators ('a1 1 0 00 1 1').
+
+    The actions produced are the same as those from the grammar, so the
+    two can be used interchangeably. See PathParser(engine='scanner').
+
+    The scanner can be fed a path in pieces, keeping only the command in
+    progress between them. iterPath and iterStream use this to generate
+    actions as they are found, so even a huge path from a file is parsed
+    in constant memory.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.firstM = True
+        self.cmd = None
+        self.values = []
+        self.repeat = False
+        self.waiting = False
+        self.offset = 0
+
+    def parsePath(self, path):
+        """
+        Parse the passed in path string.
+        Returns an array of actions from the path
+        """
+        return list(self.iterPath(path))
+
+    def iterPath(self, path):
+        """
+        Generate the actions of the path string as they are parsed.
+        """
+        makeAction = self.makeAction
+        for type, points, isAbs, opts in self.tokens([path]):
+            yield makeAction(type, points, isAbs, opts)
+
+    def iterStream(self, fp, chunkSize=65536):
+        """
+        Generate the actions of a single path read from a file object,
+        chunkSize characters at a time.
+        """
+        makeAction = self.makeAction
+        for type, points, isAbs, opts in self.tokens(_readChunks(fp, chunkSize)):
+            yield makeAction(type, points, isAbs, opts)
+
+    def scan(self, path, emit):
+        """
+        Scan the path, calling emit(type, points, isAbs, opts) once for
+        each action found. opts is None unless the action is an arc.
+        """
+        for action in self.tokens([path]):
+            emit(*action)
+
+    def makeAction(self, type, points, isAbs, opts):
+        pa = PathAction(type, points, isAbs)
+        if opts:
+            pa.setOpts(opts)
+        return pa
+
+    def tokens(self, pieces):
+        """
+        Generate (type, points, isAbs, opts) for each action in a path
+        given as an iterable of pieces of text. Each piece must end on a
+        token boundary, see _splitChunks.
+        """
+        self.reset()
+        for piece in pieces:
+            for action in self._feed(piece):
+                yield action
+            self.offset += len(piece)
+
+        if self.values or self.waiting:
+            raise Exception("Invalid path data at %d: path ends inside a command" % self.offset)
+
+    def _feed(self, text):
+        """
+        Scan one piece of the path, carrying the command in progress
+        over from the previous piece.
+        """
+        pos = 0
+        cmd = self.cmd
+        values = self.values
+        repeat = self.repeat
+        waiting = self.waiting
+
+        numberMatch = _NUMBER_RE.match
+        commandMatch = _COMMAND_RE.match
+        flagMatch = _FLAG_RE.match
+
+        while True:
+            if not values and not waiting:
+                m = commandMatch(text, pos)
+                if m:
+                    cmd = m.group(1)
+                    pos = m.end()
+                    repeat = False
+                    if cmd in 'Zz':
+                        yield ('close', [], False, None)
+                        continue
+                    waiting = True
+                elif _END_RE.match(text, pos):
+                    break
+                elif cmd is None or cmd in 'Zz':
+                    self._invalid(text, pos)
+                else:
+                    # Implicit repetition of the previous command.
+                    repeat = True
+
+            upper = cmd.upper()
+            count = _ARG_COUNTS[upper]
+            while len(values) < count:
+                if upper == 'A' and len(values) in (3, 4):
+                    n = flagMatch(text, pos)
+                    if n:
+                        values.append(int(n.group(1)))
+                else:
+                    n = numberMatch(text, pos)
+                    if n:
+                        values.append(float(n.group(1)))
+                if not n:
+                    if _END_RE.match(text, pos):
+                        # Wait for the next piece
+                        break
+                    self._invalid(text, pos)
+                pos = n.end()
+            else:
+                action = self._action(upper, cmd, values, repeat)
+                values = []
+                waiting = False
+                yield action
+                continue
+            break
+
+        self.cmd = cmd
+        self.values = values
+        self.repeat = repeat
+        self.waiting = waiting
+
+    def _invalid(self, text, pos):
+        raise Exception("Invalid path data at %d: %r" % (self.offset + pos, text[pos:pos + 20]))
+
+    def _action(self, upper, cmd, v, repeat):
+        isAbs = cmd == upper
+        if upper == 'M':
+            if cmd == 'm' and self.firstM:
+                # The first m is always absolute
+                self.firstM = False
+                return ('move', [v], True, None)
+            elif repeat:
+                # Moves after the first are implicitly "lineto"s
+                return ('line', [v], isAbs, None)
+            else:
+                return ('move', [v], isAbs, None)
+        elif upper == 'L':
+            return ('line', [v], isAbs, None)
+        elif upper == 'C':
+            return ('curve', [v[0:2], v[2:4], v[4:6]], isAbs, None)
+        elif upper == 'A':
+            return ('arc', [v[5:7]], isAbs, {
+                'largeArc': v[3],
+                'sweepFlag': v[4],
+                'rotation': v[2],
+                'rx': v[0],
+                'ry': v[1]
+            })
+        elif upper == 'H':
+            return ('hline', [v], isAbs, None)
+        elif upper == 'V':
+            return ('vline', [v], isAbs, None)
+        elif upper == 'S':
+            return ('smoothcurve', [v[0:2], v[2:4]], isAbs, None)
+        elif upper == 'Q':
+            return ('quad', [v[0:2], v[2:4]], isAbs, None)
+        elif upper == 'T':
+            return ('smoothquad', [v], isAbs, None)
+
+
+def _readChunks(fp, chunkSize):
+    """
+    Read a file in pieces that end on a token boundary.
+    """
+    return _splitChunks(iter(lambda: fp.read(chunkSize), ''))
+
+
+def _splitChunks(chunks):
+    """
+    Re-cut a sequence of text chunks so that no number is split across
+    two pieces. Each piece ends just before the last separator or
+    command letter of the text read so far, the rest is carried over.
+    """
+    rest = ''
+    for chunk in chunks:
+        text = rest + chunk
+        cut = max(text.rfind(c) for c in _BOUNDARY)
+        if cut <= 0:
+            rest = text
+            continue
+        yield text[:cut]
+        rest = text[cut:]
+
+    if rest:
+        yield rest
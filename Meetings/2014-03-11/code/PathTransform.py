@@ -0,0 +1,144 @@
+__author__ = 'kutenai'
+
+import numpy as np
+
+from PathArray import TYPE_CODES
+
+MOVE = TYPE_CODES['move']
+CLOSE = TYPE_CODES['close']
+HLINE = TYPE_CODES['hline']
+VLINE = TYPE_CODES['vline']
+
+# How the current point moves through each action
+_REL, _ABS, _ABS_H, _ABS_V, _CLOSE = range(5)
+
+
+def resolveActions(actions, xform, currPt=(0.0, 0.0)):
+    """
+    Transform a list of PathActions into absolute points, one point at
+    a time, with PathAction.getPoints. The current point follows the
+    last point of each action, and a close returns it to the point of
+    the last move.
+
+    Returns an (N,2) array with a row for each point of each action.
+    This is the reference for resolvePath.
+    """
+    out = []
+    cp = start = currPt
+    for a in actions:
+        if a.type == 'close':
+            cp = start
+            continue
+
+        pts = a.getPoints(cp, xform)
+        out.extend([p.array() for p in pts])
+        cp = (pts[-1].x, pts[-1].y)
+        if a.type == 'move':
+            start = cp
+
+    return np.array(out, dtype=np.float64).reshape(-1, 2)
+
+
+def resolvePath(pa, xform, currPt=(0.0, 0.0)):
+    """
+    Transform a whole PathArray into absolute points at once.
+
+    Absolute points go through xform.transformPoints and relative points
+    through xform.scalePoints in one call each. The current point for
+    each run of relative actions is then a cumulative sum of the scaled
+    end points, restarted at every absolute action, close or new
+    subpath. Only the runs are visited in Python, not the points.
+
+    The result is identical, bit for bit, to resolveActions. Absolute
+    hline/vline actions need an axis aligned transform, as they do in
+    PathAction.getPoints.
+    """
+    return resolvePathWithCurrent(pa, xform, currPt)[0]
+
+
+def resolvePathWithCurrent(pa, xform, currPt=(0.0, 0.0)):
+    """
+    The same as resolvePath, but also returns the current point before
+    each action, as an (N+1,2) array whose last row is the final point.
+    """
+    n = len(pa)
+    if not n:
+        return np.zeros((0, 2)), np.array([currPt], dtype=np.float64)
+
+    codes = pa.codes
+    isAbs = pa.isAbs
+    offsets = pa.offsets
+
+    owner = np.repeat(np.arange(n), np.diff(offsets))
+    pointAbs = isAbs[owner]
+    pointH = codes[owner] == HLINE
+    pointV = codes[owner] == VLINE
+
+    # The missing value of hline/vline points is zero, as in getLinePoints
+    pts = pa.coords.copy()
+    pts[pointH, 1] = 0.0
+    pts[pointV, 0] = 0.0
+
+    absH = pointAbs & pointH
+    absV = pointAbs & pointV
+    if (absH.any() or absV.any()) and not xform.isAxisAligned():
+        raise Exception("Absolute hline/vline needs an axis aligned transform")
+
+    absPts = xform.transformPoints(pts)
+    relPts = xform.scalePoints(pts)
+
+    cpBefore = _currentPoints(codes, isAbs, offsets, absPts, relPts, currPt)
+
+    out = absPts
+    rel = ~pointAbs
+    out[rel] = cpBefore[owner[rel]] + relPts[rel]
+    out[absH, 1] = cpBefore[owner[absH], 1]
+    out[absV, 0] = cpBefore[owner[absV], 0]
+    return out, cpBefore
+
+
+def _currentPoints(codes, isAbs, offsets, absPts, relPts, currPt):
+    """
+    Work out the current point before each action. Row i is the
+    current point before action i, the extra last row is the final one.
+    """
+    n = len(codes)
+    last = offsets[1:] - 1
+    idx = np.arange(n)
+
+    kind = np.where(isAbs, _ABS, _REL)
+    kind[isAbs & (codes == HLINE)] = _ABS_H
+    kind[isAbs & (codes == VLINE)] = _ABS_V
+    kind[codes == CLOSE] = _CLOSE
+
+    # Index of the last move at or before each action, for closes
+    lastMove = np.maximum.accumulate(np.where(codes == MOVE, idx, -1))
+
+    # Fill in what is known up front. After an absolute action the
+    # current point is its last point; relative actions hold their
+    # scaled end point until the cumulative sum below.
+    cp = np.empty((n + 1, 2))
+    cp[0] = currPt
+    cp[1:] = np.where((kind == _REL)[:, None], relPts[last], absPts[last])
+
+    # Runs of relative actions are summed together, closes and absolute
+    # hline/vline actions depend on the point before them. Runs of
+    # absolute actions are already done.
+    single = (kind != _REL) & (kind != _ABS)
+    breaks = np.flatnonzero((kind[1:] != kind[:-1]) | single[1:] | single[:-1]) + 1
+    starts = np.concatenate(([0], breaks))
+    ends = np.concatenate((breaks, [n]))
+
+    for i, j, k in zip(starts.tolist(), ends.tolist(), kind[starts].tolist()):
+        if k == _REL:
+            run = cp[i:j + 1]
+            np.cumsum(run, axis=0, out=run)
+        elif k == _CLOSE:
+            m = lastMove[i]
+            cp[i + 1] = cp[m + 1] if m >= 0 else currPt
+        elif k == _ABS_H:
+            cp[i + 1, 1] = cp[i, 1]
+        elif k == _ABS_V:
+            cp[i + 1, 0] = cp[i, 0]
+
+    return cp
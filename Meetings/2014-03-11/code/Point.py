@@ -6,13 +6,14 @@ class Point(object):
     point based operations.
     """
 
+    __slots__ = ('x','y')
+
     def __init__(self,*args):
-        object.__init__(self)
         if len(args) == 2:
-            self.x = args[0]
-            self.y = args[1]
+            # Fast path, Point(x,y), with any x and y, None too
+            self.x,self.y = args
         elif len(args) == 1:
-            if isinstance(args[0],list) or isinstance(args[0],tuple):
+            if isinstance(args[0],(list,tuple)):
                 pts = args[0]
                 self.x = pts[0]
                 self.y = pts[1]
@@ -24,27 +25,48 @@ class Point(object):
         else:
             raise Exception("Invalid Initialization")
 
+    def __getstate__(self):
+        return (self.x,self.y)
+
+    def __setstate__(self,state):
+        self.x,self.y = state
+
     def __repr__(self):
         return "Point(%f,%f)" % (self.x,self.y)
 
     def __add__(self,other):
-        x = self.x + other.x
-        y = self.y + other.y
-        return Point(x,y)
+        return Point(self.x + other.x,self.y + other.y)
 
     def __sub__(self,other):
-        x = self.x - other.x
-        y = self.y - other.y
-        return Point(x,y)
+        return Point(self.x - other.x,self.y - other.y)
 
     def __mul__(self,other):
         if isinstance(other,Point):
             return Point(self.x*other.x,self.y*other.y)
 
         fac = float(other)
-        x = self.x*fac
-        y = self.y*fac
-        return Point(x,y)
+        return Point(self.x*fac,self.y*fac)
+
+    def __iadd__(self,other):
+        self.x += other.x
+        self.y += other.y
+        return self
+
+    def __isub__(self,other):
+        self.x -= other.x
+        self.y -= other.y
+        return self
+
+    def __imul__(self,other):
+        if isinstance(other,Point):
+            self.x *= other.x
+            self.y *= other.y
+            return self
+
+        fac = float(other)
+        self.x *= fac
+        self.y *= fac
+        return self
 
     def __abs__(self):
         return Point(abs(self.x),abs(self.y))
@@ -109,6 +131,16 @@ class Point(object):
         else:
             return Point(self.x/mag,self.y/mag)
 
+    def normalizeInPlace(self):
+        mag = self.mag()
+        if mag == 0:
+            self.x = 0
+            self.y = 0
+        else:
+            self.x /= mag
+            self.y /= mag
+        return self
+
     def vector(self,other):
 
         dx = other.x - self.x
@@ -116,6 +148,3 @@ class Point(object):
 
         return Point(dx,dy)
 
-
-
-
@@ -0,0 +1,111 @@
+__author__ = 'kutenai'
+
+import numpy as np
+
+from Point import Point
+
+
+class PointArray(object):
+    """
+    A group of points stored as one (N,2) float64 numpy array.
+
+    Provides the same operations as Point, but over every point at
+    once. The other value of an operation can be a Point (applied to
+    all points) or a PointArray of the same length (point by point).
+    """
+
+    def __init__(self, pts):
+        if isinstance(pts, PointArray):
+            pts = pts.pts.copy()
+        elif not isinstance(pts, np.ndarray):
+            pts = [[p[0], p[1]] for p in pts]
+        self.pts = np.asarray(pts, dtype=np.float64).reshape(-1, 2)
+
+    @property
+    def x(self):
+        return self.pts[:, 0]
+
+    @property
+    def y(self):
+        return self.pts[:, 1]
+
+    def __len__(self):
+        return len(self.pts)
+
+    def __repr__(self):
+        return "PointArray(%d points)" % len(self.pts)
+
+    def __getitem__(self, item):
+        x, y = self.pts[item]
+        return Point(float(x), float(y))
+
+    def __iter__(self):
+        for x, y in self.pts.tolist():
+            yield Point(x, y)
+
+    def __add__(self, other):
+        return PointArray(self.pts + _values(other))
+
+    def __sub__(self, other):
+        return PointArray(self.pts - _values(other))
+
+    def __mul__(self, other):
+        return PointArray(self.pts * _values(other))
+
+    def __iadd__(self, other):
+        self.pts += _values(other)
+        return self
+
+    def __isub__(self, other):
+        self.pts -= _values(other)
+        return self
+
+    def __imul__(self, other):
+        self.pts *= _values(other)
+        return self
+
+    def __abs__(self):
+        return PointArray(np.abs(self.pts))
+
+    def array(self):
+        return self.pts.tolist()
+
+    def points(self):
+        return list(self)
+
+    def distance(self, other):
+        d = self.pts - _values(other)
+        return np.sqrt(d[:, 0] ** 2 + d[:, 1] ** 2)
+
+    def midPoint(self, other):
+        return PointArray((self.pts + _values(other)) / 2)
+
+    def inCircle(self, center, radius):
+        """
+        Returns a bool array, True for the points inside the circle.
+        """
+        d = self.pts - _values(center)
+        return d[:, 0] ** 2 + d[:, 1] ** 2 < radius ** 2
+
+    def mag(self):
+        return np.sqrt(self.pts[:, 0] ** 2 + self.pts[:, 1] ** 2)
+
+    def normalize(self):
+        mag = self.mag()
+        # Zero length points stay at 0,0
+        mag[mag == 0] = np.inf
+        return PointArray(self.pts / mag[:, None])
+
+    def vector(self, other):
+        return PointArray(_values(other) - self.pts)
+
+
+def _values(other):
+    """
+    Get something that broadcasts against an (N,2) array.
+    """
+    if isinstance(other, PointArray):
+        return other.pts
+    if isinstance(other, Point):
+        return np.array([other.x, other.y])
+    return other
@@ -0,0 +1,276 @@
+__author__ = 'kutenai'
+
+import heapq
+from math import floor, sqrt
+
+from Point import Point
+from PathTransform import resolvePath
+from Transform import Transform
+
+
+class GridIndex(object):
+    """
+    Uniform grid spatial index for points.
+
+    Points are kept in square cells of cellSize, so a query only looks
+    at the cells it overlaps instead of every point. Each point has an
+    id, which is what the queries return. Points can be added and
+    removed at any time.
+
+        index = GridIndex.fromPoints(points)
+        index.radius(Point(10,10), 5)       # ids inside the circle
+        index.nearest(Point(10,10), k=3)    # [(distance, id), ...]
+        index.box(Point(0,0), Point(20,20)) # ids inside the box
+
+    The cell size should be about the size of a typical query. When
+    built with fromPoints, it is picked so there are a few points per
+    cell.
+    """
+
+    def __init__(self, cellSize):
+        if cellSize <= 0:
+            raise Exception("Invalid Cell Size:%s" % cellSize)
+
+        self.cellSize = float(cellSize)
+        self.cells = {}
+        self.items = {}
+
+        # Range of the cells that hold points, bounds nearest(). After a
+        # delete empties a cell on its edge, it is recomputed on use
+        self.minCell = None
+        self.maxCell = None
+        self._stale = False
+
+    @classmethod
+    def fromPoints(cls, points, cellSize=None, perCell=4):
+        """
+        Build an index from a list of Points (or [x,y] values). The id
+        of each point is its position in the list.
+        """
+        points = [(float(p[0]), float(p[1])) for p in points]
+        if cellSize is None:
+            cellSize = _pickCellSize(points, perCell)
+
+        index = cls(cellSize)
+        for id, (x, y) in enumerate(points):
+            index.insert(id, x, y)
+        return index
+
+    @classmethod
+    def fromPathArray(cls, pa, xform=None, cellSize=None, perCell=4):
+        """
+        Build an index over the absolute vertices of a PathArray. The id
+        of each vertex is its row in pa.coords.
+        """
+        pts = resolvePath(pa, xform or Transform())
+        return cls.fromPoints(pts.tolist(), cellSize, perCell)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, id):
+        return id in self.items
+
+    def cellOf(self, x, y):
+        return (int(floor(x / self.cellSize)), int(floor(y / self.cellSize)))
+
+    def point(self, id):
+        x, y = self.items[id]
+        return Point(x, y)
+
+    def insert(self, id, x, y=None):
+        """
+        Add a point, given as x,y or as a Point. An existing id is moved.
+        """
+        if y is None:
+            x, y = x[0], x[1]
+
+        if id in self.items:
+            self.delete(id)
+
+        cell = self.cellOf(x, y)
+        self.items[id] = (x, y)
+        self.cells.setdefault(cell, {})[id] = (x, y)
+
+        self.bounds()
+        if self.minCell is None:
+            self.minCell = cell
+            self.maxCell = cell
+        else:
+            self.minCell = (min(self.minCell[0], cell[0]), min(self.minCell[1], cell[1]))
+            self.maxCell = (max(self.maxCell[0], cell[0]), max(self.maxCell[1], cell[1]))
+
+    def delete(self, id):
+        """
+        Remove a point. Returns False if the id is not in the index.
+        """
+        xy = self.items.pop(id, None)
+        if xy is None:
+            return False
+
+        cell = self.cellOf(*xy)
+        bucket = self.cells[cell]
+        del bucket[id]
+        if not bucket:
+            del self.cells[cell]
+            if cell[0] in (self.minCell[0], self.maxCell[0]) or \
+                    cell[1] in (self.minCell[1], self.maxCell[1]):
+                self._stale = True
+        return True
+
+    def bounds(self):
+        """
+        The lowest and highest cells that hold points, or None, None.
+        """
+        if self._stale:
+            cells = list(self.cells)
+            if cells:
+                self.minCell = (min(c[0] for c in cells), min(c[1] for c in cells))
+                self.maxCell = (max(c[0] for c in cells), max(c[1] for c in cells))
+            else:
+                self.minCell = self.maxCell = None
+            self._stale = False
+        return self.minCell, self.maxCell
+
+    def box(self, lower, upper):
+        """
+        Ids of the points with lower <= point <= upper.
+        """
+        x0, y0 = lower[0], lower[1]
+        x1, y1 = upper[0], upper[1]
+        c0 = self.cellOf(x0, y0)
+        c1 = self.cellOf(x1, y1)
+
+        found = []
+        for cell, bucket in self._cellsIn(c0, c1):
+            for id, (x, y) in bucket.items():
+                if x0 <= x <= x1 and y0 <= y <= y1:
+                    found.append(id)
+        return found
+
+    def radius(self, center, radius):
+        """
+        Ids of the points inside the circle. Uses the same test as
+        Point.inCircle, so points on the edge are not included.
+        """
+        cx, cy = center[0], center[1]
+        r2 = radius ** 2
+        c0 = self.cellOf(cx - radius, cy - radius)
+        c1 = self.cellOf(cx + radius, cy + radius)
+
+        found = []
+        for cell, bucket in self._cellsIn(c0, c1):
+            for id, (x, y) in bucket.items():
+                if (cx - x) ** 2 + (cy - y) ** 2 < r2:
+                    found.append(id)
+        return found
+
+    def nearest(self, center, k=1):
+        """
+        The k closest points, as a list of (distance, id) sorted by
+        distance.
+
+        Searches rings of cells outwards from the cell of the center,
+        starting at the first ring that reaches an occupied cell, and
+        stops once the closest unsearched ring is further away than the
+        k'th best point found so far. Once the rings would look at more
+        cells than there are occupied cells, the occupied cells left are
+        scanned instead, so a query far from the points costs no more
+        than a linear scan.
+        """
+        if not self.items:
+            return []
+
+        cx, cy = center[0], center[1]
+        ci, cj = self.cellOf(cx, cy)
+        (i0, j0), (i1, j1) = self.bounds()
+
+        # Rings before this are outside the occupied cells, past maxRing
+        # they are too
+        ring = max(i0 - ci, ci - i1, j0 - cj, cj - j1, 0)
+        maxRing = max(abs(ci - i0), abs(ci - i1), abs(cj - j0), abs(cj - j1))
+
+        best = []  # max heap of (-d2, id)
+
+        def add(bucket):
+            for id, (x, y) in bucket.items():
+                d2 = (cx - x) ** 2 + (cy - y) ** 2
+                if len(best) < k:
+                    heapq.heappush(best, (-d2, id))
+                elif d2 < -best[0][0]:
+                    heapq.heapreplace(best, (-d2, id))
+
+        looked = 0
+        while ring <= maxRing:
+            looked += 8 * ring or 1
+            if looked > len(self.cells):
+                for cell, bucket in self.cells.items():
+                    if max(abs(cell[0] - ci), abs(cell[1] - cj)) >= ring:
+                        add(bucket)
+                break
+
+            for cell in _ring(ci, cj, ring):
+                bucket = self.cells.get(cell)
+                if bucket:
+                    add(bucket)
+
+            # Anything in the next ring is at least this far away
+            reach = ring * self.cellSize
+            if len(best) == k and -best[0][0] <= reach * reach:
+                break
+            ring += 1
+
+        return sorted([(sqrt(-d2), id) for d2, id in best])
+
+    def _cellsIn(self, c0, c1):
+        """
+        The occupied cells between c0 and c1. Walks the cell range or
+        the occupied cells, whichever is smaller.
+        """
+        cells = self.cells
+        if (c1[0] - c0[0] + 1) * (c1[1] - c0[1] + 1) > len(cells):
+            for cell, bucket in cells.items():
+                if c0[0] <= cell[0] <= c1[0] and c0[1] <= cell[1] <= c1[1]:
+                    yield cell, bucket
+            return
+
+        for i in range(c0[0], c1[0] + 1):
+            for j in range(c0[1], c1[1] + 1):
+                bucket = cells.get((i, j))
+                if bucket:
+                    yield (i, j), bucket
+
+
+def _ring(ci, cj, ring):
+    """
+    The cells at exactly ring steps from ci,cj.
+    """
+    if ring == 0:
+        yield (ci, cj)
+        return
+
+    for i in range(ci - ring, ci + ring + 1):
+        yield (i, cj - ring)
+        yield (i, cj + ring)
+    for j in range(cj - ring + 1, cj + ring):
+        yield (ci - ring, j)
+        yield (ci + ring, j)
+
+
+def _pickCellSize(points, perCell):
+    """
+    A cell size that gives about perCell points per cell, if the points
+    were spread evenly over their bounding box.
+    """
+    if len(points) < 2:
+        return 1.0
+
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    width = max(xs) - min(xs)
+    height = max(ys) - min(ys)
+    area = max(width * height, max(width, height) ** 2 / len(points))
+    if area == 0:
+        return 1.0
+
+    return sqrt(area * perCell / len(points))
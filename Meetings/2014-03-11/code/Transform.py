@@ -0,0 +1,95 @@
+__author__ = 'kutenai'
+
+import numpy as np
+
+
+class Transform(object):
+    """
+    An affine transform, using the same layout as the SVG matrix(a,b,c,d,e,f)
+
+        | a c e |
+        | b d f |
+        | 0 0 1 |
+
+    transformPoint/scalePoint work on one point, and are what
+    PathAction.getPoints expects from an xform. transformPoints and
+    scalePoints do the same for a whole (N,2) array at once.
+    """
+
+    def __init__(self, a=1.0, b=0.0, c=0.0, d=1.0, e=0.0, f=0.0):
+        self.a = float(a)
+        self.b = float(b)
+        self.c = float(c)
+        self.d = float(d)
+        self.e = float(e)
+        self.f = float(f)
+
+    @classmethod
+    def translate(cls, tx, ty=0.0):
+        return cls(e=tx, f=ty)
+
+    @classmethod
+    def scale(cls, sx, sy=None):
+        if sy is None:
+            sy = sx
+        return cls(a=sx, d=sy)
+
+    def __repr__(self):
+        return "Transform(%f,%f,%f,%f,%f,%f)" % (
+            self.a, self.b, self.c, self.d, self.e, self.f)
+
+    def __mul__(self, other):
+        """
+        Compose two transforms, other is applied first.
+        """
+        return Transform(
+            self.a * other.a + self.c * other.b,
+            self.b * other.a + self.d * other.b,
+            self.a * other.c + self.c * other.d,
+            self.b * other.c + self.d * other.d,
+            self.a * other.e + self.c * other.f + self.e,
+            self.b * other.e + self.d * other.f + self.f)
+
+    def matrix(self):
+        return np.array([[self.a, self.c, self.e],
+                         [self.b, self.d, self.f]])
+
+    def isAxisAligned(self):
+        """
+        True if the transform does not rotate or skew.
+        """
+        return self.b == 0 and self.c == 0
+
+    def transformPoint(self, x, y):
+        return (self.a * x + self.c * y + self.e,
+                self.b * x + self.d * y + self.f)
+
+    def scalePoint(self, x, y):
+        return (self.a * x + self.c * y,
+                self.b * x + self.d * y)
+
+    def transformPoints(self, pts):
+        """
+        Transform an (N,2) array of points.
+
+        This is written out term by term, rather than as pts.dot(M.T),
+        so the results are bit for bit the same as transformPoint. A
+        BLAS dot may fuse or reorder the operations.
+        """
+        x = pts[:, 0]
+        y = pts[:, 1]
+        out = np.empty((len(pts), 2))
+        out[:, 0] = self.a * x + self.c * y + self.e
+        out[:, 1] = self.b * x + self.d * y + self.f
+        return out
+
+    def scalePoints(self, pts):
+        """
+        Apply only the linear part of the transform to an (N,2) array.
+        """
+        x = pts[:, 0]
+        y = pts[:, 1]
+        out = np.empty((len(pts), 2))
+        out[:, 0] = self.a * x + self.c * y
+        out[:, 1] = self.b * x + self.d * y
+        return out
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+"""
+Benchmark Flatten.flattenPath.
+
+Flattens random curve-heavy paths and reports the throughput. For the
+Bezier curves, the vectorized evaluation is also compared with the same
+samples worked out one Point at a time in Python.
+
+    python benchFlatten.py -n 100 -c 2000 -t 0.05
+"""
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+from Point import Point
+from svgPathParser import PathParser
+from PathTransform import resolvePathWithCurrent
+from Transform import Transform
+import Flatten
+
+
+def randomPath(rnd, commands):
+    num = lambda: "%.2f" % rnd.uniform(-50, 50)
+    pt = lambda: "%s,%s" % (num(), num())
+
+    parts = ["M %s" % pt()]
+    for i in range(commands):
+        c = rnd.choice('ccccssqqttaall')
+        if c == 'c':
+            parts.append("c %s %s %s" % (pt(), pt(), pt()))
+        elif c in 'sq':
+            parts.append("%s %s %s" % (c, pt(), pt()))
+        elif c == 'a':
+            parts.append("a %.2f,%.2f %s %d %d %s" % (
+                rnd.uniform(1, 40), rnd.uniform(1, 40), num(),
+                rnd.randint(0, 1), rnd.randint(0, 1), pt()))
+        else:
+            parts.append("%s %s" % (c, pt()))
+    parts.append("z")
+    return " ".join(parts)
+
+
+def curvesByPoint(pa, tolerance):
+    """
+    Evaluate the same Bezier samples as flattenPath, with Points.
+    """
+    pts, cp = resolvePathWithCurrent(pa, Transform())
+    curves = np.flatnonzero(np.in1d(pa.codes, [Flatten.CURVE, Flatten.SMOOTH,
+                                               Flatten.QUAD, Flatten.SMOOTHQUAD]))
+    P = Flatten._cubicControls(pa.codes, curves, pa.offsets[:-1], pts, cp[:-1])
+    counts = Flatten._cubicSegments(P, tolerance, 10000)
+
+    out = []
+    for k in range(len(curves)):
+        p0, p1, p2, p3 = [Point(float(x), float(y)) for x, y in P[:, k]]
+        n = int(counts[k])
+        for j in range(1, n + 1):
+            t = (j + 0.0) / n
+            s = 1 - t
+            out.append(p0 * (s * s * s) + p1 * (3 * s * s * t) + p2 * (3 * s * t * t) + p3 * (t * t * t))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--count", type=int, default=50,
+                        help="Number of random paths.")
+    parser.add_argument("-c", "--commands", type=int, default=1000,
+                        help="Number of commands in each path.")
+    parser.add_argument("-t", "--tolerance", type=float, default=0.1,
+                        help="Flattening tolerance.")
+    args = parser.parse_args()
+
+    rnd = random.Random(1)
+    pp = PathParser('scanner')
+    arrays = [pp.parseArray(randomPath(rnd, args.commands)) for i in range(args.count)]
+
+    start = time.time()
+    polylines = [Flatten.flattenPath(pa, args.tolerance) for pa in arrays]
+    flatTime = time.time() - start
+    npoints = sum(len(p) for lines in polylines for p in lines)
+
+    print("Corpus: %d paths, %d commands" % (len(arrays), sum(len(pa) for pa in arrays)))
+    print("flattenPath  %8.3fs %12.0f output points/s (%d points)" % (
+        flatTime, npoints / flatTime, npoints))
+
+    start = time.time()
+    curveSamples = [curvesByPoint(pa, args.tolerance) for pa in arrays]
+    pointTime = time.time() - start
+    nsamples = sum(len(s) for s in curveSamples)
+    print("per Point    %8.3fs %12.0f curve points/s (%d points, Bezier samples only)" % (
+        pointTime, nsamples / pointTime, nsamples))
+    print("Speedup: at least %.1fx" % (pointTime / flatTime))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+"""
+Benchmark the PathParser engines against each other.
+
+Builds a corpus of random paths (or reads one from a file, one path per
+line like paths.txt), checks that every engine produces the same actions,
+then reports the time taken by each engine.
+
+    python benchParsers.py -n 20000
+    python benchParsers.py paths.txt --repeat 1000
+"""
+
+import argparse
+import random
+import time
+
+from svgPathParser import PathParser, parseBatch
+
+
+def randomNumber(rnd):
+    # Only forms that the pyparsing grammar accepts
+    if rnd.random() < 0.5:
+        return "%d" % rnd.randint(-500, 500)
+    return "%.3f" % rnd.uniform(-500, 500)
+
+
+def randomPath(rnd, commands=40):
+    """
+    Build a random path using the commands both engines understand.
+    """
+    num = lambda: randomNumber(rnd)
+    pt = lambda: "%s,%s" % (num(), num())
+
+    parts = ["M %s" % pt()]
+    for i in range(commands):
+        c = rnd.choice('LlCcAaMmSsQqTt')
+        if c in 'LlTt':
+            parts.append("%s %s %s" % (c, pt(), pt()))
+        elif c in 'SsQq':
+            parts.append("%s %s %s" % (c, pt(), pt()))
+        elif c in 'Cc':
+            parts.append("%s %s %s %s" % (c, pt(), pt(), pt()))
+        elif c in 'Aa':
+            parts.append("%s %s %s %d %d %s" % (
+                c, pt(), num(), rnd.randint(0, 1), rnd.randint(0, 1), pt()))
+        else:
+            parts.append("%s %s" % (c, pt()))
+    parts.append("Z")
+    return " ".join(parts)
+
+
+def buildCorpus(count, commands, seed=1):
+    rnd = random.Random(seed)
+    return [randomPath(rnd, commands) for i in range(count)]
+
+
+def readCorpus(file, repeat):
+    with open(file, 'r') as fp:
+        paths = [p.strip() for p in fp if p.strip() and p[0] != '#']
+    return paths * repeat
+
+
+def timeEngine(engine, corpus):
+    pp = PathParser(engine)
+    start = time.time()
+    for path in corpus:
+        pp.parsePath(path)
+    return time.time() - start
+
+
+def timeBatch(engine, corpus, workers, chunkSize):
+    start = time.time()
+    for path, actions, error in parseBatch(corpus, engine, workers, chunkSize):
+        if error:
+            raise Exception("Failed to parse:%s" % path)
+    return time.time() - start
+
+
+def checkEngines(corpus):
+    """
+    Make sure every engine gives the same actions for the corpus.
+    """
+    parsers = [PathParser(e) for e in PathParser.ENGINES]
+    for path in corpus:
+        results = [[str(a) for a in pp.parsePath(path)] for pp in parsers]
+        for r in results[1:]:
+            if r != results[0]:
+                raise Exception("Engines disagree on:%s" % path)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("file", nargs='?',
+                        help="Optional path file to use as the corpus.")
+    parser.add_argument("-n", "--count", type=int, default=2000,
+                        help="Number of random paths to generate.")
+    parser.add_argument("-c", "--commands", type=int, default=40,
+                        help="Number of commands in each random path.")
+    parser.add_argument("-r", "--repeat", type=int, default=1,
+                        help="Number of times to repeat the file corpus.")
+    parser.add_argument("-j", "--workers", type=int, default=1,
+                        help="Also time parseBatch with this many workers, 0 for one per CPU.")
+    parser.add_argument("--chunk-size", type=int, default=64,
+                        help="Chunk size for parseBatch.")
+    args = parser.parse_args()
+
+    if args.file:
+        corpus = readCorpus(args.file, args.repeat)
+    else:
+        corpus = buildCorpus(args.count, args.commands)
+
+    size = sum(len(p) for p in corpus)
+    print("Corpus: %d paths, %d bytes" % (len(corpus), size))
+
+    checkEngines(corpus[:1000])
+
+    times = {}
+    for engine in PathParser.ENGINES:
+        times[engine] = timeEngine(engine, corpus)
+        print("%-10s %8.3fs %10.0f paths/s %8.2f MB/s" % (
+            engine, times[engine],
+            len(corpus) / times[engine],
+            size / times[engine] / 1e6))
+
+    print("Speedup: %.1fx" % (times['pyparsing'] / times['scanner']))
+
+    if args.workers != 1:
+        for engine in PathParser.ENGINES:
+            t = timeBatch(engine, corpus, args.workers or None, args.chunk_size)
+            print("%-10s %8.3fs %10.0f paths/s  batch, %.1fx vs one core" % (
+                engine, t, len(corpus) / t, times[engine] / t))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+"""
+Micro benchmarks for Point and PointArray.
+
+Reports the memory used per point and the operations per second for
+the common operations. Use --output to append the results, as one JSON
+line, to a file so they can be tracked over time.
+
+    python benchPoint.py
+    python benchPoint.py -n 100000 --output point_bench.jsonl
+"""
+
+import argparse
+import json
+import sys
+import time
+import timeit
+
+from Point import Point
+from PointArray import PointArray
+
+SETUP = """
+from Point import Point
+from PointArray import PointArray
+import random
+rnd = random.Random(1)
+p = Point(3.0, 4.0)
+q = Point(1.5, -2.5)
+pts = PointArray([[rnd.uniform(-100, 100), rnd.uniform(-100, 100)] for i in range(%(n)d)])
+other = PointArray(pts)
+"""
+
+# name, statement, points handled per statement
+POINT_OPS = [
+    ('Point(x,y)', 'Point(1.0, 2.0)'),
+    ('Point([x,y])', 'Point([1.0, 2.0])'),
+    ('p + q', 'p + q'),
+    ('p += q', 'p += q'),
+    ('p * 2', 'p * 2'),
+    ('p *= 1', 'p *= 1'),
+    ('distance', 'p.distance(q)'),
+    ('midPoint', 'p.midPoint(q)'),
+    ('inCircle', 'p.inCircle(q, 5)'),
+    ('mag', 'p.mag()'),
+    ('normalize', 'p.normalize()'),
+]
+
+ARRAY_OPS = [
+    ('array distance', 'pts.distance(q)'),
+    ('array distance pairwise', 'pts.distance(other)'),
+    ('array midPoint', 'pts.midPoint(other)'),
+    ('array inCircle', 'pts.inCircle(q, 50)'),
+    ('array mag', 'pts.mag()'),
+    ('array normalize', 'pts.normalize()'),
+    ('array +=', 'pts += q'),
+]
+
+
+def pointMemory():
+    p = Point(1.0, 2.0)
+    size = sys.getsizeof(p)
+    if hasattr(p, '__dict__'):
+        size += sys.getsizeof(p.__dict__)
+    return size
+
+
+def arrayMemory(n):
+    return PointArray([[0.0, 0.0]] * n).pts.nbytes / float(n)
+
+
+def rate(stmt, setup, perStmt, seconds):
+    """
+    Operations per second, run for roughly the given time.
+    """
+    timer = timeit.Timer(stmt, setup)
+    number = 1
+    while True:
+        t = timer.timeit(number)
+        if t > seconds / 5:
+            break
+        number *= 10
+    best = min(timer.repeat(3, number))
+    return number * perStmt / best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--count", type=int, default=10000,
+                        help="Number of points in the PointArray tests.")
+    parser.add_argument("-t", "--time", type=float, default=0.5,
+                        help="Rough time to spend on each test, in seconds.")
+    parser.add_argument("-o", "--output",
+                        help="Append the results as a JSON line to this file.")
+    args = parser.parse_args()
+
+    setup = SETUP % {'n': args.count}
+    results = {
+        'time': time.time(),
+        'python': sys.version.split()[0],
+        'bytesPerPoint': pointMemory(),
+        'bytesPerArrayPoint': arrayMemory(args.count),
+        'opsPerSec': {},
+    }
+
+    print("Memory: Point %d bytes, PointArray %.1f bytes per point" % (
+        results['bytesPerPoint'], results['bytesPerArrayPoint']))
+
+    for name, stmt in POINT_OPS:
+        results['opsPerSec'][name] = rate(stmt, setup, 1, args.time)
+        print("%-26s %14.0f ops/s" % (name, results['opsPerSec'][name]))
+
+    for name, stmt in ARRAY_OPS:
+        results['opsPerSec'][name] = rate(stmt, setup, args.count, args.time)
+        print("%-26s %14.0f points/s" % (name, results['opsPerSec'][name]))
+
+    if args.output:
+        with open(args.output, 'a') as fp:
+            fp.write(json.dumps(results, sort_keys=True) + "\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""
+Benchmark GridIndex queries against brute force loops over Points.
+
+    python benchSpatial.py -n 1000000 -q 200
+"""
+
+import argparse
+import random
+import time
+
+from Point import Point
+from SpatialIndex import GridIndex
+
+
+def bruteRadius(points, center, radius):
+    return [i for i, p in enumerate(points) if p.inCircle(center, radius)]
+
+
+def bruteNearest(points, center, k):
+    return sorted([(p.distance(center), i) for i, p in enumerate(points)])[:k]
+
+
+def bruteBox(points, lower, upper):
+    return [i for i, p in enumerate(points)
+            if lower.x <= p.x <= upper.x and lower.y <= p.y <= upper.y]
+
+
+def timed(fn, queries):
+    start = time.time()
+    results = [fn(*q) for q in queries]
+    return time.time() - start, results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--count", type=int, default=100000,
+                        help="Number of points to index.")
+    parser.add_argument("-q", "--queries", type=int, default=100,
+                        help="Number of queries of each kind.")
+    parser.add_argument("-r", "--radius", type=float, default=5.0,
+                        help="Radius for the circle queries.")
+    parser.add_argument("-k", type=int, default=5,
+                        help="Number of neighbours for the nearest queries.")
+    args = parser.parse_args()
+
+    rnd = random.Random(1)
+    size = 1000.0
+    points = [Point(rnd.uniform(0, size), rnd.uniform(0, size)) for i in range(args.count)]
+
+    start = time.time()
+    index = GridIndex.fromPoints(points)
+    print("Built index of %d points in %.3fs, cell size %.2f" % (
+        len(index), time.time() - start, index.cellSize))
+
+    centers = [Point(rnd.uniform(0, size), rnd.uniform(0, size)) for i in range(args.queries)]
+    span = Point(args.radius, args.radius)
+
+    tests = [
+        ('radius', bruteRadius, index.radius,
+         [(c, args.radius) for c in centers]),
+        ('nearest', bruteNearest, index.nearest,
+         [(c, args.k) for c in centers]),
+        ('box', bruteBox, index.box,
+         [(c - span, c + span) for c in centers]),
+    ]
+
+    for name, brute, indexed, queries in tests:
+        bruteTime, expected = timed(lambda *q: brute(points, *q), queries)
+        indexTime, got = timed(indexed, queries)
+
+        for e, g in zip(expected, got):
+            if name == 'nearest':
+                e = [d for d, i in e]
+                g = [d for d, i in g]
+            if sorted(e) != sorted(g):
+                raise Exception("Index and brute force differ for %s" % name)
+
+        print("%-8s brute %8.4fs/query  index %10.6fs/query  speedup %8.0fx" % (
+            name, bruteTime / len(queries), indexTime / len(queries),
+            bruteTime / indexTime))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""
+Benchmark PathTransform.resolvePath against the per point loop.
+
+Builds random relative-heavy paths, resolves them to absolute points
+both ways under a transform, checks the results are identical, and
+reports the time for each.
+
+    python benchTransform.py -n 200 -c 5000
+"""
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+from svgPathParser import PathParser
+from PathTransform import resolveActions, resolvePath
+from Transform import Transform
+
+
+def randomPath(rnd, commands):
+    num = lambda: "%.3f" % rnd.uniform(-50, 50)
+    pt = lambda: "%s,%s" % (num(), num())
+
+    parts = ["M %s" % pt()]
+    for i in range(commands):
+        c = rnd.choice('llllllllccccccccahhvvHVLCmz')
+        if c in 'lLmM':
+            parts.append("%s %s" % (c, pt()))
+        elif c in 'cC':
+            parts.append("%s %s %s %s" % (c, pt(), pt(), pt()))
+        elif c == 'a':
+            parts.append("a %s 0 0 1 %s" % (pt(), pt()))
+        elif c in 'hvHV':
+            parts.append("%s %s" % (c, num()))
+        else:
+            parts.append("z")
+    return " ".join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--count", type=int, default=100,
+                        help="Number of random paths.")
+    parser.add_argument("-c", "--commands", type=int, default=2000,
+                        help="Number of commands in each path.")
+    args = parser.parse_args()
+
+    rnd = random.Random(1)
+    pp = PathParser('scanner')
+    arrays = [pp.parseArray(randomPath(rnd, args.commands)) for i in range(args.count)]
+    actions = [pa.actions() for pa in arrays]
+    xform = Transform.translate(10, 20) * Transform.scale(1.5, 0.75)
+
+    npoints = sum(len(pa.coords) for pa in arrays)
+    print("Corpus: %d paths, %d points" % (len(arrays), npoints))
+
+    start = time.time()
+    slow = [resolveActions(a, xform) for a in actions]
+    loopTime = time.time() - start
+
+    start = time.time()
+    fast = [resolvePath(pa, xform) for pa in arrays]
+    batchTime = time.time() - start
+
+    for a, b in zip(slow, fast):
+        if not np.array_equal(a, b):
+            raise Exception("Batch results differ from the per point loop")
+
+    print("loop   %8.3fs %12.0f points/s" % (loopTime, npoints / loopTime))
+    print("batch  %8.3fs %12.0f points/s" % (batchTime, npoints / batchTime))
+    print("Speedup: %.1fx" % (loopTime / batchTime))
+
+
+if __name__ == '__main__':
+    main()
@@ -2,7 +2,12 @@
 
 import os
 import sys
+import bz2
+import gzip
 import argparse
+import itertools
+import multiprocessing
+from collections import deque
 
 from pyparsing import (
     Literal, Combine,
@@ -13,6 +18,8 @@ from pyparsing import (
     )
 
 from PathAction import PathAction
+from PathArray import PathArray
+from PathScanner import PathScanner
 
 class PathParser(object):
     """
@@ -22,9 +29,15 @@ class PathParser(object):
     it is undesirable to have many PathParsers, so the intention is to make one and
     share it. The parsePath function is the main function. It returns an array of
     actions, parsed from the string passed in.
+
+    The engine selects how paths are parsed. 'pyparsing' uses the grammar
+    below, 'scanner' uses the hand written PathScanner, which is much faster
+    and also accepts compact forms such as '.5', '1e5' and '-1-2'.
     """
 
-    def __init__(self):
+    ENGINES = ('pyparsing', 'scanner')
+
+    def __init__(self, engine='pyparsing'):
         """
         Construct the path grammar and store it in the object.
         Refer to the SVG Path specification for details.
@@ -32,8 +45,18 @@ class PathParser(object):
         I do not guarantee this is a complete or correct grammar, but it works
         for the paths that I have parsed.
         """
+        if engine not in self.ENGINES:
+            raise Exception("Invalid Engine:%s" % engine)
+
+        self.engine = engine
         self.firstM = True
 
+        if engine == 'scanner':
+            self.scanner = PathScanner()
+            return
+
+        self.scanner = None
+
         dot = Literal(".")
         comma = Literal(",").suppress()
         exponent = Combine(Word("Ee") + Optional("-") + Word(nums))
@@ -56,7 +79,7 @@ class PathParser(object):
         V_command = Word("Vv") + OneOrMore(xyval)
         S_command = Word("Ss") + OneOrMore(Group(cubicBez))
         Q_command = Word("Qq") + OneOrMore(Group(cubicBez))
-        T_command = Word("Tt") + OneOrMore(xyval)
+        T_command = Word("Tt") + OneOrMore(Group(point))
         Z_command = Word("Zz")
         svgcommand = M_command \
                      | A_command \
@@ -84,11 +107,47 @@ class PathParser(object):
         Parse the passed in path string.
         Returns an array of actions from the path
         """
+        if self.scanner:
+            self.actions = self.scanner.parsePath(path)
+            return self.actions
+
         self.actions = []
         self.firstM = True
         self.phrase.parseString(path)
         return self.actions
 
+    def iterPath(self,path):
+        """
+        Generate the actions of the path as they are parsed. Only the
+        scanner engine is incremental, the pyparsing engine parses the
+        whole path first.
+        """
+        if self.scanner:
+            return self.scanner.iterPath(path)
+
+        return iter(self.parsePath(path))
+
+    def iterStream(self,fp,chunkSize=65536):
+        """
+        Generate the actions of one path read from a file object, in
+        constant memory however long the path is. Needs the scanner engine.
+        """
+        if not self.scanner:
+            raise Exception("Streaming needs the scanner engine")
+
+        return self.scanner.iterStream(fp,chunkSize)
+
+    def parseArray(self,path):
+        """
+        Parse the passed in path string into a PathArray.
+        The scanner engine fills the arrays directly, the pyparsing
+        engine converts its actions.
+        """
+        if self.scanner:
+            return PathArray.fromPath(path, self.scanner)
+
+        return PathArray.fromActions(self.parsePath(path))
+
     def actionC(self,s,l,t):
         #print "Generating an Ellipse"
         if t[0] == 'C':
@@ -138,16 +197,41 @@ class PathParser(object):
                 raise "Invalid Arc"
 
     def actionS(self,s,l,t):
-        #print "Generating a Cubic Bezier"
-        pass
+        #print "Generating a Smooth Cubic Bezier"
+        if t[0] == 'S':
+            isAbs = True
+        else:
+            isAbs = False
+
+        for x in range(1,len(t)):
+            c = t[x] # This is 2 points
+            [x2,y2] = [float(xx) for xx in c[0]]
+            [x3,y3] = [float(xx) for xx in c[1]]
+            self.actions.append(PathAction("smoothcurve",[[x2,y2],[x3,y3]],isAbs))
 
     def actionQ(self,s,l,t):
-        #print "Generating a Cubic Bezier Q type"
-        pass
+        #print "Generating a Quadratic Bezier"
+        if t[0] == 'Q':
+            isAbs = True
+        else:
+            isAbs = False
+
+        for x in range(1,len(t)):
+            c = t[x] # This is 2 points
+            [x1,y1] = [float(xx) for xx in c[0]]
+            [x2,y2] = [float(xx) for xx in c[1]]
+            self.actions.append(PathAction("quad",[[x1,y1],[x2,y2]],isAbs))
 
     def actionT(self,s,l,t):
-        #print "Generating a Simple Cubic Bezier"
-        pass
+        #print "Generating a Smooth Quadratic Bezier"
+        if t[0] == 'T':
+            isAbs = True
+        else:
+            isAbs = False
+
+        for x in range(1,len(t)):
+            [xval,yval] = [float(xx) for xx in t[x]]
+            self.actions.append(PathAction("smoothquad",[[xval,yval]],isAbs))
 
     def actionH(self,s,l,t):
         if t[0] == 'H':
@@ -156,7 +240,7 @@ class PathParser(object):
             isAbs = False
 
         for x in range(1,len(t)):
-            [xval] = [float(xx) for xx in t[x]]
+            xval = float(t[x])
             self.actions.append(PathAction("hline",[[xval]],isAbs))
 
     def actionV(self,s,l,t):
@@ -166,7 +250,7 @@ class PathParser(object):
             isAbs = False
 
         for x in range(1,len(t)):
-            [yval] = [float(xx) for xx in t[x]]
+            yval = float(t[x])
             self.actions.append(PathAction("vline",[[yval]],isAbs))
 
     def actionL(self,s,l,t):
@@ -203,18 +287,123 @@ class PathParser(object):
     def actionZ(self,s,l,t):
         self.actions.append(PathAction('close',[],False))
 
-def parsePaths(file):
+def openPathFile(file):
+    """
+    Open a path file for reading. '-' is stdin, and files ending in
+    .gz or .bz2 are decompressed as they are read.
+    """
+    if file == '-':
+        return sys.stdin
+    if file.endswith('.gz'):
+        return gzip.open(file,'rb')
+    if file.endswith('.bz2'):
+        return bz2.BZ2File(file,'r')
+    return open(file,'r')
+
+def readPaths(fp):
+    """
+    Generate the paths in a path file, one per line, skipping blank
+    lines and '#' comments.
+    """
+    for p in fp:
+        p = p.strip()
+        if p and p[0] != '#':
+            yield p
+
+# The parser owned by each worker process in parseBatch
+_workerParser = None
+
+def _initWorker(engine):
+    global _workerParser
+    _workerParser = PathParser(engine)
+
+def _parseWorker(path):
+    try:
+        return path, _workerParser.parsePath(path), None
+    except Exception as e:
+        return path, None, "%s: %s" % (type(e).__name__, e)
+
+def iterPaths(fp, engine='pyparsing'):
+    """
+    Generate (path, actions) for each path in a path file, reading one
+    line at a time, so memory does not grow with the size of the file.
+    """
+    pp = PathParser(engine)
+    for path in readPaths(fp):
+        yield path, pp.parsePath(path)
+
+def parseBatch(paths, engine='pyparsing', workers=None, chunkSize=64):
+    """
+    Parse an iterable of path strings on a pool of worker processes.
 
-    pp = PathParser()
+    Each worker builds one PathParser and keeps it for every path it
+    is given. Paths are handed out in chunks of chunkSize, and workers
+    defaults to the number of CPUs.
 
-    with open(file,'r') as fp:
-        paths = [p.strip() for p in fp if p.strip() and p[0] != '#']
+    Generates (path, actions, error) tuples in the same order as the
+    input. If a path fails to parse, actions is None and error holds
+    the message, and the rest of the batch carries on.
 
-    for path in paths:
-        print("Parsing:%s" % path.strip())
-        actions = pp.parsePath(path.strip())
-        for a in actions:
+    The input is streamed: only 2 chunks per worker are read ahead of
+    the results, so memory does not grow with the number of paths.
+    """
+    workers = workers or multiprocessing.cpu_count()
+    paths = iter(paths)
+    window = deque()
+    pool = multiprocessing.Pool(workers, _initWorker, (engine,))
+
+    def submit():
+        chunk = list(itertools.islice(paths, chunkSize))
+        if chunk:
+            window.append(pool.map_async(_parseWorker, chunk))
+
+    try:
+        for i in range(2 * workers):
+            submit()
+        while window:
+            results = window.popleft().get()
+            submit()
+            for result in results:
+                yield result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+def parsePaths(file, engine='pyparsing', workers=1, chunkSize=64):
+
+    fp = openPathFile(file)
+    try:
+        if workers == 1:
+            for path, actions in iterPaths(fp, engine):
+                print("Parsing:%s" % path)
+                for a in actions:
+                    print a
+            return
+
+        for path, actions, error in parseBatch(readPaths(fp), engine, workers, chunkSize):
+            print("Parsing:%s" % path)
+            if error:
+                print("Error:%s" % error)
+                continue
+            for a in actions:
+                print a
+    finally:
+        if fp is not sys.stdin:
+            fp.close()
+
+def streamPath(file):
+    """
+    Parse the whole file as a single path, printing each action as it
+    is found.
+    """
+    fp = openPathFile(file)
+    try:
+        for a in PathParser('scanner').iterStream(fp):
             print a
+    finally:
+        if fp is not sys.stdin:
+            fp.close()
 
 def recursiveTest():
     grammar = OneOrMore(Word(alphas)) + Literal('end')
@@ -224,14 +413,26 @@ def main():
 
     parser = argparse.ArgumentParser()
     parser.add_argument("file",
-                      help="Specify the path file to parse.")
+                      help="Specify the path file to parse, '-' for stdin.")
+    parser.add_argument("-e", "--engine",
+                      choices=PathParser.ENGINES, default='pyparsing',
+                      help="Select the parsing engine.")
+    parser.add_argument("-j", "--workers", type=int, default=1,
+                      help="Number of worker processes, 0 for one per CPU.")
+    parser.add_argument("--chunk-size", type=int, default=64,
+                      help="Number of paths handed to a worker at a time.")
+    parser.add_argument("--stream", action='store_true',
+                      help="Treat the whole file as one path, and stream it.")
 
     args = parser.parse_args()
 
-    if not os.path.exists(args.file):
+    if args.file != '-' and not os.path.exists(args.file):
         sys.exit("Specified Path file does not exist.")
 
-    parsePaths(args.file)
+    if args.stream:
+        streamPath(args.file)
+    else:
+        parsePaths(args.file, args.engine, args.workers or None, args.chunk_size)
     print ("Parse complete")
 
 
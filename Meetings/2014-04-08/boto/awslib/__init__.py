@@ -1 +1,7 @@
+"""
+S3 storage for project files.
 
+batch.py, codec.py, keypath.py, retry.py, sync.py and tracing.py are
+copies of the modules in AWS/, so this directory runs on its own.
+Change them there, and copy them over with AWS/checkShared.py --update.
+"""
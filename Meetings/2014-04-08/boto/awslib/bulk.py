@@ -0,0 +1,135 @@
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from multiprocessing.pool import ThreadPool
+
+import boto
+import boto.exception
+
+from batch import existsMany, deleteMany
+from codec import getCodec, codecOf, headersFor, encodeFile, DecodingWriter
+
+
+class BulkTransfer(object):
+    """
+    Move many files to and from one bucket at the same time.
+
+    All transfers go through a single pool of worker threads, so however
+    many projects are moved at once, there are never more than workers
+    requests in flight. Each worker thread has its own connection.
+    Checks and deletes are done by batch.py, workers requests at a time,
+    also with a connection per thread.
+
+    connect is a function returning a new Bucket, it is called once in
+    each worker thread.
+
+    With a codec, files are compressed as they are uploaded, and the
+    codec is recorded in the metadata of the key. Keys with a codec in
+    their metadata are decompressed as they are downloaded, see codec.py.
+    """
+
+    def __init__(self, connect, workers=8, codec=None):
+        self.connect = connect
+        self.workers = workers
+        self.codec = getCodec(codec)
+        self._local = threading.local()
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def bucket(self):
+        """
+        The bucket handle for the calling thread.
+        """
+        bconn = getattr(self._local, 'bconn', None)
+        if bconn is None:
+            bconn = self.connect()
+            self._local.bconn = bconn
+        return bconn
+
+    def pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPool(self.workers)
+            return self._pool
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.terminate()
+                self._pool = None
+
+    def get(self, pairs):
+        """
+        Download each (keyName, filename) pair. Returns a list of True or
+        False, False where the key does not exist.
+        """
+        return self.pool().map(self._get, pairs)
+
+    def put(self, pairs):
+        """
+        Upload each (filename, keyName) pair. Returns a list of True or
+        False, False where the local file does not exist.
+        """
+        return self.pool().map(self._put, pairs)
+
+    def exists(self, names, listMin=3):
+        """
+        Check which of the key names exist. Returns a list of True or
+        False, in the order of names. See batch.existsMany.
+        """
+        return existsMany(self._bucket, names, self.workers, listMin)
+
+    def delete(self, names):
+        """
+        Delete the keys, up to 1000 a request. Returns a list in the order
+        of names, with None for each key deleted, or not there, and the
+        error as 'Code: Message' for each key that could not be deleted.
+        See batch.deleteMany.
+        """
+        return deleteMany(self._bucket, names, self.workers)
+
+    @contextmanager
+    def _bucket(self):
+        """
+        bucket(), as the context manager batch.py asks for.
+        """
+        yield self.bucket()
+
+    def _get(self, pair):
+        keyName, filename = pair
+        k = self.bucket().new_key(keyName)
+
+        # Fetch to a temporary name, so a failed download never leaves
+        # half a file behind
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(filename) or '.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fp:
+                out = DecodingWriter(fp, lambda: codecOf(k))
+                k.get_contents_to_file(out)
+                out.finish()
+            os.rename(tmp, filename)
+        except Exception as e:
+            os.remove(tmp)
+            if isinstance(e, boto.exception.S3ResponseError) and e.status == 404:
+                return False
+            raise
+        return True
+
+    def _put(self, pair):
+        filename, keyName = pair
+        if not os.path.exists(filename):
+            return False
+
+        k = self.bucket().new_key(keyName)
+        if self.codec is None:
+            k.set_contents_from_filename(filename, replace=True)
+            return True
+
+        # Compressed a chunk at a time, into a temporary file
+        with tempfile.TemporaryFile() as tmp:
+            with open(filename, 'rb') as src:
+                encodeFile(src, tmp, self.codec)
+            tmp.seek(0)
+            k.set_contents_from_file(tmp, headers=headersFor(self.codec), replace=True)
+        return True
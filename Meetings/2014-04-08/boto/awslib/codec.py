@@ -0,0 +1,245 @@
+import zlib
+from io import BytesIO
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+# Objects written with a codec have it in their metadata, which S3 sends
+# back as the x-amz-meta-codec header
+METADATA = 'codec'
+
+# Compressed input is decoded this much at a time, so the output of one
+# step stays small however well the data compressed
+STEP = 64 * 1024
+
+
+class Codec(object):
+    """
+    A compression format. compressor() and decompressor() return objects
+    that work a chunk at a time, like zlib's:
+
+        c = codec.compressor()
+        out = c.compress(chunk1) + c.compress(chunk2) + c.flush()
+    """
+
+    name = None
+
+    def compressor(self):
+        raise NotImplementedError
+
+    def decompressor(self):
+        raise NotImplementedError
+
+
+class GzipCodec(Codec):
+    """
+    gzip, so objects stay readable by anything that reads .gz files.
+    """
+
+    name = 'gzip'
+
+    def __init__(self, level=6):
+        self.level = level
+
+    def compressor(self):
+        return zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def decompressor(self):
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+
+class ZstdCodec(Codec):
+    """
+    Zstandard, several times faster than gzip at a similar ratio. Needs
+    the zstandard package.
+    """
+
+    name = 'zstd'
+
+    def __init__(self, level=3):
+        self.level = level
+
+    def compressor(self):
+        return zstandard.ZstdCompressor(level=self.level).compressobj()
+
+    def decompressor(self):
+        return _Decompressor(zstandard.ZstdDecompressor().decompressobj())
+
+
+class Lz4Codec(Codec):
+    """
+    LZ4 frames, the fastest to decode, with less compression. Needs the
+    lz4 package.
+    """
+
+    name = 'lz4'
+
+    def compressor(self):
+        return _Lz4Compressor()
+
+    def decompressor(self):
+        return _Decompressor(lz4.frame.LZ4FrameDecompressor())
+
+
+CODECS = {'gzip': GzipCodec()}
+if zstandard is not None:
+    CODECS['zstd'] = ZstdCodec()
+if lz4 is not None:
+    CODECS['lz4'] = Lz4Codec()
+
+
+def getCodec(codec):
+    """
+    The Codec for a name, such as 'gzip', or None for None. A Codec is
+    returned as it is. 'fast' is the fastest one installed, see
+    fastCodec.
+    """
+    if codec is None or isinstance(codec, Codec):
+        return codec
+    if codec == 'fast':
+        return fastCodec()
+    if codec not in CODECS:
+        raise Exception("Codec not available ({}).".format(codec))
+    return CODECS[codec]
+
+
+def fastCodec():
+    """
+    zstd or lz4 if installed, gzip otherwise.
+    """
+    for name in ('zstd', 'lz4', 'gzip'):
+        if name in CODECS:
+            return CODECS[name]
+
+
+def codecOf(key):
+    """
+    The Codec recorded in the metadata of a boto Key, or None.
+    """
+    name = key.get_metadata(METADATA)
+    return getCodec(name) if name else None
+
+
+def checkRaw(key):
+    """
+    Raise an Exception if the Key was stored with a codec, for reads of
+    byte ranges, which would be ranges of the compressed data.
+    """
+    codec = codecOf(key)
+    if codec is not None:
+        raise Exception("Can't read a range of ({}), it is stored compressed with {}.".format(
+            key.name, codec.name))
+
+
+def headersFor(codec):
+    """
+    The headers recording codec in the metadata of an object.
+    """
+    if codec is None:
+        return {}
+    return {'x-amz-meta-' + METADATA: codec.name}
+
+
+def encode(data, codec):
+    c = codec.compressor()
+    return c.compress(data) + c.flush()
+
+
+def decode(data, codec):
+    out = BytesIO()
+    w = DecodingWriter(out, codec)
+    w.write(data)
+    w.finish()
+    return out.getvalue()
+
+
+def encodeFile(src, dst, codec, chunkSize=1024 * 1024):
+    """
+    Compress the open file src into the open file dst, a chunk at a time.
+    """
+    c = codec.compressor()
+    while True:
+        chunk = src.read(chunkSize)
+        if not chunk:
+            break
+        dst.write(c.compress(chunk))
+    dst.write(c.flush())
+
+
+class DecodingWriter(object):
+    """
+    A file to write compressed data to, that writes it decompressed to
+    fp, as it comes. Call finish() once all the data is written.
+
+    codec may also be a function returning the Codec, called on the
+    first write. This is for the codec of a boto Key, which is only
+    known once its GET has started: lambda: codecOf(key). If it is None,
+    the data is written to fp as it is.
+    """
+
+    def __init__(self, fp, codec):
+        self.fp = fp
+        self.codec = codec
+        self._d = None
+        self._resolved = False
+
+    def write(self, data):
+        if not self._resolved:
+            self._resolve()
+        if self._d is None:
+            self.fp.write(data)
+            return
+
+        for i in range(0, len(data), STEP):
+            out = self._d.decompress(data[i:i + STEP])
+            if out:
+                self.fp.write(out)
+
+    def finish(self):
+        if not self._resolved:
+            self._resolve()
+        if self._d is not None:
+            self.fp.write(self._d.flush())
+            if getattr(self._d, 'unused_data', b''):
+                raise Exception("Data after the end of the compressed stream.")
+
+    def _resolve(self):
+        codec = self.codec() if callable(self.codec) else self.codec
+        self._d = codec.decompressor() if codec else None
+        self._resolved = True
+
+
+class _Decompressor(object):
+    """
+    A decompressor with a flush(), which zstandard's and lz4's lack.
+    """
+
+    def __init__(self, d):
+        self._d = d
+
+    def decompress(self, data):
+        return self._d.decompress(data)
+
+    def flush(self):
+        return b''
+
+
+class _Lz4Compressor(object):
+    def __init__(self):
+        self._c = lz4.frame.LZ4FrameCompressor()
+        self._header = self._c.begin()
+
+    def compress(self, data):
+        header, self._header = self._header, b''
+        return header + self._c.compress(data)
+
+    def flush(self):
+        header, self._header = self._header, b''
+        return header + self._c.flush()
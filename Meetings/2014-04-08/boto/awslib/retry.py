@@ -0,0 +1,375 @@
+import time
+import errno
+import random
+import socket
+import threading
+from collections import deque
+
+try:
+    import httplib
+    from Queue import Queue, Empty
+except ImportError:
+    import http.client as httplib
+    from queue import Queue, Empty
+
+import boto.exception
+
+# Error codes S3 uses to ask for fewer requests
+THROTTLE_CODES = ('SlowDown', 'Throttling', 'RequestLimitExceeded', 'TooManyRequests')
+
+# Error codes of requests that took too long, and can be sent again
+TIMEOUT_CODES = ('RequestTimeout', 'RequestTimeTooSkewed')
+
+NETWORK_ERRNOS = (errno.ECONNRESET, errno.ECONNREFUSED, errno.ECONNABORTED, errno.EPIPE,
+                  errno.ETIMEDOUT, errno.EHOSTUNREACH, errno.ENETUNREACH, errno.ENETDOWN)
+
+# The kinds of failure worth trying again
+RETRIABLE = ('throttled', 'server', 'timeout', 'network')
+
+# boto client errors that mean the connection or the data on it failed
+TRANSPORT_ERRORS = (boto.exception.AWSConnectionError, boto.exception.StorageDataError,
+                    boto.exception.PleaseRetryException)
+
+
+def classify(error):
+    """
+    What kind of failure an exception is:
+
+        throttled - S3 asked to slow down, 503 SlowDown, or any 503:
+                    boto reads the body of a failed upload itself, so
+                    the error may have no code, and S3 only sends 503s
+                    to ask for a lower request rate
+        server    - any other 5xx
+        timeout   - a socket timeout, or S3 timed the request out
+        network   - the connection failed or was dropped
+        client    - any other error response, 404, 403, 412..., or a
+                    boto client error, such as a bad argument
+        other     - anything else, e.g. a bug, never retried
+    """
+    if isinstance(error, boto.exception.BotoServerError):
+        code = getattr(error, 'error_code', None)
+        if code in THROTTLE_CODES or error.status in (429, 503):
+            return 'throttled'
+        if code in TIMEOUT_CODES:
+            return 'timeout'
+        if error.status >= 500:
+            return 'server'
+        return 'client'
+    if isinstance(error, socket.timeout):
+        return 'timeout'
+    if isinstance(error, (httplib.HTTPException,) + TRANSPORT_ERRORS):
+        return 'network'
+    if isinstance(error, boto.exception.BotoClientError):
+        return 'client'
+    if isinstance(error, EnvironmentError) and error.errno in NETWORK_ERRNOS:
+        return 'network'
+    return 'other'
+
+
+class Retrier(object):
+    """
+    Retries, deadlines and hedged requests for S3 operations, with the
+    metrics to see what they are doing.
+
+    Requests that fail in a way worth trying again, see classify, are
+    sent again up to retries times, after a random wait between 0 and
+    base * 2 ** attempt seconds, at most cap. The random 'full jitter'
+    keeps many clients that were throttled together from coming back
+    together.
+
+    An operation, see operation(), may have a deadline. No retry is
+    started that would end its wait after the deadline, the error is
+    raised instead. The requests of wrapped connections get a socket
+    timeout of the time left, so a request that hangs is cut off too.
+    Work handed to other threads keeps the deadline if it is bound to
+    it, see bind().
+
+    An error is retried by the innermost call() or operation() it comes
+    out of, and only passed on by the ones around it, so an operation
+    run inside another is not retried retries * retries times.
+
+    A hedged operation is started a second time if the first has not
+    finished after hedgePercentile of the recent times of the same
+    operation, and the first result wins. This cuts the slow tail of
+    reads, for a few percent more requests. It is only done once there
+    are hedgeMin times to go by.
+
+    Use with boto connections through wrap(), which turns off boto's
+    own retries, that sleep up to a minute and ignore deadlines.
+    """
+
+    def __init__(self, retries=4, base=0.05, cap=5.0, deadline=None,
+                 hedgePercentile=None, hedgeMin=20):
+        self.retries = retries
+        self.base = base
+        self.cap = cap
+        self.deadline = deadline
+        self.hedgePercentile = hedgePercentile
+        self.hedgeMin = hedgeMin
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._retries = dict((kind, 0) for kind in RETRIABLE)
+        self._giveUps = 0
+        self._ops = {}
+
+    def wrap(self, conn):
+        """
+        Make every request of the boto connection go through call(),
+        instead of being retried by boto, with a socket timeout of the
+        time left before the deadline, if there is one.
+        """
+        makeRequest = conn.make_request
+        getConnection = conn.get_http_connection
+        default = conn.http_connection_kwargs.get('timeout')
+
+        def retried(*args, **kwargs):
+            if len(args) <= 7:
+                if kwargs.get('override_num_retries') is None:
+                    kwargs['override_num_retries'] = 0
+                kwargs.setdefault('retry_handler', _raiseErrors)
+            return self.call(lambda: makeRequest(*args, **kwargs))
+
+        def timed(*args, **kwargs):
+            http = getConnection(*args, **kwargs)
+            timeout = self.timeLeft()
+            if timeout is None:
+                timeout = default
+            elif timeout <= 0:
+                raise socket.timeout("The deadline has passed.")
+            # Used when it connects, or on the socket it already has
+            http.timeout = timeout
+            if http.sock is not None:
+                http.sock.settimeout(timeout)
+            return http
+
+        conn.make_request = retried
+        conn.get_http_connection = timed
+        # Raise network errors at once, instead of sleeping first
+        conn.http_exceptions = ()
+        return conn
+
+    def timeLeft(self):
+        """
+        The seconds left before the calling thread's deadline, or None.
+        """
+        deadline = getattr(self._local, 'deadline', None)
+        return deadline - time.time() if deadline else None
+
+    def bind(self, func):
+        """
+        func, to call in another thread, e.g. of a ThreadPool, with the
+        deadline of the calling thread.
+        """
+        ends = getattr(self._local, 'deadline', None)
+
+        def bound(*args, **kwargs):
+            outer = getattr(self._local, 'deadline', None)
+            self._local.deadline = ends
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._local.deadline = outer
+        return bound
+
+    def call(self, func):
+        """
+        Call func, retrying it on failures worth retrying. Failures that
+        have been retried by an inner call() are only passed on, so
+        requests of a wrapped connection are not retried again by the
+        operation around them.
+        """
+        attempt = 0
+        while True:
+            try:
+                return func()
+            except Exception as e:
+                if getattr(e, '_retried', False):
+                    raise
+                kind = classify(e)
+                if kind not in RETRIABLE:
+                    raise
+
+                wait = random.uniform(0, min(self.cap, self.base * 2 ** attempt))
+                deadline = getattr(self._local, 'deadline', None)
+                if attempt >= self.retries or (deadline and time.time() + wait > deadline):
+                    with self._lock:
+                        self._giveUps += 1
+                    _markRetried(e)
+                    raise
+
+                with self._lock:
+                    self._retries[kind] += 1
+                time.sleep(wait)
+                attempt += 1
+
+    def operation(self, name, func, hedge=False, retry=True, deadline=None):
+        """
+        Call func as the named operation, which is timed, and hedged if
+        hedge is set and hedgePercentile is. deadline is in seconds from
+        now, it defaults to the deadline of the Retrier.
+
+        The requests of wrapped connections are always retried. If retry
+        is set, func is also called again for other failures worth
+        retrying, such as the connection dropping halfway through a
+        response. Leave it unset where func can't be repeated, e.g. it
+        writes to a file as data arrives.
+        """
+        deadline = deadline or self.deadline
+        ends = time.time() + deadline if deadline else None
+        op = self._op(name)
+
+        start = time.time()
+        try:
+            if hedge and self.hedgePercentile:
+                result = self._hedged(op, func, ends, retry)
+            else:
+                result = self._run(func, ends, retry)
+        except Exception as e:
+            op.failed()
+            # Not to be retried again by an operation around this one
+            _markRetried(e)
+            raise
+        op.done(time.time() - start)
+        return result
+
+    def stats(self):
+        """
+        The retries made, by kind of failure, the number of times it gave
+        up, and for each operation the number of calls, failures, hedges,
+        hedges that won, and the latency percentiles in seconds.
+        """
+        with self._lock:
+            stats = {'retries': dict(self._retries), 'giveUps': self._giveUps}
+            ops = list(self._ops.items())
+        stats['operations'] = dict((name, op.stats()) for name, op in ops)
+        return stats
+
+    def _op(self, name):
+        with self._lock:
+            op = self._ops.get(name)
+            if op is None:
+                op = self._ops[name] = _Operation()
+            return op
+
+    def _run(self, func, ends, retry=True):
+        """
+        Call func with the calling thread's deadline set to ends, or the
+        deadline of an operation around it, whichever is sooner.
+        """
+        outer = getattr(self._local, 'deadline', None)
+        if outer and (ends is None or outer < ends):
+            ends = outer
+        self._local.deadline = ends
+        try:
+            return self.call(func) if retry else func()
+        finally:
+            self._local.deadline = outer
+
+    def _hedged(self, op, func, ends, retry):
+        delay = op.percentile(self.hedgePercentile, self.hedgeMin)
+        if delay is None:
+            return self._run(func, ends, retry)
+
+        results = Queue()
+
+        def run(which):
+            try:
+                results.put((which, None, self._run(func, ends, retry)))
+            except Exception as e:
+                results.put((which, e, None))
+
+        _start(run, 0)
+        try:
+            which, error, result = results.get(timeout=delay)
+            started = 1
+        except Empty:
+            op.hedged()
+            _start(run, 1)
+            which, error, result = results.get()
+            started = 2
+
+        if error is not None and started == 2:
+            # The other one may still make it
+            which, error, result = results.get()
+        if error is not None:
+            raise error
+        if which == 1:
+            op.hedgeWon()
+        return result
+
+
+class _Operation(object):
+    """
+    Metrics of one kind of operation, with its recent latencies.
+    """
+
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self._times = deque(maxlen=window)
+        self._sorted = None
+        self.calls = 0
+        self.failures = 0
+        self.hedges = 0
+        self.hedgeWins = 0
+
+    def done(self, seconds):
+        with self._lock:
+            self.calls += 1
+            self._times.append(seconds)
+            # Sorted again now and then, not on every call
+            if self.calls % 50 == 0 or len(self._times) < 50:
+                self._sorted = None
+
+    def failed(self):
+        with self._lock:
+            self.calls += 1
+            self.failures += 1
+
+    def hedged(self):
+        with self._lock:
+            self.hedges += 1
+
+    def hedgeWon(self):
+        with self._lock:
+            self.hedgeWins += 1
+
+    def percentile(self, p, minimum=1):
+        with self._lock:
+            if len(self._times) < minimum:
+                return None
+            if self._sorted is None:
+                self._sorted = sorted(self._times)
+            times = self._sorted
+        return times[min(len(times) - 1, int(len(times) * p / 100.0))]
+
+    def stats(self):
+        stats = dict((p, self.percentile(n)) for p, n in (('p50', 50), ('p95', 95), ('p99', 99)))
+        with self._lock:
+            stats.update(calls=self.calls, failures=self.failures,
+                         hedges=self.hedges, hedgeWins=self.hedgeWins)
+        return stats
+
+
+def _raiseErrors(response, i, nextSleep):
+    """
+    boto retry_handler raising 5xx errors at once, instead of sleeping
+    before boto raises them, so that Retrier.call() decides what to do.
+    """
+    if response.status >= 500:
+        body = response.read()
+        raise boto.exception.BotoServerError(response.status, response.reason, body)
+    return None
+
+
+def _markRetried(error):
+    try:
+        error._retried = True
+    except AttributeError:
+        pass
+
+
+def _start(func, *args):
+    t = threading.Thread(target=func, args=args)
+    t.daemon = True
+    t.start()
@@ -4,18 +4,41 @@ import os.path
 from boto.s3.connection import S3Connection
 from boto.s3.key import Key
 import boto
-import re
+
+from io import BytesIO
+
+from bulk import BulkTransfer
+from codec import codecOf, DecodingWriter
+from keypath import KeyPath
+from retry import Retrier
+from tracing import NULL_TRACER
+import sync
 
 class BasicStorage(object):
     """
     Class for manipulating an Amazon S3 Storage area
     """
 
-    def __init__(self,bucket):
+    def __init__(self,bucket,workers=8,codec=None,tracer=None,retrier=None,**connectArgs):
+        """
+        Project files are moved up to workers at a time, see
+        BulkTransfer. With a codec, such as 'gzip' or 'fast', project
+        files are compressed on the way up and decompressed on the way
+        down. With a tracing.Tracer, the calls and their phases are
+        timed, and the bytes moved counted, see traceStats(). Failed
+        requests are retried, with backoff, by retrier, a retry.Retrier,
+        see retryStats(). Any other arguments are passed on to
+        boto.connect_s3, e.g. to use a local S3 compatible server.
+        """
         self._bucketName = bucket
         self._re_bucket = bucket
+        self._paths = KeyPath(bucket)
         self._conn = None
         self._bconn = None
+        self._connectArgs = connectArgs
+        self.tracer = tracer or NULL_TRACER
+        self.retrier = retrier or Retrier()
+        self._bulk = BulkTransfer(self._newBucket, workers, codec)
 
         self._projFiles = []
 
@@ -27,9 +50,32 @@ class BasicStorage(object):
 
         # Access key and secret key stored in users ~/.boto
         #conn = S3Connection()
-        self._conn = boto.connect_s3()
+        with self.tracer.span('connect'):
+            self._conn = self.retrier.wrap(boto.connect_s3(**self._connectArgs))
 
-        self._bconn= self._conn.get_bucket(self._bucketName)
+        with self.tracer.span('bucket_lookup', bucket=self._bucketName):
+            self._bconn= self._conn.get_bucket(self._bucketName)
+
+    def traceStats(self):
+        """
+        The byte counters, and the calls and latency percentiles of each
+        call and phase, see Tracer.stats.
+        """
+        return self.tracer.stats()
+
+    def retryStats(self):
+        """
+        Retries by kind of failure, and the number of times it gave up,
+        see Retrier.stats.
+        """
+        return self.retrier.stats()
+
+    def _newBucket(self):
+        """
+        A new connection to the bucket, for one of the transfer threads.
+        """
+        conn = self.retrier.wrap(boto.connect_s3(**self._connectArgs))
+        return conn.get_bucket(self._bucketName, validate=False)
 
     def setBucket(self,bucket):
         """
@@ -40,6 +86,10 @@ class BasicStorage(object):
             self._bconn = None
         self._bucketName = bucket
 
+        # The transfer threads are connected to the old bucket
+        self._bulk.close()
+        self._bulk = BulkTransfer(self._newBucket, self._bulk.workers, self._bulk.codec)
+
     def getBucket(self):
         return self._bucketName
 
@@ -62,30 +112,42 @@ class BasicStorage(object):
             self._re_bucket = self._bucketName
         else:
             self._re_bucket = bucket
+        self._paths.setBucket(self._re_bucket)
 
         return b # return previous value
 
     def buildPath(self,path,file):
         """
         The bucket is stored in the paths, so we need to remove it..
+        See KeyPath.
         """
+        return self._paths.build(path,file)
 
-        path = os.path.join(path,file)
-        m = re.match('^%s/(.*)$' % self._re_bucket,path)
-        if m:
-            path = m.group(1) # remove the leading bucket!
-
-        return path
+    def buildPaths(self,pairs):
+        """
+        buildPath for each (path, file) pair, as a list.
+        """
+        return self._paths.buildAll(pairs)
 
     def getFile(self,path,file,localfile):
+        """
+        Read path+file into the open localfile. A file stored with a
+        codec, e.g. by saveProject, is decompressed.
+        """
         if self._conn == None:
             raise Exception("Must connect first.")
 
         k = Key(self._bconn)
         k.name = self.buildPath(path,file)
-        if k.exists():
-            print ("Key name:%s" % k.name)
-            k.get_contents_to_file(localfile)
+        with self.tracer.span('getFile', key=k.name):
+            with self.tracer.span('exists'):
+                found = k.exists()
+            if found:
+                with self.tracer.span('transfer'):
+                    out = DecodingWriter(localfile, lambda: codecOf(k))
+                    k.get_contents_to_file(out)
+                    out.finish()
+                self.tracer.count('bytes.received', k.size)
 
     def exists(self,path,file):
         """
@@ -96,22 +158,36 @@ class BasicStorage(object):
 
         k = Key(self._bconn)
         k.key = self.buildPath(path,file)
-        return k.exists()
+        with self.tracer.span('exists', key=k.key):
+            return k.exists()
 
     def getFileData(self,path,file):
+        """
+        The contents of path+file, decompressed if it was stored with a
+        codec, or None if it does not exist.
+        """
         if self._conn == None:
             raise Exception("Must connect first.")
 
         k = Key(self._bconn)
         k.key = self.buildPath(path,file)
         fileData = None
-        try:
-            if k.exists():
-                fileData = k.get_contents_as_string()
-            else:
-                return None
-        except boto.exception.S3ResponseError as e:
-            pass
+        with self.tracer.span('getFileData', key=k.key):
+            try:
+                with self.tracer.span('exists'):
+                    found = k.exists()
+                if found:
+                    with self.tracer.span('transfer'):
+                        buf = BytesIO()
+                        out = DecodingWriter(buf, lambda: codecOf(k))
+                        k.get_contents_to_file(out)
+                        out.finish()
+                        fileData = buf.getvalue()
+                    self.tracer.count('bytes.received', len(fileData))
+                else:
+                    return None
+            except boto.exception.S3ResponseError as e:
+                pass
 
         return fileData
 
@@ -121,26 +197,115 @@ class BasicStorage(object):
 
         k = Key(self._bconn)
         k.key = self.buildPath(path,file)
-        print ("Key name:%s" % k.name)
-        try:
-            fileData = k.set_contents_from_string(data)
-        except boto.exception.S3ResponseError as e:
-            pass
+        with self.tracer.span('storeFileData', key=k.key):
+            k.set_contents_from_string(data)
+        self.tracer.count('bytes.sent', len(data))
 
     def storeFile(self,localfile,path,file):
         if self._conn == None:
             raise Exception("Must connect first.")
 
         k = Key(self._bconn)
-        k.name = os.path.join(path,file)
-        print ("Key name:%s" % k.name)
-        k.set_contents_from_filename(localfile,replace=True)
+        k.name = self.buildPath(path,file)
+        with self.tracer.span('storeFile', key=k.name):
+            k.set_contents_from_filename(localfile,replace=True)
+        self.tracer.count('bytes.sent', k.size)
 
     def removeFile(self,path,file):
         if self._conn == None:
             raise Exception("Must connect first.")
 
-        pass
+        name = self.buildPath(path,file)
+        with self.tracer.span('removeFile', key=name):
+            self._bconn.delete_key(name)
+
+    def existsMany(self,paths):
+        """
+        Check if each of the (path, file) pairs exists on the S3 server.
+        Returns a list of True or False, in the same order. Files in the
+        same directory are checked with listings, see BulkTransfer.exists.
+        """
+        if self._conn == None:
+            raise Exception("Must connect first.")
+
+        return self._bulk.exists(self.buildPaths(paths))
+
+    def deleteMany(self,paths):
+        """
+        Delete each of the (path, file) pairs, up to 1000 a request.
+        Returns a list in the same order, with None for each file deleted
+        and the S3 error for the others.
+        """
+        if self._conn == None:
+            raise Exception("Must connect first.")
+
+        return self._bulk.delete(self.buildPaths(paths))
+
+    def sync(self,src,dst,delete=False,dryRun=False,checksum=False):
+        """
+        Make dst a copy of src, copying only the files that differ, see
+        sync.plan. If src is a local directory, it is uploaded to the
+        prefix dst, otherwise the prefix src is downloaded to the local
+        directory dst. The keys are found with one listing, and the files
+        are copied by the transfer threads. With delete, files in dst
+        that are not in src are deleted. With dryRun, nothing is changed.
+        checksum is not used with a codec, the ETags are those of the
+        compressed data.
+
+        Returns a dict with the names copied and deleted, the number of
+        files that were the same, and the errors by name, see
+        SyncPlan.result.
+        """
+        if self._conn == None:
+            raise Exception("Must connect first.")
+
+        upload = os.path.isdir(src)
+        localDir, prefix = (src, dst) if upload else (dst, src)
+        prefix = self.buildPath(prefix,'') if prefix else ''
+
+        local = sync.localFiles(localDir) if os.path.isdir(localDir) else {}
+        remote = sync.remoteFiles(self._bconn.list(prefix), prefix)
+        todo = sync.plan(local, remote, upload, localDir, delete,
+                         checksum and not self._bulk.codec, sizes=not self._bulk.codec)
+        if dryRun:
+            return todo.result(dryRun=True)
+
+        def localName(name):
+            return os.path.join(localDir, *name.split('/'))
+
+        errors = {}
+        if upload:
+            self._bulk.put([(localName(n), prefix + n) for n in todo.copy])
+            failed = self._bulk.delete([prefix + n for n in todo.delete])
+            errors.update((n, e) for n, e in zip(todo.delete, failed) if e)
+        else:
+            for folder in set(os.path.dirname(localName(n)) for n in todo.copy):
+                if not os.path.isdir(folder):
+                    os.makedirs(folder)
+            found = self._bulk.get([(prefix + n, localName(n)) for n in todo.copy])
+            for name, ok in zip(todo.copy, found):
+                if ok:
+                    # The time of the key, so the next sync finds it the same
+                    mtime = remote[name][1]
+                    os.utime(localName(name), (mtime, mtime))
+                else:
+                    errors[name] = "No such key."
+            for name in todo.delete:
+                os.remove(localName(name))
+
+        return todo.result(errors)
+
+    def setProjectFiles(self,files):
+        """
+        Set the names of the files that make up a project.
+        """
+        self._projFiles = list(files)
+
+    def getProjectFiles(self):
+        return self._projFiles
+
+    def projectPath(self,ver,uid,pid):
+        return 'model-%s/uid-%d/pid-%d' % (ver, uid, pid)
 
     def getProject(self,ver,uid,pid,destdir):
         """
@@ -148,38 +313,73 @@ class BasicStorage(object):
 
         Pass in the version, uid, pid and destination dir.
         The files will be read from s3 and stored with the same
-        name in the destdir.
+        name in the destdir. The files are fetched at the same time.
+
+        Returns the names of the files that were found.
+        """
+        return self.getProjects([(ver,uid,pid,destdir)])[0]
+
+    def saveProject(self,ver,uid,pid,srcdir):
+        """
+        Save the project files from the given source dir.
+
+        Load the project files from 'srcdir' and save them. Files that
+        are not in 'srcdir' are skipped.
+
+        Returns the names of the files that were saved.
+        """
+        return self.saveProjects([(ver,uid,pid,srcdir)])[0]
+
+    def getProjects(self,projects):
+        """
+        Retrieve many projects in one go. Pass in a list of
+        (ver, uid, pid, destdir).
+
+        The files of all the projects share one pool of transfers, so
+        the number of requests in flight stays the same however many
+        projects there are.
+
+        Returns a list with the names of the files found for each project.
         """
         if self._conn == None:
             raise Exception("Must connect first.")
 
-        k = Key(self._bconn)
-        path = os.path.join('model-%s' % ver, 'uid-%d' % uid, 'pid-%d' % pid)
+        pairs = []
+        for ver,uid,pid,destdir in projects:
+            path = self.projectPath(ver,uid,pid)
+            for file in self._projFiles:
+                pairs.append((self.buildPath(path,file), os.path.join(destdir,file)))
 
-        for file in self._projFiles:
-            name = os.path.join(path,file)
-            k.name = name
-            dest = os.path.join(destdir,file)
-            k.get_contents_to_filename(dest)
+        return self._byProject(len(projects), self._bulk.get(pairs))
 
-    def saveProject(self,ver,uid,pid,srcdir):
+    def saveProjects(self,projects):
         """
-        Save the project files from the given source dir.
+        Save many projects in one go. Pass in a list of
+        (ver, uid, pid, srcdir).
 
-        Load the project files from 'srcdir' and save them
+        Returns a list with the names of the files saved for each project.
         """
         if self._conn == None:
             raise Exception("Must connect first.")
 
-        k = Key(self._bconn)
-        path = os.path.join("/",'model-%s' % ver, 'uid-%d' % uid, 'pid-%d' % pid)
-
-        for file in self._projFiles:
-            src = os.path.join(destidr,name)
-            if os.path.exists(src):
-                name = os.path.join(path,file)
-                k.name = name
-                k.set_contents_from_filename(src)
+        pairs = []
+        for ver,uid,pid,srcdir in projects:
+            path = self.projectPath(ver,uid,pid)
+            for file in self._projFiles:
+                pairs.append((os.path.join(srcdir,file), self.buildPath(path,file)))
+
+        return self._byProject(len(projects), self._bulk.put(pairs))
+
+    def _byProject(self,count,results):
+        """
+        Split the per file results of a bulk transfer back into projects.
+        """
+        files = self._projFiles
+        done = []
+        for i in range(count):
+            found = results[i * len(files):(i + 1) * len(files)]
+            done.append([f for f, ok in zip(files, found) if ok])
+        return done
 
 
 def main():